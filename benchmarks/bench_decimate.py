@@ -0,0 +1,76 @@
+"""
+Render time and file size of plots with and without thinned lines
+
+    python benchmarks/bench_decimate.py [epochs]
+
+Plots one day of 1 Hz data of two baselines, resampled to 1 s.
+"""
+
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime as dt
+from datetime import timedelta as td
+
+import numpy as np
+
+from rtk_gps.decimate import minmax_decimate
+from rtk_gps.rtk_gps import BaselineData, plot_rtk_neu
+from rtk_gps.synthetic import synthetic_pos
+
+BASELINES = ["SENG-ELDC", "SKSH-ELDC"]
+
+
+def main():
+    epochs = int(sys.argv[1]) if len(sys.argv) > 1 else 86400
+    start = dt(2024, 2, 21)
+    end = start + td(seconds=epochs - 1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        for baseline in BASELINES:
+            os.mkdir(baseline)
+            with open(f"{baseline}/{baseline}{start:%Y%m%d}0000b.pos", "wb") as f:
+                f.write(synthetic_pos(epochs, start))
+        data = BaselineData(None, BASELINES, start, end, resample="1s")
+
+        series = data.window(BASELINES[0], start, end)["u-baseline"]
+        r_start = time.perf_counter()
+        x, _ = minmax_decimate(series.index, series, 4000)
+        print(
+            f"decimating {len(series)} to {len(x)} points: "
+            f"{(time.perf_counter() - r_start) * 1000:.1f} ms"
+        )
+
+        for figtype in ["png", "pdf"]:
+            for points in [None, 8000, 4000, 2000]:
+                figurepath = os.path.join(tmp, f"{figtype}-{points}")
+                os.mkdir(figurepath)
+                runs = []
+                for _ in range(3):
+                    r_start = time.perf_counter()
+                    plot_rtk_neu(
+                        None,
+                        BASELINES,
+                        start=start,
+                        end=end,
+                        resample="1s",
+                        figurepath=figurepath,
+                        logo="",
+                        figtype=figtype,
+                        data=data,
+                        max_points=points,
+                    )
+                    runs.append(time.perf_counter() - r_start)
+                (fn,) = os.listdir(figurepath)
+                size = os.path.getsize(os.path.join(figurepath, fn))
+                print(
+                    f"{figtype} {str(points or 'all'):>5} points: "
+                    f"{np.min(runs):.2f} s, {size / 1024:.0f} KiB"
+                )
+        os.chdir("/")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Speed of writing one minute rows to PostgreSQL, to_sql against COPY upsert
+
+Runs against the database given by the RTK_PSQL_* environment variables
+and RTK_PSQL_DB, a local test instance, in a scratch table it drops again.
+
+    python benchmarks/bench_ingest.py [baselines] [days]
+"""
+
+import os
+import sys
+import time
+from datetime import datetime as dt
+
+import numpy as np
+import pandas as pd
+
+from rtk_gps.ingest import KEY, psql_engine, upsert
+
+TABLE = "rtk_one_min_bench"
+
+VALUES = ["n", "e", "u", "q", "sdn", "sde", "sdu", "sden", "sdnu", "sdue"]
+
+
+def synthetic_minutes(baselines=20, days=4, start=dt(2024, 2, 21)):
+    """
+    frames of one minute rows as the importer builds them, one per baseline
+    """
+
+    rng = np.random.default_rng(0)
+    index = pd.date_range(start, periods=days * 1440, freq="60s", name="time")
+    frames = []
+    for i in range(baselines):
+        df = pd.DataFrame(
+            rng.normal(scale=0.01, size=(len(index), len(VALUES))),
+            index=index,
+            columns=VALUES,
+        )
+        df["q"] = rng.choice([1.0, 1.5, 2.0], size=len(index))
+        df["base"] = "ELDC"
+        df["rover"] = f"R{i:03d}"
+        frames.append(df)
+
+    return frames
+
+
+def create_table(conn):
+    conn.exec_driver_sql(f"DROP TABLE IF EXISTS {TABLE}")
+    conn.exec_driver_sql(
+        f"CREATE TABLE {TABLE} ("
+        "time TIMESTAMP(6) WITHOUT TIME ZONE NOT NULL, "
+        "base CHARACTER VARYING(4) NOT NULL, rover CHARACTER VARYING(4) NOT NULL, "
+        "n REAL, e REAL, u REAL, q SMALLINT, sdn REAL, sde REAL, sdu REAL, "
+        "sden REAL, sdnu REAL, sdue REAL, PRIMARY KEY (base, rover, time))"
+    )
+
+
+def main():
+    baselines = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    frames = synthetic_minutes(baselines, days)
+    nrows = sum(len(df) for df in frames)
+    print(f"{baselines} baselines, {days} days, {nrows} rows")
+
+    engine = psql_engine(os.environ.get("RTK_PSQL_DB", "gps_metrics"))
+
+    with engine.begin() as conn:
+        create_table(conn)
+    r_start = time.perf_counter()
+    for df in frames:
+        with engine.begin() as conn:
+            df.to_sql(TABLE, conn, if_exists="append")
+    seconds = time.perf_counter() - r_start
+    print(f"  to_sql: {seconds:.2f} s, {nrows / seconds:.0f} rows/s")
+
+    with engine.begin() as conn:
+        create_table(conn)
+    for run in ["new", "again"]:
+        r_start = time.perf_counter()
+        written = upsert(engine, frames, table=TABLE)
+        seconds = time.perf_counter() - r_start
+        print(f"  upsert {run}: {seconds:.2f} s, {written / seconds:.0f} rows/s")
+
+    # the second upsert updated every row in place
+    with engine.begin() as conn:
+        count, keys = conn.exec_driver_sql(
+            f"SELECT count(*), count(DISTINCT ({', '.join(KEY)})) FROM {TABLE}"
+        ).one()
+        conn.exec_driver_sql(f"DROP TABLE {TABLE}")
+    assert count == keys == nrows, (count, keys, nrows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""
+Speed comparison of the .pos parsing engines
+
+    python benchmarks/bench_posfile.py [epochs]
+"""
+
+import io
+import sys
+import time
+
+import pandas as pd
+
+from rtk_gps.posfile import BASELINE_COLUMNS, ENGINES, read_pos
+from rtk_gps.synthetic import synthetic_pos
+
+
+def main():
+    epochs = int(sys.argv[1]) if len(sys.argv) > 1 else 86400
+    data = synthetic_pos(epochs)
+    print(f"{epochs} epochs, {len(data) / 1e6:.1f} MB")
+
+    frames = {}
+    for engine in ENGINES:
+        runs = []
+        for _ in range(5):
+            r_start = time.perf_counter()
+            frames[engine] = read_pos(io.BytesIO(data), BASELINE_COLUMNS, engine)
+            runs.append(time.perf_counter() - r_start)
+        print(f"{engine:>8}: {min(runs):.3f} s (best of {len(runs)})")
+
+    pd.testing.assert_frame_equal(frames["pandas"], frames["fast"])
+
+
+if __name__ == "__main__":
+    main()
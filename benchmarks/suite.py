@@ -0,0 +1,290 @@
+"""
+Benchmarks of the hot paths on synthetic data files held in memory
+
+    python benchmarks/suite.py [--groups N] [--days N] [--runs N]
+        [--only NAME ...] [--results FILE] [--compare REV]
+
+The .pos files of the baselines plotted by the scheduler are generated and
+served by a MemoryStorage, so no network is needed. Each benchmark reports the
+best of its runs. The results are appended to the results file with the
+commit they ran on, --compare prints the change from the latest results
+of another commit run with the same parameters on the same host. The
+importer runs against the PostgreSQL given by the RTK_PSQL_* variables and
+RTK_PSQL_DB, in a scratch table, and is skipped when it can not connect.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime as dt
+from datetime import timedelta as td
+from types import SimpleNamespace
+
+from rtk_gps import scheduler
+from rtk_gps.fetch import prefetch
+from rtk_gps.resample import StreamingResampler
+from rtk_gps.rtk_gps import COMPONENTS, BaselineData, open_datafile, plot_rtk_neu
+from rtk_gps.storage import MemoryStorage, open_storage
+from rtk_gps.synthetic import synthetic_files
+from rtk_gps.tailreader import PosTailReader
+
+DATA_URL = "memory://rtklib-run/data"
+
+# seconds of a round trip to the NFS server
+LATENCY = 0.002
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+RESULTS = os.path.join(HERE, "results.jsonl")
+
+BENCHMARKS = {}
+
+
+def benchmark(fn):
+    """
+    register fn, it returns the seconds of each measurement by name
+    """
+
+    BENCHMARKS[fn.__name__.removeprefix("bench_")] = fn
+    return fn
+
+
+def best(fn, runs, setup=None):
+    """
+    the fastest of runs calls of fn, after setup when it is given
+    """
+
+    seconds = []
+    for _ in range(runs):
+        if setup is not None:
+            setup()
+        r_start = time.perf_counter()
+        fn()
+        seconds.append(time.perf_counter() - r_start)
+    return min(seconds)
+
+
+@benchmark
+def bench_open_datafile(env):
+    baseline = env.baselines[0]
+    filelist = sorted(fn for fn in env.nfs.files if fn.startswith(f"{baseline}/"))
+    return {
+        engine: best(
+            lambda: open_datafile(list(filelist), env.nfs, "", engine=engine),
+            env.runs,
+        )
+        for engine in ["pandas", "fast"]
+    }
+
+
+@benchmark
+def bench_prefetch(env):
+    # the same files behind a round trip on each request
+    storage = MemoryStorage(env.nfs.name, latency=LATENCY)
+    filelist = sorted(env.nfs.files)
+    return {
+        f"{workers} workers": best(
+            lambda: prefetch(filelist, storage, max_workers=workers, chunk_size=2**20),
+            env.runs,
+        )
+        for workers in [1, 8]
+    }
+
+
+@benchmark
+def bench_resample(env):
+    baseline = env.baselines[0]
+    filelist = sorted(fn for fn in env.nfs.files if fn.startswith(f"{baseline}/"))
+    df = open_datafile(filelist, env.nfs, "", engine="fast")[COMPONENTS]
+
+    return {
+        "pandas": best(lambda: df.resample("60s").median(), env.runs),
+        "streaming": best(
+            lambda: StreamingResampler("60s", columns=COMPONENTS).update(df),
+            env.runs,
+        ),
+    }
+
+
+@benchmark
+def bench_plot_rtk_neu(env):
+    group = max(scheduler.BASELINES_LIST, key=len)
+    options = {"special": "twodays", "figurepath": env.tmp, "logo": ""}
+    data = BaselineData(env.nfs, group, env.end - td(days=2), env.end)
+
+    return {
+        "render": best(
+            lambda: plot_rtk_neu(None, group, data=data, **options), env.runs
+        ),
+        "load+render": best(
+            lambda: plot_rtk_neu(env.nfs, group, **options), env.runs
+        ),
+    }
+
+
+@benchmark
+def bench_scheduler_plot(env):
+    state = {}
+
+    def cold():
+        state.update(reader=None, resamplers=None, buffers=None)
+
+    def run():
+        scheduler.plot(env.nfs, env.tmp, logo="", **state)
+
+    results = {"cold": best(run, env.runs, setup=cold)}
+    # what was loaded and resampled is kept, as rtk_scheduler does
+    state.update(reader=PosTailReader(), resamplers={}, buffers={})
+    run()
+    results["warm"] = best(run, env.runs)
+    return results
+
+
+@benchmark
+def bench_importer(env):
+    from bench_ingest import TABLE, create_table
+    from rtk_gps.importer import import_baselines
+    from rtk_gps.ingest import psql_engine
+
+    try:
+        engine = psql_engine(
+            os.environ.get("RTK_PSQL_DB", "gps_metrics"), pool_size=2, max_overflow=0
+        )
+        with engine.begin() as conn:
+            create_table(conn)
+    except Exception as e:
+        print(f"  skipped, no database: {e.__class__.__name__}")
+        return {}
+
+    marks = {}
+
+    def fresh():
+        marks.clear()
+        with engine.begin() as conn:
+            create_table(conn)
+
+    def run():
+        import_baselines(DATA_URL, engine, marks, table=TABLE)
+
+    results = {"full": best(run, env.runs, setup=fresh)}
+    # later runs only read the epochs after the watermarks
+    results["incremental"] = best(run, env.runs)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"DROP TABLE {TABLE}")
+    return results
+
+
+def git(*args):
+    return subprocess.run(
+        ["git", *args], capture_output=True, text=True, cwd=HERE, check=False
+    ).stdout.strip()
+
+
+def commit():
+    """
+    short hash of HEAD, marked when the working tree has changes
+    """
+
+    head = git("rev-parse", "--short", "HEAD") or "unknown"
+    if git("status", "--porcelain", "--untracked-files=no"):
+        head += "-dirty"
+    return head
+
+
+def compare(results, path, rev, params):
+    """
+    print the change of results from the latest ones of rev in path
+    """
+
+    rev = git("rev-parse", "--short", rev) or rev
+
+    before = {}
+    with open(path) as f:
+        for line in f:
+            entry = json.loads(line)
+            if (
+                entry["commit"] == rev
+                and entry["params"] == params
+                and entry["host"] == platform.node()
+            ):
+                before[entry["benchmark"]] = entry["seconds"]
+
+    print(f"\nchange from {rev}:")
+    for name, seconds in results.items():
+        if name in before:
+            change = (seconds / before[name] - 1) * 100
+            print(
+                f"  {name:<28} {before[name]:8.3f} s -> {seconds:8.3f} s "
+                f"{change:+6.1f}%"
+            )
+        else:
+            print(f"  {name:<28} {'':>10}    {seconds:8.3f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "--groups",
+        type=int,
+        default=len(scheduler.BASELINES_LIST),
+        help="Number of the scheduler's baseline groups to plot",
+    )
+    parser.add_argument("--days", type=int, default=2, help="Whole days of data")
+    parser.add_argument("--runs", type=int, default=3, help="Runs of each benchmark")
+    parser.add_argument(
+        "--only", nargs="+", choices=list(BENCHMARKS), help="Benchmarks to run"
+    )
+    parser.add_argument("--results", default=RESULTS, help="File to append to")
+    parser.add_argument("--compare", metavar="REV", help="Commit to compare with")
+    args = parser.parse_args()
+
+    scheduler.BASELINES_LIST = scheduler.BASELINES_LIST[: args.groups]
+    baselines = sorted({b for group in scheduler.BASELINES_LIST for b in group})
+    end = dt.now().replace(microsecond=0)
+
+    g_start = time.perf_counter()
+    nfs = open_storage(DATA_URL)
+    for path, data in synthetic_files(baselines, args.days, end).items():
+        nfs.add(path, data)
+    size = sum(len(data) for data, _ in nfs.files.values())
+    print(
+        f"{len(baselines)} baselines, {len(nfs.files)} files, {size / 1e9:.1f} GB "
+        f"generated in {time.perf_counter() - g_start:.0f} s"
+    )
+
+    params = {"groups": args.groups, "days": args.days, "runs": args.runs}
+    head = commit()
+    results = {}
+    # the results of each benchmark are written as soon as it is done
+    with tempfile.TemporaryDirectory() as tmp, open(args.results, "a") as f:
+        env = SimpleNamespace(
+            nfs=nfs, baselines=baselines, end=end, runs=args.runs, tmp=tmp
+        )
+        for name in args.only or BENCHMARKS:
+            print(f"{name}:")
+            for measure, seconds in BENCHMARKS[name](env).items():
+                results[f"{name}[{measure}]"] = seconds
+                print(f"  {measure:<20} {seconds:8.3f} s")
+                entry = {
+                    "commit": head,
+                    "time": f"{dt.now():%Y-%m-%dT%H:%M:%S}",
+                    "host": platform.node(),
+                    "python": platform.python_version(),
+                    "params": params,
+                    "benchmark": f"{name}[{measure}]",
+                    "seconds": seconds,
+                }
+                f.write(json.dumps(entry) + "\n")
+            f.flush()
+    print(f"results of {head} appended to {args.results}")
+
+    if args.compare:
+        compare(results, args.results, args.compare, params)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Archive of resampled baselines partitioned by baseline and day
+"""
+
+import fcntl
+import logging
+import os
+from contextlib import contextmanager
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+COMPRESSION = "zstd"
+
+DAY_FORMAT = "%Y%m%d"
+
+# one in each baseline directory, held while its partitions are written
+LOCK_FILE = ".lock"
+
+# file names of the partitions of a day, a month or a year
+PERIOD_FORMATS = {"D": DAY_FORMAT, "M": "%Y%m", "Y": "%Y"}
+
+
+def partition_path(root, baseline, day, period="D"):
+    """
+    file holding the epochs of baseline in the period holding day
+    """
+
+    start = pd.Timestamp(day).to_period(period).start_time
+    return os.path.join(root, baseline, f"{start:{PERIOD_FORMATS[period]}}.parquet")
+
+
+def partitions(root, baseline, start=None, end=None, period="D"):
+    """
+    starts of the periods archived for baseline from start to end, in order
+    """
+
+    directory = os.path.join(root, baseline)
+    if not os.path.isdir(directory):
+        return []
+
+    days = []
+    for name in os.listdir(directory):
+        stem, ext = os.path.splitext(name)
+        if ext != ".parquet":
+            continue
+        day = pd.to_datetime(stem, format=PERIOD_FORMATS[period])
+        if start is not None and day < pd.Timestamp(start).to_period(period).start_time:
+            continue
+        if end is not None and day > pd.Timestamp(end):
+            continue
+        days.append(day)
+
+    return sorted(days)
+
+
+def write_archive(root, baseline, df, period="D", replace=False):
+    """
+    Add the epochs of df to the partitions of baseline
+
+    Each day of df, or month or year with period, is written to its own
+    file. A partition already in the archive is read and the epochs it does
+    not have added to it, with replace the epochs of df are written over
+    those it has. Returns the starts of the partitions written.
+    """
+
+    if df.empty:
+        return []
+
+    directory = os.path.join(root, baseline)
+    os.makedirs(directory, exist_ok=True)
+
+    days = []
+    with _locked(directory):
+        for part, part_df in df.groupby(df.index.to_period(period)):
+            path = partition_path(root, baseline, part.start_time, period)
+            if os.path.exists(path):
+                old_df = _read_partition(path, None)
+                if replace:
+                    old_df = old_df[~old_df.index.isin(part_df.index)]
+                else:
+                    part_df = part_df[~part_df.index.isin(old_df.index)]
+                part_df = pd.concat([old_df, part_df]).sort_index()
+            table = pa.Table.from_pandas(part_df, preserve_index=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            pq.write_table(table, tmp, compression=COMPRESSION)
+            os.replace(tmp, path)
+            days.append(part.start_time)
+            logging.info(
+                "Archived %d epochs of %s in %s", len(part_df), baseline, path
+            )
+
+    return days
+
+
+def read_archive(root, baseline, start=None, end=None, columns=None, period="D"):
+    """
+    Epochs of baseline from start to end read from the archive
+
+    Only the partitions of the days from start to end are opened and only
+    the columns are read, all of them when columns is None.
+    """
+
+    frames = [
+        _read_partition(partition_path(root, baseline, day, period), columns)
+        for day in partitions(root, baseline, start, end, period)
+    ]
+    if not frames:
+        index = pd.DatetimeIndex([], name="date_time")
+        return pd.DataFrame(columns=columns, index=index)
+
+    df = frames[0] if len(frames) == 1 else pd.concat(frames)
+    if start is not None or end is not None:
+        df = df.loc[start:end]
+
+    return df
+
+
+def export_neu(root, baseline, filepath, columns, start=None, end=None, daily=True):
+    """
+    Write archived epochs of baseline as .neu text files
+
+    With daily, each day goes to {baseline}-distance-{YYYYMMDD}.neu as
+    rtk_write_archive used to write them, otherwise the whole period goes to
+    {baseline}-distance.neu. Returns the files written.
+    """
+
+    df = read_archive(root, baseline, start, end, columns)
+    if df.empty:
+        return []
+
+    if daily:
+        groups = [
+            (f"{filepath}/{baseline}-distance-{day:{DAY_FORMAT}}.neu", day_df)
+            for day, day_df in df.groupby(df.index.normalize())
+        ]
+    else:
+        groups = [(f"{filepath}/{baseline}-distance.neu", df)]
+
+    for file, file_df in groups:
+        file_df.to_csv(
+            file,
+            sep="\t",
+            float_format="%.3f",
+            header=list(file_df.columns),
+            index_label="#  date_time",
+        )
+
+    return [file for file, _ in groups]
+
+
+@contextmanager
+def _locked(directory):
+    """
+    hold the lock of a baseline directory while its partitions are read and
+    written, processes archiving the same baseline take turns
+    """
+
+    with open(os.path.join(directory, LOCK_FILE), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _read_partition(path, columns):
+    df = pq.read_table(path, columns=columns, use_pandas_metadata=True).to_pandas()
+    df.index.name = "date_time"
+    return df
@@ -0,0 +1,120 @@
+"""
+Local on-disk cache of parsed .pos files
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+
+import pyarrow as pa
+import pyarrow.feather as feather
+
+_META_KEY = b"rtk_gps"
+
+
+class FrameCache:
+    """
+    Parsed data frames stored as Feather files, keyed by (path, size, mtime)
+
+    There is one entry per path, a file that changed size or modification
+    time is a miss and its entry is replaced on put. Files modified less than
+    min_age seconds ago are still being written and are not cached. When the
+    entries exceed max_bytes the least recently used ones are removed.
+    """
+
+    def __init__(self, directory, max_bytes=2 * 1024**3, min_age=3600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.min_age = min_age
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, filename, size, mtime):
+        """
+        the cached frame for filename or None
+        """
+
+        entry = self._entry(filename)
+        try:
+            table = feather.read_table(entry, memory_map=True)
+        except (OSError, pa.ArrowInvalid):
+            self.misses += 1
+            return None
+
+        key = json.loads(table.schema.metadata[_META_KEY])
+        if key != self._key(filename, size, mtime):
+            self.misses += 1
+            return None
+
+        os.utime(entry)
+        self.hits += 1
+        return table.to_pandas()
+
+    def valid(self, filename, size, mtime):
+        """
+        True if there is a current entry for filename, without loading it
+        """
+
+        try:
+            with pa.memory_map(self._entry(filename)) as source:
+                schema = pa.ipc.open_file(source).schema
+        except (OSError, pa.ArrowInvalid):
+            return False
+
+        key = json.loads(schema.metadata[_META_KEY])
+        return key == self._key(filename, size, mtime)
+
+    def put(self, filename, size, mtime, df):
+        """
+        store the frame parsed from filename
+        """
+
+        if df.empty or time.time() - mtime / 10**9 < self.min_age:
+            return
+
+        table = pa.Table.from_pandas(df, preserve_index=True)
+        metadata = dict(table.schema.metadata)
+        metadata[_META_KEY] = json.dumps(self._key(filename, size, mtime))
+        table = table.replace_schema_metadata(metadata)
+
+        entry = self._entry(filename)
+        tmp_entry = f"{entry}.tmp"
+        feather.write_feather(table, tmp_entry, compression="lz4")
+        os.replace(tmp_entry, entry)
+        self._evict()
+
+    def stats(self):
+        """
+        hit and miss counters
+        """
+
+        return {"hits": self.hits, "misses": self.misses}
+
+    def _key(self, filename, size, mtime):
+        return {"path": filename, "size": size, "mtime": mtime}
+
+    def _entry(self, filename):
+        digest = hashlib.sha1(filename.encode()).hexdigest()
+        return os.path.join(self.directory, f"{digest}.feather")
+
+    def _evict(self):
+        """
+        remove least recently used entries until under max_bytes
+        """
+
+        entries = []
+        for fn in os.listdir(self.directory):
+            if fn.endswith(".feather"):
+                st = os.stat(os.path.join(self.directory, fn))
+                entries.append((st.st_mtime, st.st_size, fn))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, fn in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            logging.info("Evicting %s from the cache", fn)
+            os.remove(os.path.join(self.directory, fn))
+            total -= size
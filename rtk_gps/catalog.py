@@ -0,0 +1,181 @@
+"""
+Cached listing of the data file directories
+"""
+
+import errno
+import os
+import threading
+import time
+
+import pandas as pd
+
+from rtk_gps.storage import CHUNK_SIZE, Storage, open_storage
+
+DAY_FORMAT = "%Y%m%d"
+
+FILE_SUFFIX = "0000b.pos"
+
+
+class FileCatalog(Storage):
+    """
+    Directory listings and file attributes of a Storage kept between calls
+
+    Pass it as nfs to the loaders. Each directory is listed once and the
+    listing kept for ttl seconds, a file that is not in it does not exist
+    without asking the server. The size and modification time of a listed
+    file are asked for once per listing, those of files not modified for
+    settle seconds are kept for as long as the file is listed. nfs is
+    anything open_storage takes, None for files on local disk. Listing and
+    stat are safe to call from many threads, a directory is listed by one of
+    them at a time while the other requests go to nfs at once, so nfs has to
+    take calls from several threads as an NFSStorage does.
+    """
+
+    def __init__(self, nfs=None, ttl=60.0, settle=3600):
+        self.nfs = open_storage(nfs)
+        self.ttl = ttl
+        self.settle = settle
+        self.listings = 0
+        self.stats_asked = 0
+        self.hits = 0
+        self._directories = {}
+        self._listing_locks = {}
+        self._lock = threading.Lock()
+
+    def connect(self, nfs):
+        """
+        send requests to a new nfs context, keeping what is listed
+        """
+
+        with self._lock:
+            self.nfs = open_storage(nfs)
+
+    def listdir(self, directory):
+        return list(self._listing(directory))
+
+    def stat(self, filename):
+        size, mtime = self.attributes(filename)
+        return {"size": size, "mtime": {"sec": mtime // 10**9, "nsec": mtime % 10**9}}
+
+    def open(self, filename, mode="rb"):
+        self.attributes(filename)
+        return self.nfs.open(filename, mode=mode)
+
+    def open_stream(self, filename, chunk_size=CHUNK_SIZE):
+        self.attributes(filename)
+        return self.nfs.open_stream(filename, chunk_size)
+
+    def attributes(self, filename):
+        """
+        size in bytes and modification time in ns of a listed file
+        """
+
+        directory, name = os.path.split(filename)
+        entries = self._listing(directory)
+        with self._lock:
+            if name not in entries:
+                raise IOError(errno.ENOENT, "No such file or directory", filename)
+            attributes = entries[name]
+            if attributes is not None:
+                self.hits += 1
+                return attributes
+
+        # asked for without the lock, other files are stat'ed meanwhile
+        attributes = self.nfs.attributes(filename)
+        with self._lock:
+            entries[name] = attributes
+            self.stats_asked += 1
+        return attributes
+
+    def datafiles(self, baseline, start, end, path=""):
+        """
+        the daily .pos files of a baseline covering start to end that exist
+        """
+
+        directory = os.path.join(path, baseline)
+        first = pd.Timestamp(start).normalize()
+        last = pd.Timestamp(end)
+        names = list(self._listing(directory))
+
+        filelist = []
+        for name in names:
+            if not (name.startswith(baseline) and name.endswith(FILE_SUFFIX)):
+                continue
+            day = name[len(baseline) : -len(FILE_SUFFIX)]
+            try:
+                day = pd.to_datetime(day, format=DAY_FORMAT)
+            except ValueError:
+                continue
+            if first <= day <= last:
+                filelist.append(os.path.join(directory, name))
+
+        return sorted(filelist)
+
+    def refresh(self):
+        """
+        list every directory again on the next request
+        """
+
+        with self._lock:
+            for directory, (_, entries) in self._directories.items():
+                self._directories[directory] = (None, entries)
+
+    def stats(self):
+        """
+        requests sent and answered from the catalog
+        """
+
+        return {"listings": self.listings, "stats": self.stats_asked, "hits": self.hits}
+
+    def _listing(self, directory):
+        """
+        names of a directory mapped to their attributes or None
+
+        Only one thread lists a directory, the others asking for it wait
+        for that listing.
+        """
+
+        with self._lock:
+            entries = self._current(directory)
+            if entries is not None:
+                return entries
+            listing_lock = self._listing_locks.setdefault(directory, threading.Lock())
+
+        with listing_lock:
+            with self._lock:
+                entries = self._current(directory)
+                if entries is not None:
+                    return entries
+
+            now = time.monotonic()
+            try:
+                names = self.nfs.listdir(directory or ".")
+            except IOError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+                names = []
+
+            with self._lock:
+                self.listings += 1
+                _, entries = self._directories.get(directory, (None, {}))
+                settled = time.time() - self.settle
+                fresh = {}
+                for name in names:
+                    attributes = entries.get(name)
+                    if attributes is not None and attributes[1] / 10**9 < settled:
+                        fresh[name] = attributes
+                    else:
+                        fresh[name] = None
+                self._directories[directory] = (now, fresh)
+            return fresh
+
+    def _current(self, directory):
+        """
+        the listing of a directory if it is not older than ttl, with the lock
+        held
+        """
+
+        listed, entries = self._directories.get(directory, (None, {}))
+        if listed is not None and time.monotonic() - listed < self.ttl:
+            return entries
+        return None
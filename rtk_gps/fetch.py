@@ -0,0 +1,217 @@
+"""
+Concurrent fetching of data files ahead of parsing
+"""
+
+import asyncio
+import errno
+import logging
+import os
+import time
+
+from rtk_gps.metrics import baseline_of
+from rtk_gps.storage import CHUNK_SIZE, AsyncStorage, Storage
+
+
+class _PrefetchedFile:
+    """
+    file handle over fetched bytes starting at byte base of the file
+
+    Reading before base goes to a handle from reopen, when there is one.
+    """
+
+    def __init__(self, data, base, reopen=None):
+        self._data = data
+        self._base = base
+        self._pos = base
+        self._reopen = reopen
+        self._fh = None
+
+    def read(self, size=None):
+        if self._fh is None and self._pos < self._base:
+            if self._reopen is None:
+                raise IOError(errno.EIO, "Range was not fetched")
+            self._fh = self._reopen()
+            self._fh.seek(self._pos, os.SEEK_SET)
+        if self._fh is not None:
+            return self._fh.read(size)
+
+        i = self._pos - self._base
+        chunk = self._data[i:] if size is None else self._data[i : i + size]
+        self._pos += len(chunk)
+        return chunk
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.tell()
+        elif whence == os.SEEK_END:
+            offset += self._base + len(self._data)
+        self._pos = offset
+        if self._fh is not None:
+            self._fh.seek(offset, os.SEEK_SET)
+
+    def tell(self):
+        return self._fh.tell() if self._fh is not None else self._pos
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+
+
+class PrefetchedFiles(Storage):
+    """
+    Fetched files served with the stat and open calls of libnfs.NFS
+
+    Pass it as nfs to open_datafile. Paths that were not fetched go to
+    fallback, paths whose fetch failed or timed out raise IOError.
+    """
+
+    def __init__(self, fallback=None):
+        self.fallback = fallback
+        self._files = {}
+        self._failed = set()
+
+    def add(self, filename, size, mtime, data=b"", base=0):
+        self._files[filename] = (size, mtime, data, base)
+
+    def fail(self, filename):
+        self._failed.add(filename)
+
+    def stat(self, filename):
+        if filename in self._files:
+            size, mtime, _, _ = self._files[filename]
+            mtime = {"sec": mtime // 10**9, "nsec": mtime % 10**9}
+            return {"size": size, "mtime": mtime}
+        return self._fallback(filename).stat(filename)
+
+    def listdir(self, path):
+        return self._fallback(path).listdir(path)
+
+    def open(self, filename, mode="rb"):
+        if filename in self._files:
+            _, _, data, base = self._files[filename]
+            reopen = None
+            if self.fallback is not None:
+
+                def reopen():
+                    return self.fallback.open(filename, mode="rb")
+
+            return _PrefetchedFile(data, base, reopen)
+        return self._fallback(filename).open(filename, mode=mode)
+
+    def _fallback(self, filename):
+        if filename in self._failed or self.fallback is None:
+            raise IOError(errno.ENOENT, f"{filename} was not fetched")
+        return self.fallback
+
+
+def prefetch(
+    filelist,
+    storage=None,
+    max_workers=8,
+    timeout=60.0,
+    reader=None,
+    cache=None,
+    fallback=None,
+    chunk_size=CHUNK_SIZE,
+    catalog=None,
+    metrics=None,
+    max_bytes=None,
+):
+    """
+    Fetch files concurrently into a PrefetchedFiles
+
+    The files are read from storage, anything open_storage takes, through
+    an AsyncStorage. At most max_workers requests are out at once, the
+    next chunk of a file is read while the last one is taken in, and a file
+    taking longer than timeout seconds is abandoned. With a PosTailReader
+    only the bytes it has not parsed are fetched, files with a current
+    FrameCache entry are only stat'ed. With a FileCatalog the sizes and
+    modification times are taken from it. At most max_bytes are fetched,
+    the files that would go over it are left to fallback and read when they
+    are parsed. The bytes fetched for each baseline and the seconds spent on
+    them are set in metrics, a Metrics.
+    """
+
+    files = PrefetchedFiles(fallback=fallback)
+    fetched = {}
+    left = []
+    remaining = max_bytes
+
+    async def fetch(files_in, filename):
+        nonlocal remaining
+        f_start = time.monotonic()
+        if catalog is None:
+            size, mtime = await files_in.stat(filename)
+        else:
+            size, mtime = await files_in.call(catalog.attributes, filename)
+        if size == 0 or (cache is not None and cache.valid(filename, size, mtime)):
+            fetched[filename] = (time.monotonic() - f_start, 0)
+            return size, mtime, b"", 0
+
+        base = 0 if reader is None else reader.resume_offset(filename)
+        if base > size:
+            base = 0
+        if remaining is not None:
+            if size - base > remaining:
+                fetched[filename] = (time.monotonic() - f_start, 0)
+                left.append(filename)
+                return None
+            remaining -= size - base
+
+        chunks = []
+        async for chunk in files_in.chunks(filename, base, size - base, chunk_size):
+            chunks.append(chunk)
+
+        data = b"".join(chunks)
+        fetched[filename] = (time.monotonic() - f_start, len(data))
+        return base + len(data), mtime, data, base
+
+    async def fetch_all():
+        async with AsyncStorage(
+            storage, max_workers=max_workers, read_ahead=chunk_size
+        ) as files_in:
+
+            async def fetch_one(filename):
+                try:
+                    result = await asyncio.wait_for(
+                        fetch(files_in, filename), timeout
+                    )
+                except TimeoutError:
+                    logging.error(
+                        "Fetching %s timed out after %s s", filename, timeout
+                    )
+                    files.fail(filename)
+                except IOError as e:
+                    if e.errno != errno.ENOENT:
+                        logging.error("Failed to fetch %s: %s", filename, e)
+                    files.fail(filename)
+                else:
+                    if result is not None:
+                        files.add(filename, *result)
+
+            await asyncio.gather(*(fetch_one(filename) for filename in filelist))
+
+    f_start = time.perf_counter()
+    asyncio.run(fetch_all())
+
+    if metrics is not None:
+        baselines = {}
+        for filename, (seconds, nbytes) in fetched.items():
+            b_seconds, b_bytes = baselines.get(baseline_of(filename), (0.0, 0))
+            baselines[baseline_of(filename)] = (b_seconds + seconds, b_bytes + nbytes)
+        for baseline, (seconds, nbytes) in baselines.items():
+            metrics.set(
+                "rtk_baseline_seconds", seconds, baseline=baseline, stage="fetch"
+            )
+            metrics.set("rtk_baseline_bytes", nbytes, baseline=baseline)
+
+    logging.info(
+        "Fetched %d files in %f s", len(filelist), time.perf_counter() - f_start
+    )
+    if left:
+        logging.info(
+            "Left %d files past %d bytes to be read when they are parsed",
+            len(left),
+            max_bytes,
+        )
+    return files
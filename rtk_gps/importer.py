@@ -1,52 +1,46 @@
 import sys
 import re
 import os
-import io
 import logging
-import libnfs
-from rtk_gps import open_datafile
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime as dt
+
+from rtk_gps.catalog import FileCatalog
+from rtk_gps.ingest import TABLE, psql_engine, upsert, watermarks
+from rtk_gps.loader import baseline_frame, datafiles, load_files
+from rtk_gps.storage import open_storage
+from rtk_gps.tailreader import PosTailReader
 import pandas as pd
-import sqlalchemy as sa
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[logging.StreamHandler(sys.stdout)],
-)
-
-logging.info("Establishing SQL connection...")
-psql_engine = sa.create_engine(
-    "postgresql://{user}:{password}@{host}:{port}/{database}".format(
-        user=os.environ.get("RTK_PSQL_USER"),
-        password=os.environ.get("RTK_PSQL_PASS"),
-        host=os.environ.get("RTK_PSQL_HOST"),
-        port=os.environ.get("RTK_PSQL_PORT"),
-        database="gps_metrics"
-    ),
-    echo=False,
-    future=True
-)
-
-rtk_table = sa.Table("rtk_one_min", sa.MetaData(), autoload_with=psql_engine)
-
-text_file_columns = [
-    "date",
-    "time",
+import schedule
+
+NFS_URL = "nfs://rtk.vedur.is/home/gpsops/rtklib-run/data"
+
+load_columns = [
     "e-baseline",
     "n-baseline",
     "u-baseline",
-    "q",
-    "ns",
+    "Q",
     "sdn",
     "sde",
     "sdu",
-    "sden",
-    "sdnu",
-    "sdue",
-    "age",
-    "ratio",
+    "sdne",
+    "sdeu",
+    "sdun",
 ]
 
+column_names = {
+    "e-baseline": "e",
+    "n-baseline": "n",
+    "u-baseline": "u",
+    "Q": "q",
+    "sdne": "sden",
+    "sdeu": "sdnu",
+    "sdun": "sdue",
+}
+
 #TODO: concat-a frame per dag við ein tóman því það gætu verið duplicate
 final_columns = [
     "time",
@@ -62,57 +56,277 @@ final_columns = [
     "sdue",
 ]
 
-date_format = "%Y/%m/%d%H:%M:%S.%f"
+baseline_regex = re.compile(r"((?:[A-Z]|[0-9]){4})-((?:[A-Z]|[0-9]){4})")
 
-logging.info("Mounting NFS...")
-nfs = libnfs.NFS("nfs://rtk.vedur.is/home/gpsops/rtklib-run/data")
 
-baseline_regex = re.compile(r"((?:[A-Z]|[0-9]){4})-((?:[A-Z]|[0-9]){4})")
-for baseline in sorted(nfs.listdir(".")):
+def baseline_files(nfs, baseline, since=None):
+    """
+    data files of a baseline with epochs after since, the newest 4 without it
+
+    With a FileCatalog as nfs only files that exist are returned.
+    """
+
+    if since is not None:
+        if isinstance(nfs, FileCatalog):
+            return nfs.datafiles(baseline, since, dt.now())
+        return datafiles(baseline, since, dt.now())
+
+    filelist = []
+    for fn in sorted(nfs.listdir(baseline)):
+        if fn.find(baseline) == 0:
+            filelist.append(os.path.join(baseline, fn))
+    return filelist[-4:]
+
+
+def read_baseline(nfs, baseline, since=None, reader=None, catalog=None):
+    """
+    one minute medians of a baseline from since, named as the table columns
+
+    The files are looked up in catalog when it is given and read from nfs.
+    """
+
     match = baseline_regex.search(baseline)
-    if match:
-        final_frame = pd.DataFrame(columns=col_names[2:])
-        base = match.group(2)
-        rover = match.group(1)
-        filelist = []
-        for fn in sorted(nfs.listdir(baseline)):
-            if fn.find(baseline) == 0:
-                filelist.append(fn)
-
-        if len(filelist) > 0:
-            for i in range(min(len(filelist), 4)):
-                newest_fn = os.path.join(baseline, filelist[-(i+1)])
-                if nfs.stat(newest_fn)["size"] > 0:
-                    logging.info(f"Reading {newest_fn}...")
-                    content = io.StringIO(nfs.open(newest_fn, mode="r").read())
-                    df = pd.read_csv(
-                        content,
-                        header=None,
-                        sep="\s+",
-                        comment="%",
-                        names=text_file_columns
-                    )
-
-                    if not df.empty:
-                        df["date_time"] = pd.to_datetime(df["date"] + df["time"], format=date_format)
-                        df.drop(columns=["date", "time", "age", "ratio", "ns"], inplace=True)
-                        df.rename(columns={
-                            "date_time": "time",
-                            "e-baseline": "e",
-                            "n-baseline": "n", 
-                            "u-baseline": "u"
-                        }, inplace=True)
-                        df.set_index("time", inplace=True)
-
-                        df = df[df.q != 5]
-                        df = df.resample("60s").median()
-                        df["base"] = base
-                        df["rover"] = rover
-
-
-        with psql_engine.begin() as conn:
-            logging.info(f"Inserting {newest_fn}...")
-            df.to_sql(rtk_table.name, conn, if_exists="append")
-
-
-#['time', 'base', 'rover', 'n', 'e', 'u', 'q', 'sdn', 'sde', 'sdu', 'sden', 'sdnu', 'sdue']
+    filelist = baseline_files(nfs if catalog is None else catalog, baseline, since)
+    if len(filelist) == 0:
+        return None
+
+    logging.info(f"Reading {baseline} from {since}...")
+    df = load_files(
+        {baseline: filelist},
+        nfs,
+        start=since,
+        columns=load_columns,
+        filt=[5],
+        reader=reader,
+    )
+    df = baseline_frame(df, baseline).rename(columns=column_names)
+    df.index.name = "time"
+    df = df.resample("60s").median().dropna()
+    df["base"] = match.group(2)
+    df["rover"] = match.group(1)
+    return df
+
+
+def import_baselines(
+    storage,
+    engine,
+    marks,
+    overlap="10min",
+    reader=None,
+    workers=4,
+    writers=2,
+    queue_size=16,
+    catalog=None,
+    table=TABLE,
+):
+    """
+    Import the one minute medians of every baseline after its watermark
+
+    marks maps (base, rover) to the latest time stored, the epochs from
+    overlap before it are read again to take in data that arrived late and
+    the minutes they make are written over. Baselines without a watermark
+    are imported from their newest 4 files. marks is moved to the latest
+    minute written.
+
+    Baselines are read from storage, anything open_storage takes, by a pool
+    of workers into a queue holding at most queue_size of them. writers
+    threads take what is in the queue and write it in one transaction, so
+    engine should have a pool of that many connections. Failed baselines
+    are logged and the others imported, RuntimeError is raised at the end if
+    any failed. With a FileCatalog the baselines and their files are looked
+    up in it. The rows are written to table. Returns the number of rows
+    written.
+    """
+
+    storage = open_storage(storage)
+    if catalog is None:
+        names = storage.listdir(".")
+    else:
+        names = catalog.listdir(".")
+    baselines = [
+        baseline for baseline in sorted(names) if baseline_regex.search(baseline)
+    ]
+    frames = queue.Queue(maxsize=queue_size)
+    failed = []
+    written = []
+
+    def read(baseline):
+        match = baseline_regex.search(baseline)
+        since = marks.get((match.group(2), match.group(1)))
+        if since is not None:
+            since = (since - pd.to_timedelta(overlap)).floor("60s")
+
+        r_start = time.perf_counter()
+        try:
+            df = read_baseline(storage, baseline, since, reader, catalog)
+        except Exception:
+            logging.exception(f"Reading {baseline} failed")
+            failed.append(baseline)
+            return
+        if df is not None and not df.empty:
+            frames.put((baseline, df, time.perf_counter() - r_start))
+
+    def write():
+        while True:
+            item = frames.get()
+            if item is None:
+                return
+            batch = [item]
+            # take everything already waiting into the same transaction
+            while True:
+                try:
+                    item = frames.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    frames.put(None)
+                    break
+                batch.append(item)
+
+            names = [baseline for baseline, _, _ in batch]
+            # a writer that dies leaves the readers blocked on a full queue
+            try:
+                write_batch(batch)
+            except Exception:
+                logging.exception(f"Writing {names} failed")
+                failed.extend(names)
+
+    def write_batch(batch):
+        w_start = time.perf_counter()
+        upsert(engine, [df for _, df, _ in batch], table=table)
+        w_seconds = time.perf_counter() - w_start
+
+        for baseline, df, r_seconds in batch:
+            key = (df["base"].iloc[0], df["rover"].iloc[0])
+            marks[key] = max(df.index[-1], marks.get(key, df.index[-1]))
+            written.append(len(df))
+            logging.info(
+                "%s: %d rows, read in %.2f s, written in %.2f s, %.0f rows/s",
+                baseline,
+                len(df),
+                r_seconds,
+                w_seconds,
+                len(df) / (r_seconds + w_seconds),
+            )
+
+    r_start = time.perf_counter()
+    threads = [threading.Thread(target=write) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(read, baselines))
+    for _ in threads:
+        frames.put(None)
+    for thread in threads:
+        thread.join()
+
+    seconds = time.perf_counter() - r_start
+    logging.info(
+        "Imported %d rows of %d baselines in %.2f s, %.0f rows/s",
+        sum(written),
+        len(written),
+        seconds,
+        sum(written) / seconds,
+    )
+    if failed:
+        raise RuntimeError(f"Importing {sorted(failed)} failed")
+
+    return sum(written)
+
+
+def program_schedule(
+    engine,
+    marks,
+    overlap,
+    reader=None,
+    workers=4,
+    writers=2,
+    catalog=None,
+    storage=None,
+):
+    logging.info("------------------------------------------")
+    if storage is None:
+        storage = os.environ.get("RTK_IMPORT_NFS", NFS_URL)
+    try:
+        import_baselines(
+            storage,
+            engine,
+            marks,
+            overlap=overlap,
+            reader=reader,
+            workers=workers,
+            writers=writers,
+            catalog=catalog,
+        )
+    except Exception:
+        logging.exception("Import failed, trying again next run")
+        # what was read but not written is older than the reader holds
+        if reader is not None:
+            reader.forget()
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        handlers=[logging.StreamHandler(sys.stdout)],
+    )
+
+    IMPORT_INTERVAL = int(os.environ.get("RTK_IMPORT_INTERVAL", "5"))
+    IMPORT_OVERLAP = int(os.environ.get("RTK_IMPORT_OVERLAP", "10"))
+    IMPORT_WORKERS = int(os.environ.get("RTK_IMPORT_WORKERS", "4"))
+    IMPORT_WRITERS = int(os.environ.get("RTK_IMPORT_WRITERS", "2"))
+
+    logging.info("Establishing SQL connection...")
+    # one connection for each writer
+    engine = psql_engine(pool_size=IMPORT_WRITERS, max_overflow=0)
+    # only what is newer than the latest stored minute of a baseline is read,
+    # the watermarks are then kept up to date here
+    marks = watermarks(engine)
+    logging.info(f"Watermarks of {len(marks)} baselines loaded")
+    overlap = f"{IMPORT_OVERLAP}min"
+    # the files are read from where the last run stopped, holding only the
+    # epochs the overlap reads again and the minute still being filled
+    reader = PosTailReader(keep=f"{IMPORT_OVERLAP + 1}min")
+
+    # a local directory or an nfs:// url, each reading thread mounts its own
+    # context once
+    storage = open_storage(os.environ.get("RTK_IMPORT_NFS", NFS_URL))
+    # the baseline directories are listed once per run instead of once per
+    # baseline and file
+    catalog = FileCatalog(
+        storage, ttl=float(os.environ.get("RTK_CATALOG_TTL", "60"))
+    )
+
+    program_schedule(
+        engine,
+        marks,
+        overlap,
+        reader,
+        IMPORT_WORKERS,
+        IMPORT_WRITERS,
+        catalog,
+        storage,
+    )
+    if IMPORT_INTERVAL <= 0:
+        return
+
+    scheduler = schedule.Scheduler()
+    scheduler.every(IMPORT_INTERVAL).minutes.do(
+        program_schedule,
+        engine,
+        marks,
+        overlap,
+        reader,
+        IMPORT_WORKERS,
+        IMPORT_WRITERS,
+        catalog,
+        storage,
+    )
+    while True:
+        scheduler.run_pending()
+        time.sleep(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+"""
+Bulk writing and reading of one minute baseline resamples in PostgreSQL
+"""
+
+import io
+import logging
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import sqlalchemy as sa
+
+TABLE = "rtk_one_min"
+
+KEY = ["base", "rover", "time"]
+
+COLUMNS = [
+    "time",
+    "base",
+    "rover",
+    "n",
+    "e",
+    "u",
+    "q",
+    "sdn",
+    "sde",
+    "sdu",
+    "sden",
+    "sdnu",
+    "sdue",
+]
+
+BATCH_ROWS = 500000
+
+COPY_ROWS = 10000
+
+# header of PostgreSQL binary COPY data, no flags and no header extension
+COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + bytes(8)
+
+COPY_TRAILER = b"\xff\xff"
+
+PG_EPOCH = np.datetime64("2000-01-01", "us")
+
+
+def psql_engine(database="gps_metrics", **options):
+    """
+    engine for the database given by the RTK_PSQL_* environment variables
+    """
+
+    return sa.create_engine(
+        "postgresql://{user}:{password}@{host}:{port}/{database}".format(
+            user=os.environ.get("RTK_PSQL_USER"),
+            password=os.environ.get("RTK_PSQL_PASS"),
+            host=os.environ.get("RTK_PSQL_HOST"),
+            port=os.environ.get("RTK_PSQL_PORT"),
+            database=database,
+        ),
+        echo=False,
+        future=True,
+        **options,
+    )
+
+
+def table_rows(df):
+    """
+    the rows of a frame indexed by time in the column order of the table
+
+    q is rounded to an integer as PostgreSQL rounds a number stored in it.
+    """
+
+    df = df.reset_index()[COLUMNS]
+    df["q"] = np.floor(df["q"] + 0.5).astype("Int16")
+    return df
+
+
+def _copy_chunks(df):
+    """
+    the rows of a frame as binary COPY data, COPY_ROWS rows at a time
+    """
+
+    yield COPY_HEADER
+    for i in range(0, len(df), COPY_ROWS):
+        yield _binary_rows(df.iloc[i : i + COPY_ROWS])
+    yield COPY_TRAILER
+
+
+def _binary_rows(df):
+    """
+    Rows of the table in the binary COPY format
+
+    Each row is the number of fields followed by the length and big endian
+    value of each field, -1 and no value for NULL. The fields are written
+    into one buffer a byte at a time for all the rows at once.
+    """
+
+    fields = []
+    for column in COLUMNS:
+        values = df[column]
+        null = values.isna().to_numpy()
+        if column == "time":
+            data = (values.to_numpy("datetime64[us]") - PG_EPOCH).astype(">i8")
+        elif column in ["base", "rover"]:
+            data = np.array(values.fillna("").str.encode("utf-8").tolist(), dtype="S")
+        elif column == "q":
+            data = values.fillna(0).to_numpy("int16").astype(">i2")
+        else:
+            data = values.to_numpy("float32").astype(">f4")
+        width = data.dtype.itemsize
+        if data.dtype.kind == "S":
+            sizes = np.char.str_len(data)
+        else:
+            sizes = np.full(len(df), width)
+        sizes[null] = 0
+        lengths = np.where(null, -1, sizes).astype(">i4")
+        fields.append((data.view(np.uint8).reshape(-1, width), sizes, lengths))
+
+    row_sizes = 2 + sum(4 + sizes for _, sizes, _ in fields)
+    starts = np.cumsum(row_sizes) - row_sizes
+    buf = np.zeros(row_sizes.sum(), dtype=np.uint8)
+    buf[starts + 1] = len(COLUMNS)
+
+    pos = starts + 2
+    for data, sizes, lengths in fields:
+        lengths = lengths.view(np.uint8).reshape(-1, 4)
+        for k in range(4):
+            buf[pos + k] = lengths[:, k]
+        pos = pos + 4
+        for k in range(data.shape[1]):
+            keep = sizes > k
+            buf[pos[keep] + k] = data[keep, k]
+        pos = pos + sizes
+
+    return buf.tobytes()
+
+
+class _CopyStream(io.RawIOBase):
+    """
+    file object reading the bytes of _copy_chunks, made as they are read
+    """
+
+    def __init__(self, df):
+        self._chunks = _copy_chunks(df)
+        self._buffer = io.BytesIO()
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        parts = []
+        while size != 0:
+            data = self._buffer.read(size)
+            if data:
+                parts.append(data)
+                if size > 0:
+                    size -= len(data)
+                continue
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer = io.BytesIO(chunk)
+        return b"".join(parts)
+
+
+def _copy(cursor, sql, df):
+    """
+    COPY the rows of df with a psycopg2 or a psycopg 3 cursor
+    """
+
+    if hasattr(cursor, "copy_expert"):
+        cursor.copy_expert(sql, _CopyStream(df))
+    else:
+        with cursor.copy(sql) as copy:
+            for chunk in _copy_chunks(df):
+                copy.write(chunk)
+
+
+def copy_upsert(conn, frames, table=TABLE):
+    """
+    Write frames into table in the transaction of conn
+
+    The rows are streamed with COPY into a temporary table that is merged
+    into table and dropped on commit, rows already there are updated. Of
+    rows with the same base, rover and time the last one is kept. frames
+    are indexed by time and have the base, rover and value columns of the
+    table. Returns the number of rows merged.
+    """
+
+    frames = [table_rows(df) for df in frames if not df.empty]
+    if not frames:
+        return 0
+    df = pd.concat(frames, ignore_index=True).drop_duplicates(KEY, keep="last")
+
+    staging = f"{table}_staging"
+    columns = ", ".join(COLUMNS)
+    updates = ", ".join(
+        f"{column} = EXCLUDED.{column}" for column in COLUMNS if column not in KEY
+    )
+
+    # dropped at the end of the transaction, also when it is rolled back
+    conn.exec_driver_sql(
+        f"CREATE TEMPORARY TABLE {staging} (LIKE {table} INCLUDING DEFAULTS) "
+        "ON COMMIT DROP"
+    )
+    cursor = conn.connection.cursor()
+    try:
+        _copy(
+            cursor, f"COPY {staging} ({columns}) FROM STDIN WITH (FORMAT binary)", df
+        )
+    finally:
+        cursor.close()
+    result = conn.exec_driver_sql(
+        f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging} "
+        f"ON CONFLICT ({', '.join(KEY)}) DO UPDATE SET {updates}"
+    )
+
+    return result.rowcount
+
+
+def upsert(engine, frames, table=TABLE, batch_rows=BATCH_ROWS):
+    """
+    Write frames into table, many frames per transaction
+
+    Frames are gathered until they hold batch_rows rows and each batch is
+    written with copy_upsert in its own transaction. Returns the number of
+    rows written and logs the rate.
+    """
+
+    r_start = time.perf_counter()
+    total = 0
+    batch = []
+    nrows = 0
+    for df in frames:
+        batch.append(df)
+        nrows += len(df)
+        if nrows >= batch_rows:
+            total += _write_batch(engine, batch, table)
+            batch = []
+            nrows = 0
+    if batch:
+        total += _write_batch(engine, batch, table)
+
+    seconds = time.perf_counter() - r_start
+    logging.info(
+        "Wrote %d rows to %s in %.2f s, %.0f rows/s",
+        total,
+        table,
+        seconds,
+        total / seconds if seconds else 0,
+    )
+    return total
+
+
+def watermarks(engine, table=TABLE):
+    """
+    latest time stored for each (base, rover) in table
+    """
+
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(
+            f"SELECT base, rover, max(time) FROM {table} GROUP BY base, rover"
+        )
+        return {(base, rover): pd.Timestamp(latest) for base, rover, latest in rows}
+
+
+def read_minutes(engine, baselines, start, end, bucket=None, table=TABLE):
+    """
+    N, E and U of many ROVR-BASE baselines from start to end in one query
+
+    With bucket, a time delta, the minutes are aggregated to their median
+    in buckets of that length with the TimescaleDB time_bucket function.
+    Returns a frame of n, e and u indexed by baseline and time.
+    """
+
+    pairs = {tuple(baseline.split("-")[::-1]) for baseline in baselines}
+    options = {
+        "bases": sorted({base for base, _ in pairs}),
+        "rovers": sorted({rover for _, rover in pairs}),
+        "start": start,
+        "end": end,
+    }
+    where = (
+        "base = ANY(:bases) AND rover = ANY(:rovers) "
+        "AND time >= :start AND time <= :end"
+    )
+    if bucket is None:
+        sql = f"SELECT base, rover, time, n, e, u FROM {table} WHERE {where}"
+    else:
+        options["bucket"] = f"{pd.to_timedelta(bucket).total_seconds()} seconds"
+        medians = ", ".join(
+            f"percentile_cont(0.5) WITHIN GROUP (ORDER BY {column}) AS {column}"
+            for column in ["n", "e", "u"]
+        )
+        sql = (
+            "SELECT base, rover, time_bucket(CAST(:bucket AS interval), time) "
+            f"AS bucket, {medians} FROM {table} WHERE {where} "
+            "GROUP BY base, rover, bucket"
+        )
+
+    with engine.connect() as conn:
+        rows = conn.execute(sa.text(sql + " ORDER BY 1, 2, 3"), options).all()
+
+    df = pd.DataFrame(rows, columns=["base", "rover", "time", "n", "e", "u"])
+    df = df[[pair in pairs for pair in zip(df["base"], df["rover"])]].assign(
+        baseline=lambda df: df["rover"] + "-" + df["base"],
+        time=lambda df: pd.to_datetime(df["time"]),
+    )
+
+    return df.set_index(["baseline", "time"])[["n", "e", "u"]].astype(float)
+
+
+def _write_batch(engine, frames, table):
+    with engine.begin() as conn:
+        return copy_upsert(conn, frames, table)
@@ -0,0 +1,235 @@
+"""
+Loading the .pos files of many baselines into one data frame
+"""
+
+import logging
+import os
+import time
+
+import pandas as pd
+from gtimes.timefunc import datepathlist
+
+from rtk_gps.catalog import FileCatalog
+from rtk_gps.nfsio import file_size, file_stat, open_stream
+from rtk_gps.posfile import empty_frame, pos_columns, read_pos, select
+
+
+def datafiles(baseline, start, end):
+    """
+    paths of the daily .pos files of a baseline covering start to end
+    """
+
+    date_list = list(set(datepathlist("%Y%m%d", "2h", start, end, closed="both")))
+    return [
+        os.path.join(baseline, "{}{}0000b.pos".format(baseline, date))
+        for date in date_list
+    ]
+
+
+def read_file(
+    filename,
+    nfs,
+    col_names,
+    engine="pandas",
+    reader=None,
+    cache=None,
+    usecols=None,
+    start=None,
+    end=None,
+):
+    """
+    one data file as a data frame, from the cache when it is there
+
+    A reader or a cache work on whole files, usecols and start to end are
+    then applied to what they return. Otherwise they are passed on to the
+    parser.
+    """
+
+    options = {"usecols": usecols, "start": start, "end": end}
+
+    if cache is not None:
+        size, mtime = file_stat(filename, nfs)
+        df = cache.get(filename, size, mtime)
+        if df is not None:
+            logging.info("Loaded %s from the cache", filename)
+            if reader is not None:
+                # the file is read from the cache until it changes
+                reader.forget(filename)
+            return select(df, **options)
+
+    if reader is not None:
+        df = reader.read(filename, nfs, col_names)
+    elif file_size(filename, nfs) > 0:
+        logging.info("Reading %s...", filename)
+        with open_stream(filename, nfs) as stream:
+            if cache is None:
+                return read_pos(stream, col_names, engine=engine, **options)
+            df = read_pos(stream, col_names, engine=engine)
+    else:
+        return empty_frame(col_names, usecols)
+
+    if cache is not None:
+        cache.put(filename, size, mtime, df)
+
+    return select(df, **options)
+
+
+def load_baselines(
+    baselines,
+    nfs,
+    start=None,
+    end=None,
+    columns=None,
+    file_type="",
+    filt=[5],
+    engine="fast",
+    reader=None,
+    cache=None,
+    date_list=None,
+    path="",
+    metrics=None,
+    starts=None,
+):
+    """
+    Load many baselines into one frame indexed by baseline and epoch
+
+    The daily files covering start to end are read, or those of date_list
+    when it is given, from the baseline directories under path. With a
+    FileCatalog as nfs only the files it lists are read. See load_files for
+    the other arguments.
+    """
+
+    filelists = {}
+    for baseline in baselines:
+        b_start = start if starts is None else starts.get(baseline, start)
+        if date_list is None and isinstance(nfs, FileCatalog):
+            filelists[baseline] = nfs.datafiles(baseline, b_start, end, path)
+            continue
+        if date_list is None:
+            filelist = datafiles(baseline, b_start, end)
+        else:
+            filelist = [
+                os.path.join(baseline, f"{baseline}{date}0000b.pos")
+                for date in date_list
+            ]
+        filelists[baseline] = [os.path.join(path, fn) for fn in filelist]
+
+    return load_files(
+        filelists,
+        nfs,
+        start=start,
+        end=end,
+        columns=columns,
+        file_type=file_type,
+        filt=filt,
+        engine=engine,
+        reader=reader,
+        cache=cache,
+        metrics=metrics,
+        starts=starts,
+    )
+
+
+def load_files(
+    filelists,
+    nfs,
+    start=None,
+    end=None,
+    columns=None,
+    file_type="",
+    filt=[5],
+    engine="fast",
+    reader=None,
+    cache=None,
+    metrics=None,
+    starts=None,
+):
+    """
+    Load the files of many baselines into one frame
+
+    filelists maps each baseline to its files. Only the given columns and the
+    epochs from start to end are parsed, rows with a quality Q in filt are
+    dropped and the frames are concatenated once into a frame indexed by
+    baseline and date_time. starts maps baselines to a start of their own,
+    used instead of start for them. Missing files and files that fail to
+    parse are skipped. The seconds spent on each baseline and the rows
+    parsed are set in metrics, a Metrics.
+    """
+
+    col_names = pos_columns(file_type)
+    if columns is None:
+        columns = col_names[2:]
+    usecols = list(columns)
+    if filt and "Q" not in usecols:
+        usecols.append("Q")
+
+    r_start = time.perf_counter()
+    frames = []
+    keys = []
+    for baseline, filelist in filelists.items():
+        b_start = time.perf_counter()
+        rows = 0
+        first = start if starts is None else starts.get(baseline, start)
+        for filename in sorted(filelist):
+            try:
+                df = read_file(
+                    filename,
+                    nfs,
+                    col_names,
+                    engine=engine,
+                    reader=reader,
+                    cache=cache,
+                    usecols=usecols,
+                    start=first,
+                    end=end,
+                )
+            except IOError:
+                continue
+            except ValueError as e:
+                logging.error("Failed to parse %s, skipping it: %s", filename, e)
+                continue
+            rows += len(df)
+            if not df.empty:
+                frames.append(df)
+                keys.append(baseline)
+        if metrics is not None:
+            metrics.set(
+                "rtk_baseline_seconds",
+                time.perf_counter() - b_start,
+                baseline=baseline,
+                stage="parse",
+            )
+            metrics.set("rtk_baseline_rows", rows, baseline=baseline)
+
+    if not frames:
+        index = pd.MultiIndex.from_arrays(
+            [[], pd.DatetimeIndex([])], names=["baseline", "date_time"]
+        )
+        return pd.DataFrame(columns=columns, index=index)
+
+    df = pd.concat(frames, keys=keys, names=["baseline", "date_time"])
+    df = df.dropna()
+    if filt:
+        df = df[~df["Q"].isin(filt)]
+    if list(df.columns) != list(columns):
+        df = df[columns]
+
+    logging.info(
+        "Run time: %f s for loading %d files of %d baselines",
+        time.perf_counter() - r_start,
+        sum(len(filelist) for filelist in filelists.values()),
+        len(filelists),
+    )
+    return df
+
+
+def baseline_frame(df, baseline):
+    """
+    the epochs of one baseline from a frame returned by load_files
+    """
+
+    try:
+        return df.xs(baseline, level="baseline")
+    except KeyError:
+        index = pd.DatetimeIndex([], name="date_time")
+        return pd.DataFrame(columns=df.columns, index=index)
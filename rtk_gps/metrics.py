@@ -0,0 +1,165 @@
+"""
+Durations and counts of the scheduler stages in the Prometheus text format
+"""
+
+import logging
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# type and help of each metric, the values of gauges are those of the last run
+METRICS = {
+    "rtk_cycles_total": ("counter", "Scheduler runs"),
+    "rtk_cycle_failures_total": ("counter", "Scheduler runs that failed"),
+    "rtk_cycle_seconds": ("gauge", "Duration of the last run"),
+    "rtk_cycle_end_timestamp_seconds": ("gauge", "Unix time the last run ended"),
+    "rtk_stage_seconds": (
+        "gauge",
+        "Duration of the fetch, parse, resample, render and upload stages",
+    ),
+    "rtk_baseline_seconds": ("gauge", "Duration of each stage for a baseline"),
+    "rtk_baseline_bytes": ("gauge", "Bytes of the data files of a baseline fetched"),
+    "rtk_baseline_rows": ("gauge", "Rows of the data files of a baseline parsed"),
+    "rtk_figure_seconds": ("gauge", "Duration of each stage for a figure"),
+    "rtk_figure_bytes": ("gauge", "Size of a figure when it was last uploaded"),
+    "rtk_figures": ("gauge", "Figures of the last run by state"),
+    "rtk_cache_hits_total": ("counter", "Lookups served from each cache"),
+    "rtk_cache_misses_total": ("counter", "Lookups each cache could not serve"),
+}
+
+
+class Metrics:
+    """
+    Latest value of each metric by its labels, exported for Prometheus
+
+    Only the metrics in METRICS can be set. The values can be read by
+    Prometheus from a file written with write, for the textfile collector of
+    node_exporter, or from a local HTTP endpoint started with serve. Values
+    can be set from several threads at once.
+    """
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def set(self, name, value, **labels):
+        """
+        set metric name with labels to value
+        """
+
+        key = self._key(name, labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def add(self, name, value=1, **labels):
+        """
+        add value to metric name with labels
+        """
+
+        key = self._key(name, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + value
+
+    def get(self, name, **labels):
+        """
+        value of metric name with labels, None when it has not been set
+        """
+
+        with self._lock:
+            return self._values.get(self._key(name, labels))
+
+    def text(self):
+        """
+        every metric set so far in the Prometheus text exposition format
+        """
+
+        with self._lock:
+            values = sorted(self._values.items())
+
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            samples = [(labels, value) for (n, labels), value in values if n == name]
+            if not samples:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                if labels:
+                    label_str = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+                    lines.append(f"{name}{{{label_str}}} {value!r}")
+                else:
+                    lines.append(f"{name} {value!r}")
+
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """
+        write the metrics to path, replacing it at once so it is never read
+        half written
+        """
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.text())
+        os.replace(tmp_path, path)
+
+    def serve(self, port, host="127.0.0.1"):
+        """
+        serve the metrics at http://host:port/metrics from a daemon thread,
+        returns the server
+        """
+
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = metrics.text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logging.debug("Metrics request: " + format, *args)
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        logging.info("Serving metrics at http://%s:%d/metrics", host, port)
+        return server
+
+    def _key(self, name, labels):
+        if name not in METRICS:
+            raise ValueError(f"Unknown metric {name}, add it to METRICS")
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def record_figures(metrics, durations, stage="render"):
+    """
+    set the seconds stage took for each figure, durations maps the figure
+    files to them
+    """
+
+    for fig_name, seconds in durations.items():
+        metrics.set(
+            "rtk_figure_seconds",
+            seconds,
+            figure=os.path.basename(fig_name),
+            stage=stage,
+        )
+
+
+def baseline_of(filename):
+    """
+    the baseline a data file belongs to, from the directory holding it
+    """
+
+    return os.path.basename(os.path.dirname(filename)) or filename[:9]
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
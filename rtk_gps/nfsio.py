@@ -0,0 +1,31 @@
+"""
+Streaming access to data files on a local disk or over libnfs
+
+nfs is anything open_storage takes, None for the local disk.
+"""
+
+from rtk_gps.storage import CHUNK_SIZE, open_storage
+
+
+def file_size(filename, nfs):
+    """
+    size of a file in bytes, on local disk when nfs is None
+    """
+
+    return open_storage(nfs).stat(filename)["size"]
+
+
+def open_stream(filename, nfs, chunk_size=CHUNK_SIZE):
+    """
+    open a file for buffered binary reading, on local disk when nfs is None
+    """
+
+    return open_storage(nfs).open_stream(filename, chunk_size)
+
+
+def file_stat(filename, nfs):
+    """
+    size in bytes and modification time in ns of a file
+    """
+
+    return open_storage(nfs).attributes(filename)
@@ -9,11 +9,12 @@ import os
 from datetime import datetime as dt
 from pathlib import Path
 
-import libnfs
 import matplotlib.pyplot as plt
 # from numpy import who
 
-from rtk_gps.rtk_gps import plot_rtk_neu
+from rtk_gps.cache import FrameCache
+from rtk_gps.rtk_gps import DATA_SOURCES, plot_rtk_neu
+from rtk_gps.storage import open_storage
 
 # from rtk_gps import plot_rtk_neu
 
@@ -23,7 +24,7 @@ def main():
     cli program to plot real time GPS time series
     """
 
-    nfs = libnfs.NFS("nfs://rtk.vedur.is/home/gpsops/rtklib-run/data")
+    nfs_url = "nfs://rtk.vedur.is/home/gpsops/rtklib-run/data"
 
     projectdir = os.path.split(os.path.dirname(__file__))[0]
     configpath = os.path.join(os.path.join(projectdir, "config"), "config.ini")
@@ -35,6 +36,11 @@ def main():
     figure_path = Path(os.path.join(projectdir, config["Paths"]["figurepath"]))
 
     logo = str(Path(os.path.join(projectdir, config["Paths"]["logopath"]), config["Paths"]["logo"]))
+    cache_path = os.path.join(projectdir, config["Cache"]["cachepath"])
+    archive_path = os.path.join(
+        projectdir, config.get("Archive", "archivepath", fallback="data")
+    )
+    cache_size = config.getint("Cache", "cachesize") * 1024**2
 
     if os.path.exists(figure_path) == False:
         os.mkdir(figure_path)
@@ -48,7 +54,16 @@ def main():
     # initialising  few variables
     start = end = None
     save_allow = ["png", "pdf"]
-    special_allow = ["6h", "12h", "day", "twodays", "threedays", "week"]
+    special_allow = [
+        "6h",
+        "12h",
+        "day",
+        "twodays",
+        "threedays",
+        "week",
+        "month",
+        "year",
+    ]
 
     parser = argparse.ArgumentParser(
         description="Plot tool for realtime time series.",
@@ -86,7 +101,8 @@ def main():
         type=str,
         default="twodays",
         choices=special_allow,
-        help="For routine plots: one day, two days, three days and a week",
+        help="For routine plots: one day, two days, three days, a week, a month "
+        + "and a year, the longer ones best plotted from the archive",
     )
     parser.add_argument(
         "-l",
@@ -113,7 +129,35 @@ def main():
         nargs="?",
         default="",
         const=file_path,
-        help="Time series input directory",
+        help="Time series input directory, or an nfs:// url, instead of "
+        + "the data files on the NFS server",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Parse the data files even when they are in the local cache",
+    )
+    parser.add_argument(
+        "--source",
+        type=str,
+        default="files",
+        choices=DATA_SOURCES,
+        help="Read the data files, the one minute medians in the database "
+        + "given by the RTK_PSQL_* environment variables or the medians archived "
+        + "by save_rtk_data at the resolution the period needs",
+    )
+    parser.add_argument(
+        "--resample",
+        type=str,
+        default=resample_str,
+        help="Resampling period of the plotted data, e.g. 1min or 10min",
+    )
+
+    parser.add_argument(
+        "--points",
+        type=int,
+        default=None,
+        help="Thin each line to at most this many points, keeping spikes and steps",
     )
 
     args = parser.parse_args()
@@ -130,16 +174,31 @@ def main():
     if args.figDir:
         figure_path = args.figDir
 
+    cache = None
+    if not args.no_cache:
+        cache = FrameCache(cache_path, max_bytes=cache_size)
+
+    db = None
+    if args.source == "database":
+        from rtk_gps.ingest import psql_engine
+
+        db = psql_engine()
+
     plot_rtk_neu(
-        nfs,
+        open_storage(args.Dir or nfs_url),
         baseline_list,
         start=start,
         end=end,
-        resample=resample_str,
+        resample=args.resample,
         special=special,
         figurepath=figure_path,
         logo=logo,
         figtype=figtype,
+        cache=cache,
+        source=args.source,
+        db=db,
+        archive=archive_path,
+        max_points=args.points,
     )
 
 
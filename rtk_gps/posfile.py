@@ -0,0 +1,409 @@
+"""
+Reading RTKLIB .pos solution files into data frames
+"""
+
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+from rtk_gps.nfsio import CHUNK_SIZE
+
+COORDINATE_COLUMNS = [
+    "date",
+    "time",
+    "latitude",
+    "longitude",
+    "height",
+    "Q",
+    "ns",
+    "sdn",
+    "sde",
+    "sdu",
+    "sdne",
+    "sdeu",
+    "sdun",
+    "age",
+    "ratio",
+]
+
+#  UTC, e-baseline(m), n-baseline(m)i,u-baseline(m), Q, ns, sde(m), sdn(m), sdu(m), sden(m), sdnu(m), (m), age(s)  ratio
+BASELINE_COLUMNS = [
+    "date",
+    "time",
+    "e-baseline",
+    "n-baseline",
+    "u-baseline",
+    "Q",
+    "ns",
+    "sdn",
+    "sde",
+    "sdu",
+    "sdne",
+    "sdeu",
+    "sdun",
+    "age",
+    "ratio",
+]
+
+DATE_FORMAT = "%Y/%m/%d%H:%M:%S.%f"
+
+ENGINES = ["pandas", "fast"]
+
+# byte offsets of the separators in "YYYY/MM/DD HH:MM:SS.fff"
+_STAMP_SEPARATORS = {4: b"/", 7: b"/", 10: b" ", 13: b":", 16: b":", 19: b"."}
+
+
+def pos_columns(file_type="rtk_coordinate"):
+    """
+    column names of a .pos file of a given type
+    """
+
+    if file_type == "rtk_coordinate":
+        return COORDINATE_COLUMNS
+    else:
+        return BASELINE_COLUMNS
+
+
+def empty_frame(col_names, usecols=None):
+    """
+    empty frame with the columns open_datafile returns
+    """
+
+    return pd.DataFrame(columns=col_names[2:] if usecols is None else usecols)
+
+
+def read_pos(
+    source,
+    col_names,
+    engine="pandas",
+    chunk_size=CHUNK_SIZE,
+    usecols=None,
+    start=None,
+    end=None,
+):
+    """
+    Read a single .pos file into a data frame indexed by epoch
+
+    source can be a path or a binary file object, engine is one of ENGINES.
+    The fast engine parses the file chunk_size bytes at a time. Only the
+    columns in usecols and the epochs from start to end are returned, the
+    fast engine skips the other lines before parsing them.
+    """
+
+    options = {"usecols": usecols, "start": start, "end": end}
+    if engine == "pandas":
+        return select(_read_pos_pandas(source, col_names), **options)
+    elif engine == "fast":
+        if hasattr(source, "read"):
+            return _read_pos_fast(source, col_names, chunk_size, **options)
+        with open(source, "rb") as f:
+            return _read_pos_fast(f, col_names, chunk_size, **options)
+    else:
+        raise ValueError(f"Unknown engine {engine}, use one of {ENGINES}")
+
+
+def select(df, usecols=None, start=None, end=None):
+    """
+    columns and time window of an already parsed frame
+    """
+
+    if usecols is not None:
+        df = df[usecols]
+    if (start is not None or end is not None) and not df.empty:
+        df = df.loc[start:end]
+
+    return df
+
+
+def _read_pos_fast(stream, col_names, chunk_size, **options):
+    """
+    parse a whole stream, including a complete but unterminated last line
+    """
+
+    df, _ = parse_pos_stream(stream, col_names, chunk_size, **options)
+    rest = stream.read()
+    if rest:
+        tail = parse_pos(rest, col_names, **options)
+        if df.empty:
+            df = tail
+        elif not tail.empty:
+            df = pd.concat([df, tail])
+
+    return df
+
+
+def parse_pos_stream(stream, col_names, chunk_size=CHUNK_SIZE, **options):
+    """
+    Parse the newline terminated lines of a stream from its current position
+
+    The stream is read in blocks of chunk_size bytes to bound the memory held
+    as bytes. Returns the frame and the number of bytes parsed, a trailing
+    partial line is left unparsed and is not counted. options are passed on
+    to parse_pos.
+    """
+
+    frames = []
+    nbytes = 0
+    rest = b""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        block = rest + chunk
+        last = block.rfind(b"\n") + 1
+        rest = block[last:]
+        if last:
+            frames.append(parse_pos(block[:last], col_names, **options))
+            nbytes += last
+
+    # leave the partial line for the caller to read again
+    if rest:
+        stream.seek(-len(rest), os.SEEK_CUR)
+
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return empty_frame(col_names, options.get("usecols")), nbytes
+    elif len(frames) == 1:
+        return frames[0], nbytes
+    else:
+        return pd.concat(frames), nbytes
+
+
+def _read_pos_pandas(source, col_names):
+    """
+    generic whitespace separated read with string date parsing
+    """
+
+    df = pd.read_csv(
+        source,
+        header=None,
+        sep=r"\s+",
+        comment="%",
+        names=col_names,
+    )
+    if not df.empty:
+        df["date_time"] = pd.to_datetime(df["date"] + df["time"], format=DATE_FORMAT)
+        df.drop(columns=["date", "time"], inplace=True)
+        df.set_index("date_time", inplace=True)
+
+    return df
+
+
+def parse_pos(data, col_names, usecols=None, start=None, end=None):
+    """
+    Parse the bytes of a .pos file using its fixed layout
+
+    Lines starting with % are dropped by looking at the first byte of each
+    line, other lines are cut at a % as with comment="%" and the epoch is
+    built from the fixed position digits of "YYYY/MM/DD HH:MM:SS.fff" with
+    integer arithmetic. An unterminated last line, as left behind by a file
+    still being written, is only kept when it holds all the columns, as is
+    any other line. Lines with epochs outside start to end are dropped
+    before the numbers are parsed and only the usecols columns are parsed.
+    """
+
+    if usecols is None:
+        usecols = col_names[2:]
+
+    body = _data_lines(data, len(col_names))
+    if not body:
+        return empty_frame(col_names, usecols)
+
+    buf = np.frombuffer(body, dtype=np.uint8)
+    starts = _line_starts(buf)
+    stamps = _stamps(buf, starts)
+
+    if start is not None or end is not None:
+        keep = np.ones(len(stamps), dtype=bool)
+        if start is not None:
+            keep &= stamps >= np.datetime64(start)
+        if end is not None:
+            keep &= stamps <= np.datetime64(end)
+        if not keep.any():
+            return empty_frame(col_names, usecols)
+        elif not keep.all():
+            body = _keep_lines(body, starts, keep)
+            stamps = stamps[keep]
+
+    index = pd.DatetimeIndex(stamps, name="date_time")
+
+    dtypes = {name: "float64" for name in usecols}
+    dtypes.update({name: "int64" for name in ["Q", "ns"] if name in usecols})
+    df = pd.read_csv(
+        io.BytesIO(body),
+        header=None,
+        sep=" ",
+        skipinitialspace=True,
+        names=col_names,
+        usecols=usecols,
+        dtype=dtypes,
+    )
+    if list(df.columns) != list(usecols):
+        df = df[usecols]
+    df.index = index
+
+    return df
+
+
+def _data_lines(data, ncols):
+    """
+    the newline terminated data lines of a .pos file, headers removed
+    """
+
+    if data[-1:] != b"\n":
+        last = data.rfind(b"\n") + 1
+        if len(data[last:].split()) == ncols:
+            data = data + b"\n"
+        else:
+            data = data[:last]
+
+    if not data:
+        return data
+
+    buf = np.frombuffer(data, dtype=np.uint8)
+    starts = _line_starts(buf)
+    first = buf[starts]
+    skip = (first == ord("%")) | (first == ord("\n"))
+    if skip.any():
+        # RTKLIB writes a header block at the top and again when a run is
+        # restarted on the same file, so keep each run of data lines between
+        # them
+        data = _keep_lines(data, starts, ~skip)
+
+    if b"%" in data:
+        data = _cut_comments(data, ncols)
+
+    if not data:
+        return data
+
+    return _well_formed(data, ncols)
+
+
+def _cut_comments(data, ncols):
+    """
+    data lines cut at their first %, as comment="%" of pandas does
+
+    A run restarted in the middle of a line writes its header right after
+    the partial line, such lines left with fewer than ncols fields are
+    dropped.
+    """
+
+    pieces = []
+    pos = 0
+    cut = data.find(b"%")
+    while cut >= 0:
+        line_start = data.rfind(b"\n", 0, cut) + 1
+        line_end = data.find(b"\n", cut) + 1
+        pieces.append(data[pos:line_start])
+        line = data[line_start:cut]
+        if len(line.split()) == ncols:
+            pieces.append(line.rstrip() + b"\n")
+        pos = line_end
+        cut = data.find(b"%", pos)
+    pieces.append(data[pos:])
+
+    return b"".join(pieces)
+
+
+def _well_formed(data, ncols):
+    """
+    data lines with ncols fields after a fixed layout epoch
+
+    A line garbled or cut short, by a crashed run or a partial copy, is
+    dropped instead of failing the whole file in read_csv, and trailing
+    blanks, which read_csv takes for an extra field, are removed.
+    """
+
+    buf = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(buf == ord("\n"))
+    starts = np.concatenate(([0], ends[:-1] + 1))
+
+    # spaces, tabs, carriage returns and newlines, all at or below b" "
+    blank = buf <= ord(" ")
+    # a field starts at a non blank byte following a blank one or the start
+    first = ~blank
+    first[1:] &= blank[:-1]
+    bounds = np.append(starts, len(buf))
+    fields = np.diff(np.searchsorted(np.flatnonzero(first), bounds))
+
+    keep = (fields == ncols) & (ends - starts > 20)
+    # only the lines long enough to hold an epoch are looked at
+    long_lines = np.flatnonzero(keep)
+    at = starts[long_lines]
+    stamp = np.ones(len(at), dtype=bool)
+    for offset in range(20):
+        byte = buf[at + offset]
+        if offset in _STAMP_SEPARATORS:
+            stamp &= byte == ord(_STAMP_SEPARATORS[offset])
+        else:
+            stamp &= (byte >= ord("0")) & (byte <= ord("9"))
+    keep[long_lines] = stamp
+
+    trailing = blank[np.maximum(ends - 1, 0)] & keep
+    if trailing.any():
+        lines = [data[s:e] for s, e in zip(starts[keep], ends[keep])]
+        return b"".join(line.rstrip() + b"\n" for line in lines)
+    elif not keep.all():
+        return _keep_lines(data, starts, keep) if keep.any() else b""
+
+    return data
+
+
+def _line_starts(buf):
+    """
+    offsets of the lines in newline terminated bytes
+    """
+
+    return np.concatenate(([0], np.flatnonzero(buf == ord("\n"))[:-1] + 1))
+
+
+def _keep_lines(data, starts, keep):
+    """
+    the lines of data where keep is True, copying each run of them once
+    """
+
+    ends = np.concatenate((starts[1:], [len(data)]))
+    edges = np.diff(np.concatenate(([0], keep.view(np.int8), [0])))
+    run_starts = starts[np.flatnonzero(edges == 1)]
+    run_ends = ends[np.flatnonzero(edges == -1) - 1]
+    if len(run_starts) == 1:
+        return data[run_starts[0] : run_ends[0]]
+
+    return b"".join(data[s:e] for s, e in zip(run_starts, run_ends))
+
+
+def _stamps(buf, starts):
+    """
+    datetime64 epochs from the fixed layout time stamp at each line start
+    """
+
+    for offset, sep in _STAMP_SEPARATORS.items():
+        if not (buf[starts + offset] == ord(sep)).all():
+            raise ValueError("Epochs are not in YYYY/MM/DD HH:MM:SS.fff format")
+
+    # number of decimals in the seconds, same for every line in a file
+    ndec = 0
+    while 20 + ndec < len(buf) and chr(buf[20 + ndec]).isdigit():
+        ndec += 1
+
+    def digits(offset, width):
+        value = np.zeros(len(starts), dtype=np.int64)
+        for i in range(offset, offset + width):
+            value = value * 10 + (buf[starts + i].astype(np.int64) - ord("0"))
+        return value
+
+    year = digits(0, 4)
+    month = digits(5, 2)
+    day = digits(8, 2)
+    seconds = digits(11, 2) * 3600 + digits(14, 2) * 60 + digits(17, 2)
+    fraction = digits(20, ndec) * 10 ** (9 - ndec)
+
+    months = ((year - 1970) * 12 + month - 1).astype("datetime64[M]")
+    days = months.astype("datetime64[D]") + (day - 1).astype("timedelta64[D]")
+
+    return days.astype("datetime64[ns]") + (seconds * 10**9 + fraction).astype(
+        "timedelta64[ns]"
+    )
+
@@ -0,0 +1,256 @@
+"""
+Publishing the figures to the CDN over SFTP
+"""
+
+import hashlib
+import logging
+import os
+import posixpath
+import queue
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import paramiko
+
+
+def ssh_connect(host, username, pkey, port=22, keepalive=30):
+    """
+    an SSH connection to host kept alive every keepalive seconds
+    """
+
+    client = paramiko.SSHClient()
+    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    client.connect(host, port=port, username=username, pkey=pkey)
+    client.get_transport().set_keepalive(keepalive)
+    return client
+
+
+def file_digest(path):
+    """
+    sha256 of the content of a local file
+    """
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024**2), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Publisher:
+    """
+    Upload the files of a directory that changed since they were last sent
+
+    connect returns a paramiko.SSHClient, or something with the same
+    open_sftp, get_transport and close, it is called again when the
+    connection has dropped. The connection is kept between publish calls
+    and up to workers files are sent at once, each over its own SFTP
+    channel. A file is written under a temporary name and renamed over the
+    old one, so the remote side never serves a partial file. Files whose
+    content is the same as when they were last sent are skipped.
+    """
+
+    def __init__(self, connect, remote_path, workers=4):
+        self.connect = connect
+        self.remote_path = remote_path
+        self.workers = workers
+        self._client = None
+        self._channels = queue.LifoQueue()
+        self._digests = {}
+        self._lock = threading.Lock()
+
+    def publish(self, directory, retries=1, metrics=None):
+        """
+        send the files in directory that changed, returns the counts of
+        uploaded, skipped and failed files
+
+        Files that fail are sent again over a new connection up to retries
+        times, those still failing are logged and tried on the next publish.
+        The seconds and bytes of each upload are set in metrics, a Metrics.
+        """
+
+        p_start = time.perf_counter()
+        changed = {}
+        skipped = 0
+        for fn in sorted(os.listdir(directory)):
+            local_path = os.path.join(directory, fn)
+            if not os.path.isfile(local_path):
+                continue
+            digest = file_digest(local_path)
+            if self._digests.get(fn) == digest:
+                skipped += 1
+            else:
+                changed[fn] = (local_path, digest)
+
+        pending = sorted(changed)
+        uploaded = 0
+        for attempt in range(retries + 1):
+            if not pending:
+                break
+            if attempt > 0:
+                logging.warning("Reconnecting to send %d files again", len(pending))
+                self.close()
+
+            failed = []
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                jobs = {
+                    executor.submit(self._upload, changed[fn][0], fn): fn
+                    for fn in pending
+                }
+                for job, fn in jobs.items():
+                    try:
+                        seconds = job.result()
+                    except Exception as e:
+                        logging.error(f"Failed to transfer {fn}: {e}")
+                        failed.append(fn)
+                        continue
+                    self._digests[fn] = changed[fn][1]
+                    uploaded += 1
+                    logging.info(f"{fn} transferred.")
+                    if metrics is not None:
+                        metrics.set(
+                            "rtk_figure_seconds", seconds, figure=fn, stage="upload"
+                        )
+                        metrics.set(
+                            "rtk_figure_bytes",
+                            os.path.getsize(changed[fn][0]),
+                            figure=fn,
+                        )
+            pending = failed
+
+        logging.info(
+            "Published %d files, %d unchanged, %d failed in %.2f s",
+            uploaded,
+            skipped,
+            len(pending),
+            time.perf_counter() - p_start,
+        )
+        return uploaded, skipped, len(pending)
+
+    def close(self):
+        """
+        close the channels and the connection, the next upload reconnects
+        """
+
+        with self._lock:
+            self._close()
+
+    def _upload(self, local_path, fn):
+        """
+        send local_path as fn, returns the seconds it took
+        """
+
+        u_start = time.perf_counter()
+        remote = posixpath.join(self.remote_path, fn)
+        tmp = posixpath.join(self.remote_path, f".{fn}.tmp")
+
+        client, sftp = self._checkout()
+        try:
+            sftp.put(local_path, tmp)
+            try:
+                sftp.posix_rename(tmp, remote)
+            except IOError:
+                # servers without the posix-rename extension refuse to
+                # rename over an existing file
+                try:
+                    sftp.remove(remote)
+                except IOError:
+                    pass
+                sftp.rename(tmp, remote)
+        except Exception:
+            sftp.close()
+            raise
+        self._channels.put((client, sftp))
+        return time.perf_counter() - u_start
+
+    def _checkout(self):
+        """
+        an SFTP channel of the current connection, opened when none is free
+        """
+
+        with self._lock:
+            if self._client is None or not self._client.get_transport().is_active():
+                self._close()
+                logging.info("Establishing SSH connection to CDN...")
+                self._client = self.connect()
+            client = self._client
+
+        while True:
+            try:
+                channel_client, sftp = self._channels.get_nowait()
+            except queue.Empty:
+                return client, client.open_sftp()
+            if channel_client is client:
+                return client, sftp
+            sftp.close()
+
+    def _close(self):
+        while True:
+            try:
+                _, sftp = self._channels.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                sftp.close()
+            except Exception:
+                pass
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+
+class LocalSFTP:
+    """
+    Stand-in for paramiko.SFTPClient writing to a local directory
+
+    Remote paths are taken relative to root.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def put(self, localpath, remotepath):
+        path = self._path(remotepath)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(localpath, path)
+
+    def posix_rename(self, oldpath, newpath):
+        os.replace(self._path(oldpath), self._path(newpath))
+
+    def rename(self, oldpath, newpath):
+        if os.path.exists(self._path(newpath)):
+            raise IOError(f"{newpath} exists")
+        os.rename(self._path(oldpath), self._path(newpath))
+
+    def remove(self, path):
+        os.remove(self._path(path))
+
+    def close(self):
+        pass
+
+    def _path(self, remotepath):
+        return os.path.join(self.root, remotepath.lstrip("/"))
+
+
+class LocalSSHClient:
+    """
+    Stand-in for paramiko.SSHClient publishing to a local directory
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.active = True
+
+    def open_sftp(self):
+        return LocalSFTP(self.root)
+
+    def get_transport(self):
+        return self
+
+    def is_active(self):
+        return self.active
+
+    def close(self):
+        self.active = False
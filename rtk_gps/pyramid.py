@@ -0,0 +1,78 @@
+"""
+Medians of the archived baselines at coarser resolutions
+"""
+
+import os
+
+import pandas as pd
+
+from rtk_gps.archive import read_archive, write_archive
+
+# resolution of each level and the period of its partitions, finest first
+LEVELS = {"1min": "D", "10min": "M", "1h": "Y", "1D": "Y"}
+
+# width in pixels of the plotted time axis
+PIXELS = 1000
+
+
+def level_root(root, level):
+    """
+    directory of a level, the one minute level is the archive itself
+    """
+
+    if level == "1min":
+        return root
+    return os.path.join(root, "levels", level)
+
+
+def update_levels(root, baseline, days):
+    """
+    Compute the coarser levels of baseline over days from the archive
+
+    The bins of every level fall within a day, those of the days are
+    computed again from all the one minute medians the archive holds for
+    them and written over the old ones.
+    """
+
+    days = sorted({pd.Timestamp(day).normalize() for day in days})
+    if not days:
+        return
+
+    df = pd.concat(
+        [
+            read_archive(root, baseline, day, day + pd.Timedelta(days=1, seconds=-1))
+            for day in days
+        ]
+    )
+    if df.empty:
+        return
+
+    for level, period in list(LEVELS.items())[1:]:
+        level_df = df.resample(level).median().dropna()
+        write_archive(
+            level_root(root, level), baseline, level_df, period=period, replace=True
+        )
+
+
+def read_level(root, baseline, level, start=None, end=None, columns=None):
+    """
+    Medians of baseline at level from start to end
+    """
+
+    return read_archive(
+        level_root(root, level), baseline, start, end, columns, period=LEVELS[level]
+    )
+
+
+def choose_level(start, end, pixels=PIXELS, per_pixel=1.0):
+    """
+    the coarsest level giving at least per_pixel points per pixel from start
+    to end, the finest when none does
+    """
+
+    span = pd.Timestamp(end) - pd.Timestamp(start)
+    chosen = next(iter(LEVELS))
+    for level in LEVELS:
+        if span / pd.to_timedelta(level) >= pixels * per_pixel:
+            chosen = level
+    return chosen
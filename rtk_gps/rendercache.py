@@ -0,0 +1,71 @@
+"""
+Skipping figures whose input data has not changed
+"""
+
+import hashlib
+import os
+import time
+
+
+def fingerprint(data, baselines, *params):
+    """
+    digest of the last epoch of each baseline in a BaselineData and params
+
+    The window start is left out, it moves on with every run while nothing
+    new is plotted.
+    """
+
+    digest = hashlib.sha1()
+    for baseline in baselines:
+        digest.update(repr((baseline, data.last(baseline))).encode())
+    digest.update(repr(params).encode())
+    return digest.hexdigest()
+
+
+class RenderCache:
+    """
+    Fingerprints of the inputs the figures were last rendered from
+
+    A figure is stale when its file is missing, its fingerprint changed or
+    it was rendered more than max_age seconds ago, so the time axis still
+    moves on while a station is down. rendered and skipped count the
+    figures drawn and kept.
+    """
+
+    def __init__(self, max_age=3600):
+        self.max_age = max_age
+        self.rendered = 0
+        self.skipped = 0
+        self._entries = {}
+
+    def stale(self, fig_name, key):
+        """
+        True if fig_name has to be rendered from inputs with fingerprint key
+        """
+
+        entry = self._entries.get(fig_name)
+        if (
+            entry is None
+            or entry[0] != key
+            or time.monotonic() - entry[1] > self.max_age
+            or not os.path.exists(fig_name)
+        ):
+            return True
+
+        self.skipped += 1
+        return False
+
+    def store(self, fig_name, key):
+        """
+        record that fig_name was rendered from inputs with fingerprint key
+        """
+
+        self._entries[fig_name] = (key, time.monotonic())
+        self.rendered += 1
+
+    def stats(self):
+        """
+        rendered and skipped counters
+        """
+
+        return {"rendered": self.rendered, "skipped": self.skipped}
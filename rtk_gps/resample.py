@@ -0,0 +1,95 @@
+"""
+Incremental median resampling of epochs arriving in time order
+"""
+
+import pandas as pd
+
+
+class StreamingResampler:
+    """
+    Median resampler that keeps its finished bins between updates
+
+    Epochs are fed with update in time order, epochs not later than the last
+    one already seen are ignored so overlapping frames can be fed again.
+    Only the bin still open, the one holding the last epoch, is recomputed
+    when new epochs arrive and result gives the same frame as
+    df.resample(freq).median() over everything fed. As in open_datafile
+    rows with missing values and rows with Q in filt are dropped first.
+    """
+
+    def __init__(self, freq="60s", filt=[5], columns=None):
+        self.freq = freq
+        self.filt = filt
+        self.columns = columns
+        self.last = None
+        self._origin = None
+        self._bins = []
+        self._open = None
+        self._open_bins = None
+
+    def update(self, df):
+        """
+        add the epochs of df after the last one seen, returns how many
+        """
+
+        if self.last is not None and not df.empty:
+            df = df[df.index > self.last]
+        df = df.dropna()
+        if df.empty:
+            return 0
+
+        self.last = df.index[-1]
+        if "Q" in df.columns:
+            for i in self.filt:
+                df = df[df.Q != i]
+        if self.columns is not None:
+            df = df[self.columns]
+        if df.empty:
+            return 0
+
+        count = len(df)
+        if self._origin is None:
+            # the bins of pandas resample start at midnight of the first day
+            self._origin = df.index[0].normalize()
+
+        if self._open is not None:
+            df = pd.concat([self._open, df])
+
+        binned = self._resample(df)
+        if len(binned) > 1:
+            self._bins.append(binned.iloc[:-1])
+            if len(self._bins) > 32:
+                self._bins = [pd.concat(self._bins)]
+        open_start = binned.index[-1]
+        self._open = df[df.index >= open_start]
+        self._open_bins = binned.iloc[-1:]
+
+        return count
+
+    def result(self, start=None, end=None):
+        """
+        median of each bin with a label from start to end, empty bins as NaN
+        """
+
+        if self._open_bins is None:
+            return pd.DataFrame(columns=self.columns)
+
+        df = pd.concat(self._bins + [self._open_bins]).asfreq(self.freq)
+        if start is not None or end is not None:
+            df = df.loc[start:end]
+
+        return df
+
+    def trim(self, start):
+        """
+        forget the finished bins before the one holding start
+        """
+
+        start = pd.Timestamp(start) - pd.to_timedelta(self.freq)
+        bins = [binned.loc[start:] for binned in self._bins]
+        self._bins = [binned for binned in bins if not binned.empty]
+        if len(self._bins) > 1:
+            self._bins = [pd.concat(self._bins)]
+
+    def _resample(self, df):
+        return df.resample(self.freq, origin=self._origin).median().dropna(how="all")
@@ -0,0 +1,171 @@
+"""
+Fixed size in-memory store of the latest epochs of a baseline
+"""
+
+import numpy as np
+import pandas as pd
+
+# smallest types that hold the .pos columns, the baseline components and
+# coordinates need the full float64 precision
+COMPACT_DTYPES = {
+    "Q": np.int8,
+    "ns": np.int8,
+    "sdn": np.float32,
+    "sde": np.float32,
+    "sdu": np.float32,
+    "sdne": np.float32,
+    "sdeu": np.float32,
+    "sdun": np.float32,
+    "age": np.float32,
+    "ratio": np.float32,
+}
+
+
+def compact_dtype(column):
+    """
+    numpy type a column is kept as
+    """
+
+    return COMPACT_DTYPES.get(column, np.float64)
+
+
+class RingBuffer:
+    """
+    The last days of epochs of one baseline in preallocated arrays
+
+    Room is made for days of epochs at rate per second, when it is full the
+    oldest epochs are overwritten. Epochs more than days older than the last
+    one are dropped as well. Only epochs later than the last one are
+    appended, so overlapping frames can be appended again.
+    """
+
+    __slots__ = ("columns", "span", "capacity", "_times", "_data", "_head", "_size")
+
+    def __init__(self, columns, days=2, rate=1.0):
+        self.columns = list(columns)
+        self.span = np.timedelta64(round(days * 86400 * 10**9), "ns")
+        self.capacity = int(days * 86400 * rate)
+        self._times = np.empty(self.capacity, dtype="datetime64[ns]")
+        self._data = {
+            column: np.empty(self.capacity, dtype=compact_dtype(column))
+            for column in self.columns
+        }
+        self._head = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def nbytes(self):
+        """
+        bytes held by the arrays
+        """
+
+        return self._times.nbytes + sum(array.nbytes for array in self._data.values())
+
+    @property
+    def first(self):
+        """
+        time of the oldest epoch held, None when empty
+        """
+
+        return None if not self._size else pd.Timestamp(self._times[self._head])
+
+    @property
+    def last(self):
+        """
+        time of the latest epoch held, None when empty
+        """
+
+        if not self._size:
+            return None
+        return pd.Timestamp(self._times[(self._head + self._size - 1) % self.capacity])
+
+    def append(self, df):
+        """
+        add the epochs of df after the last one held, returns how many
+        """
+
+        times = df.index.values.astype("datetime64[ns]")
+        if self._size:
+            times_from = np.searchsorted(times, self._times_at(self._size - 1), "right")
+            df = df.iloc[times_from:]
+            times = times[times_from:]
+        if not len(times):
+            return 0
+
+        count = len(times)
+        if count > self.capacity:
+            df = df.iloc[-self.capacity :]
+            times = times[-self.capacity :]
+
+        self._write(self._times, times)
+        for column in self.columns:
+            self._write(self._data[column], df[column].to_numpy())
+        self._size += len(times)
+        if self._size > self.capacity:
+            self._head = (self._head + self._size - self.capacity) % self.capacity
+            self._size = self.capacity
+
+        # drop what is now older than span
+        self._drop(self._search(times[-1] - self.span))
+
+        return count
+
+    def frame(self, start=None, end=None, columns=None):
+        """
+        copy of the epochs from start to end as a frame indexed by date_time
+        """
+
+        if columns is None:
+            columns = self.columns
+        lo = 0 if start is None else self._search(np.datetime64(start, "ns"))
+        hi = (
+            self._size
+            if end is None
+            else self._search(np.datetime64(end, "ns"), side="right")
+        )
+        positions = (self._head + np.arange(lo, hi)) % self.capacity
+
+        return pd.DataFrame(
+            {column: self._data[column][positions] for column in columns},
+            index=pd.DatetimeIndex(self._times[positions], name="date_time"),
+        )
+
+    def _times_at(self, i):
+        return self._times[(self._head + i) % self.capacity]
+
+    def _segments(self):
+        """
+        the held times in order as at most two views of the array
+        """
+
+        end = self._head + self._size
+        if end <= self.capacity:
+            return [self._times[self._head : end]]
+        return [self._times[self._head :], self._times[: end - self.capacity]]
+
+    def _search(self, value, side="left"):
+        """
+        position of value among the held times, as np.searchsorted
+        """
+
+        offset = 0
+        for segment in self._segments():
+            if len(segment) and (
+                value < segment[-1] or (side == "left" and value == segment[-1])
+            ):
+                return offset + int(np.searchsorted(segment, value, side))
+            offset += len(segment)
+        return offset
+
+    def _write(self, array, values):
+        tail = (self._head + self._size) % self.capacity
+        first = min(len(values), self.capacity - tail)
+        array[tail : tail + first] = values[:first]
+        array[: len(values) - first] = values[first:]
+
+    def _drop(self, count):
+        self._head = (self._head + count) % self.capacity
+        self._size -= count
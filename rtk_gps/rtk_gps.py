@@ -1,20 +1,42 @@
+import copy
+import functools
 import logging
 import os
 from os.path import exists
-import tempfile
 import time
 from datetime import datetime as dt
 from datetime import timedelta as td
 
-import libnfs
 import matplotlib
 import matplotlib.pyplot as plt
 import matplotlib.ticker as mticker
 import matplotlib.transforms as mtransforms
 import pandas as pd
-from gtimes.timefunc import datepathlist
 from matplotlib.ticker import AutoMinorLocator
 
+from rtk_gps.decimate import minmax_decimate
+from rtk_gps.loader import baseline_frame, load_baselines, read_file
+from rtk_gps.metrics import baseline_of, record_figures
+from rtk_gps.posfile import empty_frame, pos_columns
+from rtk_gps.pyramid import PIXELS, choose_level, read_level
+from rtk_gps.resample import StreamingResampler
+from rtk_gps.ringbuffer import RingBuffer
+from rtk_gps.storage import open_storage
+
+
+COMPONENTS = ["n-baseline", "e-baseline", "u-baseline"]
+
+DATA_SOURCES = ["files", "database", "archive"]
+
+
+@functools.lru_cache(maxsize=4)
+def _logo_image(logo):
+    """
+    decoded logo image, read once per process
+    """
+
+    return plt.imread(logo)
+
 
 # from rtk_gps.rtk_gps import open_datafile, inpLogo
 def inpLogo(fig, logo=""):
@@ -38,7 +60,7 @@ def inpLogo(fig, logo=""):
         xpos = fig.axes[0].get_position().xmin - 0.096
         ypos = (fig.axes[0].get_position().ymax) - 0.043
 
-        im = plt.imread(logo)
+        im = _logo_image(logo)
         # im[np.all(im[:,:,:3] == [0, 0, 0], axis=-1)] = [255, 255 ,255, 255]
         aximage = fig.add_axes(
             [xpos, ypos, xlen, ylen], frameon=False, xticks=[], yticks=[]
@@ -46,95 +68,47 @@ def inpLogo(fig, logo=""):
         aximage.imshow(im, alpha=0.7, interpolation="none")
 
 
-def open_datafile(filelist, nfs, file_type="rtk_coordinate", filt=[5]):
+def open_datafile(
+    filelist,
+    nfs,
+    file_type="rtk_coordinate",
+    filt=[5],
+    engine="pandas",
+    reader=None,
+    cache=None,
+    metrics=None,
+):
     """
     open rtk baseiline plots
+
+    nfs is anything open_storage takes, None for files on local disk, the
+    files are streamed into the parser without intermediate copies. engine
+    selects the .pos parser, "pandas" or the fixed layout "fast" one. A
+    reader, such as a PosTailReader kept between calls, takes over reading
+    the files. Files found in a FrameCache are loaded from it instead of
+    being read. The seconds spent on each baseline and the rows read are set
+    in metrics.
     """
-    if file_type == "rtk_coordinate":
-        col_names = [
-            "date",
-            "time",
-            "latitude",
-            "longitude",
-            "height",
-            "Q",
-            "ns",
-            "sdn",
-            "sde",
-            "sdu",
-            "sdne",
-            "sdeu",
-            "sdun",
-            "age",
-            "ratio",
-        ]
-        date_format = "%Y/%m/%d%H:%M:%S.%f"
-    else:
-        #  UTC, e-baseline(m), n-baseline(m)i,u-baseline(m), Q, ns, sde(m), sdn(m), sdu(m), sden(m), sdnu(m), (m), age(s)  ratio
-        col_names = [
-            "date",
-            "time",
-            "e-baseline",
-            "n-baseline",
-            "u-baseline",
-            "Q",
-            "ns",
-            "sdn",
-            "sde",
-            "sdu",
-            "sdne",
-            "sdeu",
-            "sdun",
-            "age",
-            "ratio",
-        ]
-        date_format = "%Y/%m/%d%H:%M:%S.%f"
+    col_names = pos_columns(file_type)
 
     filelist.sort()
-    df = pd.DataFrame(columns=col_names[2:])
+    df = empty_frame(col_names)
     r_start = time.perf_counter()
+    parsed = {}
     for filename in filelist:
+        f_start = time.perf_counter()
         try:
-            if nfs is None:
-                if os.path.exists(filename) and os.stat(filename).st_size != 0:
-                    tmp_df = pd.read_csv(
-                        filename,
-                        header=None,
-                        sep=r"\s+",
-                        comment="%",
-                        names=col_names,
-                    )
-                else:
-                    tmp_df = pd.DataFrame(columns=col_names[2:])
-
-            elif type(nfs) is libnfs.NFS:
-                logging.info("Opening %s via NFS...", filename)
-                if nfs.stat(filename)["size"] > 0:
-                    content = nfs.open(filename, mode="r").read()
-                    with tempfile.NamedTemporaryFile(mode="r+") as tf:
-                        logging.info("Writing %s to a temp file...", filename)
-                        tf.write(content)
-                        tf.seek(0, os.SEEK_SET)
-                        logging.info("Reading temp file into data frame...")
-                        tmp_df = pd.read_csv(
-                            tf,
-                            header=None,
-                            sep="\s+",
-                            comment="%",
-                            names=col_names,
-                        )
-                else:
-                    tmp_df = pd.DataFrame(columns=col_names[2:])
-
-            if not tmp_df.empty:
-                tmp_df["date_time"] = pd.to_datetime(
-                    tmp_df["date"] + tmp_df["time"], format=date_format
-                )
-                tmp_df.drop(columns=["date", "time"], inplace=True)
-                tmp_df.set_index("date_time", inplace=True)
-
+            tmp_df = read_file(filename, nfs, col_names, engine, reader, cache)
         except IOError as e:
-            tmp_df = pd.DataFrame(columns=col_names[2:])
+            tmp_df = empty_frame(col_names)
+        except ValueError as e:
+            logging.error("Failed to parse %s, skipping it: %s", filename, e)
+            tmp_df = empty_frame(col_names)
+        seconds, rows = parsed.get(baseline_of(filename), (0.0, 0))
+        parsed[baseline_of(filename)] = (
+            seconds + time.perf_counter() - f_start,
+            rows + len(tmp_df),
+        )
 
         if df.empty:
             df = tmp_df
@@ -147,6 +121,12 @@ def open_datafile(filelist, nfs, file_type="rtk_coordinate", filt=[5]):
     logging.warning(
         "Run time: %f s for reading in data in %s", r_end - r_start, filelist
     )
+    if metrics is not None:
+        for baseline, (seconds, rows) in parsed.items():
+            metrics.set(
+                "rtk_baseline_seconds", seconds, baseline=baseline, stage="parse"
+            )
+            metrics.set("rtk_baseline_rows", rows, baseline=baseline)
 
     df.index = pd.to_datetime(df.index)  # - timedelta(seconds=18)
     df = df.dropna()
@@ -157,6 +137,246 @@ def open_datafile(filelist, nfs, file_type="rtk_coordinate", filt=[5]):
     return df
 
 
+class BaselineData:
+    """
+    Resampled N/E/U of a set of baselines, loaded once and sliced per plot
+
+    Each distinct baseline is loaded from start to end and resampled once,
+    window then serves any period within it. timings holds the seconds spent
+    loading and resampling. resamplers is a dict of StreamingResampler by
+    baseline kept between instances, only the epochs added since the last
+    one are then resampled. buffers is a dict of RingBuffer by baseline kept
+    between instances, all the columns of the epochs after the latest one
+    held are loaded into them and the plots are read from them. metrics, a
+    Metrics, gets the seconds spent on each baseline and the rows read.
+    """
+
+    def __init__(
+        self,
+        nfs,
+        baselines,
+        start,
+        end,
+        resample="60s",
+        reader=None,
+        cache=None,
+        resamplers=None,
+        buffers=None,
+        metrics=None,
+    ):
+        self.start = start
+        self.end = end
+        self.resample = resample
+        self.timings = {}
+
+        # the last bin up to end takes in epochs up to one resample step after it
+        load_end = end + pd.to_timedelta(resample)
+        columns = COMPONENTS
+        starts = None
+        if buffers is not None:
+            columns = pos_columns("")[2:]
+            days = (load_end - start) / td(days=1)
+            starts = {}
+            for baseline in set(baselines):
+                buffer = buffers.get(baseline)
+                if buffer is None or pd.Timedelta(buffer.span) < load_end - start:
+                    buffers[baseline] = RingBuffer(columns, days=days)
+                # a baseline without epochs held does not hold back the others
+                if buffers[baseline].last is not None:
+                    starts[baseline] = max(start, buffers[baseline].last)
+
+        r_start = time.perf_counter()
+        df = load_baselines(
+            sorted(set(baselines)),
+            nfs,
+            start=start,
+            end=load_end,
+            columns=columns,
+            reader=reader,
+            cache=cache,
+            metrics=metrics,
+            starts=starts,
+        )
+        self.timings["load"] = time.perf_counter() - r_start
+
+        r_start = time.perf_counter()
+        self._frames = {}
+        for baseline in set(baselines):
+            b_start = time.perf_counter()
+            resampler = None
+            if resamplers is not None:
+                resampler = resamplers.get(baseline)
+                if resampler is None or resampler.freq != resample:
+                    resampler = StreamingResampler(resample, columns=COMPONENTS)
+                    resamplers[baseline] = resampler
+
+            if buffers is None:
+                stat_df = baseline_frame(df, baseline)
+            else:
+                buffers[baseline].append(baseline_frame(df, baseline))
+                since = start
+                if resampler is not None and resampler.last is not None:
+                    since = max(start, resampler.last)
+                stat_df = buffers[baseline].frame(since, load_end, COMPONENTS)
+
+            if resampler is None:
+                stat_df = stat_df.resample(resample).median()
+            else:
+                resampler.update(stat_df)
+                resampler.trim(start)
+                stat_df = resampler.result(start=start - pd.to_timedelta(resample))
+            self._frames[baseline] = stat_df.dropna()
+            if metrics is not None:
+                metrics.set(
+                    "rtk_baseline_seconds",
+                    time.perf_counter() - b_start,
+                    baseline=baseline,
+                    stage="resample",
+                )
+        self.timings["resample"] = time.perf_counter() - r_start
+
+    def window(self, baseline, start, end, resample=None):
+        """
+        copy of the resampled data of baseline from start to end
+        """
+
+        if resample is not None and resample != self.resample:
+            raise ValueError(f"Data is resampled to {self.resample}, not {resample}")
+        if start < self.start or end > self.end:
+            raise ValueError(
+                f"{start} - {end} is outside the loaded {self.start} - {self.end}"
+            )
+
+        return self._frames[baseline].loc[start:end].copy()
+
+    def last(self, baseline):
+        """
+        the last resampled epoch of baseline and its values, None without data
+        """
+
+        frame = self._frames.get(baseline)
+        if frame is None or frame.empty:
+            return None
+        return frame.index[-1], tuple(frame.iloc[-1])
+
+    @classmethod
+    def from_database(cls, db, baselines, start, end, resample="60s"):
+        """
+        Resampled N/E/U of baselines read from the rtk_one_min table of db
+
+        All the baselines are read in one query. The table holds one minute
+        medians, longer resample periods are aggregated by the database.
+        """
+
+        from rtk_gps.ingest import read_minutes
+
+        data = cls.__new__(cls)
+        data.start = start
+        data.end = end
+        data.resample = resample
+        data.timings = {}
+
+        bucket = None
+        if pd.to_timedelta(resample) > pd.to_timedelta("60s"):
+            bucket = resample
+
+        r_start = time.perf_counter()
+        df = read_minutes(
+            db,
+            sorted(set(baselines)),
+            start - pd.to_timedelta(resample),
+            end + pd.to_timedelta(resample),
+            bucket=bucket,
+        )
+        df.columns = [f"{column}-baseline" for column in df.columns]
+        data.timings["load"] = time.perf_counter() - r_start
+
+        data._frames = {}
+        for baseline in set(baselines):
+            try:
+                stat_df = df.xs(baseline, level="baseline")
+            except KeyError:
+                stat_df = df.iloc[0:0].droplevel("baseline")
+            stat_df.index.name = "date_time"
+            data._frames[baseline] = stat_df[COMPONENTS].dropna()
+
+        return data
+
+    @classmethod
+    def from_archive(cls, root, baselines, start, end, pixels=PIXELS):
+        """
+        Medians of baselines read from the archive under root
+
+        The coarsest level with a point for each of pixels from start to end
+        is read, resample is set to its resolution.
+        """
+
+        level = choose_level(start, end, pixels)
+
+        data = cls.__new__(cls)
+        data.start = start
+        data.end = end
+        data.resample = level
+        data.timings = {}
+
+        r_start = time.perf_counter()
+        step = pd.to_timedelta(level)
+        data._frames = {}
+        for baseline in set(baselines):
+            stat_df = read_level(
+                root, baseline, level, start - step, end + step, COMPONENTS
+            )
+            data._frames[baseline] = stat_df.astype(float).dropna()
+        data.timings["load"] = time.perf_counter() - r_start
+        logging.info("Read the %s level of %s from %s", level, sorted(baselines), root)
+
+        return data
+
+    def subset(self, baselines):
+        """
+        the same data restricted to baselines, small enough to send to a worker
+        """
+
+        data = copy.copy(self)
+        data._frames = {baseline: self._frames[baseline] for baseline in baselines}
+        data.timings = {}
+
+        return data
+
+
+def figure_file(figurepath, baseline_list, special, figtype="png"):
+    """
+    file of the routine special period plot of baseline_list ending now
+    """
+
+    return f"{figurepath}/rtk_{baseline_list[0]}_{special}.{figtype}"
+
+
+def _window_start(special, end):
+    """
+    start of a routine plot of length special ending at end
+    """
+
+    if special == "twodays":
+        return end - td(days=2)
+    elif special == "day":
+        return end - td(days=1)
+    elif special == "12h":
+        return end - td(hours=12)
+    elif special == "6h":
+        return end - td(hours=6)
+    elif special == "threedays":
+        return end - td(days=3)
+    elif special == "week":
+        return end - td(days=7)
+    elif special == "month":
+        return end - td(days=30)
+    elif special == "year":
+        return end - td(days=365)
+    else:
+        return end - td(days=2)
+
+
 def plot_rtk_neu(
     nfs,
     baseline_list,
@@ -167,36 +387,202 @@ def plot_rtk_neu(
     figurepath=None,
     logo="",
     figtype="png",
+    reader=None,
+    cache=None,
+    data=None,
+    source="files",
+    db=None,
+    archive=None,
+    max_points=None,
+    metrics=None,
 ):
     """
     Plot north, east, up component of a few rtk GPS baselines
     with common base station
+
+    reader and cache are passed on to load_baselines. data is a BaselineData
+    already holding the baselines, the plot is then sliced from it and ends
+    at data.end unless end is given. source is one of DATA_SOURCES, with
+    "database" the data is read from the rtk_one_min table of the
+    SQLAlchemy engine db instead of the data files. With "archive" it is
+    read from the level of the archive directory archive with enough points
+    for the period, resample is then that of the level. With max_points each
+    line is thinned to that many points keeping its spikes and steps.
+    Returns the seconds spent rendering each figure by its file name, which
+    are set in metrics, a Metrics, with those of loading the data.
     """
 
     figend = ""
     if end is None:
         figend = "now"
-        end = dt.now()
+        end = dt.now() if data is None else data.end
 
     if start is None:
-        if special == "twodays":
-            start = end - td(days=2)
-        elif special == "day":
-            start = end - td(days=1)
-        elif special == "12h":
-            start = end - td(hours=12)
-        elif special == "6h":
-            start = end - td(hours=6)
-        else:
-            start = end - td(days=2)
+        start = _window_start(special, end)
     else:
         special = None
 
+    if data is None:
+        data = _load(
+            nfs,
+            baseline_list,
+            start,
+            end,
+            resample,
+            reader,
+            cache,
+            source,
+            db,
+            archive,
+            metrics,
+        )
+        resample = data.resample
+
+    durations = _render_windows(
+        data,
+        baseline_list,
+        [(special, start)],
+        end,
+        figend,
+        resample,
+        figurepath,
+        logo,
+        figtype,
+        max_points,
+    )
+    if metrics is not None:
+        record_figures(metrics, durations)
+
+    return durations
+
+
+def plot_rtk_neu_windows(
+    nfs,
+    baseline_list,
+    specials=["twodays", "12h", "6h"],
+    end=None,
+    resample="60s",
+    figurepath=None,
+    logo="",
+    figtype="png",
+    reader=None,
+    cache=None,
+    data=None,
+    source="files",
+    db=None,
+    archive=None,
+    max_points=None,
+    metrics=None,
+):
+    """
+    Plot several routine periods of the same baselines ending at end
+
+    Gives the same figures as calling plot_rtk_neu for each of specials but
+    the figure and its lines are built once, each period only updates the
+    line data, limits, offsets and title before it is saved. The other
+    arguments and what is returned are as for plot_rtk_neu.
+    """
+
+    figend = ""
+    if end is None:
+        figend = "now"
+        end = dt.now() if data is None else data.end
+
+    windows = [(special, _window_start(special, end)) for special in specials]
+
+    if data is None:
+        start = min(start for _, start in windows)
+        data = _load(
+            nfs,
+            baseline_list,
+            start,
+            end,
+            resample,
+            reader,
+            cache,
+            source,
+            db,
+            archive,
+            metrics,
+        )
+        resample = data.resample
+
+    durations = _render_windows(
+        data,
+        baseline_list,
+        windows,
+        end,
+        figend,
+        resample,
+        figurepath,
+        logo,
+        figtype,
+        max_points,
+    )
+    if metrics is not None:
+        record_figures(metrics, durations)
+
+    return durations
+
+
+def _load(
+    nfs,
+    baseline_list,
+    start,
+    end,
+    resample,
+    reader,
+    cache,
+    source,
+    db,
+    archive,
+    metrics=None,
+):
+    """
+    BaselineData of the plotted baselines from source
+    """
+
+    if source == "files":
+        return BaselineData(
+            nfs,
+            baseline_list,
+            start,
+            end,
+            resample,
+            reader=reader,
+            cache=cache,
+            metrics=metrics,
+        )
+    elif source == "database":
+        return BaselineData.from_database(db, baseline_list, start, end, resample)
+    elif source == "archive":
+        return BaselineData.from_archive(archive, baseline_list, start, end)
+    else:
+        raise ValueError(f"Unknown data source {source}, use one of {DATA_SOURCES}")
+
+
+def _render_windows(
+    data,
+    baseline_list,
+    windows,
+    end,
+    figend,
+    resample,
+    figurepath,
+    logo,
+    figtype,
+    max_points=None,
+):
+    """
+    draw one figure and save it once for each (special, start) in windows,
+    with lines of at most max_points points, returns the seconds spent on
+    each by its file name
+    """
+
     dstr = "%Y%m%d-%H:%M"
-    date_list = list(set(datepathlist("%Y%m%d", "2h", start, end, closed="both")))
     now_string = end.strftime("%Y-%m-%d %H:%M:%S")
 
-    components = ["n-baseline", "e-baseline", "u-baseline"]
+    components = COMPONENTS
     ylabels = ["Norður", "Austur", "Upp"]
     base_stat = baseline_list[0][5:9]
 
@@ -206,32 +592,94 @@ def plot_rtk_neu(
         matplotlib.use("agg")
 
     fig, axs = plt.subplots(nrows=3, ncols=1, figsize=(13, 20))
-    ymin = [None, None, None]
-    for baseline in baseline_list:
-        stat = baseline[0:4]
-        filelist = [
-            os.path.join(baseline, "{}{}0000b.pos".format(baseline, date))
-            for date in date_list
-        ]
-
-        stat_df = open_datafile(filelist, nfs, file_type="")
-        # stat_df = open_datafile(datafiles, file_type="")
-        stat_df = stat_df.resample(resample).median()
-        stat_df = stat_df.dropna()
-        stat_df_subset = stat_df.loc[start:end]
-
-        for i, component, ylabel in zip(range(0, 3), components, ylabels):
-            stat_df_subset.loc[:, component] = (
-                stat_df_subset.loc[:, component]
-                - stat_df_subset.loc[:, component].iloc[0:80].mean()
-            ) * 100  # change to cm
-            axs[i].plot(stat_df_subset.index, stat_df_subset[component], label=stat)
-
-            if ymin[i] is None:
+    lines = [{}, {}, {}]
+    markers = []
+    durations = {}
+    for special, start in windows:
+        r_start = time.perf_counter()
+        ymin = [None, None, None]
+        for baseline in baseline_list:
+            stat = baseline[0:4]
+
+            stat_df_subset = data.window(baseline, start, end, resample)
+
+            for i, component, ylabel in zip(range(0, 3), components, ylabels):
+                stat_df_subset.loc[:, component] = (
+                    stat_df_subset.loc[:, component]
+                    - stat_df_subset.loc[:, component].iloc[0:80].mean()
+                ) * 100  # change to cm
+                x, y = minmax_decimate(
+                    stat_df_subset.index, stat_df_subset[component], max_points
+                )
+                if baseline in lines[i]:
+                    if not axs[i].xaxis.have_units():
+                        axs[i].xaxis.update_units(x)
+                    lines[i][baseline].set_data(x, y)
+                    continue
+
+                (lines[i][baseline],) = axs[i].plot(x, y, label=stat)
+
+                if ymin[i] is None:
+                    ymin[i] = axs[i].get_ylim()[0]
+                else:
+                    if axs[i].get_ylim()[0] < ymin[i]:
+                        ymin[i] = axs[i].get_ylim()[0]
+
+        if markers:
+            # later periods reuse the figure, rescale it to the new data the
+            # way a new figure is, where the end line only widens the view if
+            # it falls outside of the data
+            for i, (vline, text) in enumerate(markers):
+                vline.set_visible(False)
+                axs[i].relim(visible_only=True)
+                vline.set_visible(True)
+                axs[i].autoscale_view()
+                xmin, xmax = axs[i].get_xlim()
+                if not xmin <= axs[i].convert_xunits(end) <= xmax:
+                    axs[i].relim()
+                    axs[i].autoscale_view()
                 ymin[i] = axs[i].get_ylim()[0]
+                text.set_y(ymin[i])
+        else:
+            _decorate(fig, axs, ylabels, end, ymin, now_string, markers)
+            inpLogo(fig, logo)
+
+        if special:
+            if figend == "now":
+                fig_name = figure_file(figurepath, baseline_list, special, figtype)
+                title = f"{baseline_list[0]} {special}"
             else:
-                if axs[i].get_ylim()[0] < ymin[i]:
-                    ymin[i] = axs[i].get_ylim()[0]
+                end_str = end.strftime(dstr)
+                fig_name = (
+                    f"{figurepath}/rtk_{baseline_list[0]}_{special}-{end_str}.{figtype}"
+                )
+                title = f"{baseline_list[0]} {special}-{end_str}"
+
+        else:
+            start_str = start.strftime(dstr)
+            fig_name = f"{figurepath}/rtk_{baseline_list[0]}_{start_str}-{end}.{figtype}"
+            title = f"{baseline_list[0]} {start_str}-{end}"
+
+        axs[0].set_title(
+            title, fontdict={"fontsize": 30, "verticalalignment": "bottom"}
+        )
+        if axs[0].get_legend() is None:
+            axs[0].legend(loc="lower left", fontsize=16)
+        fig.savefig(fig_name)
+        durations[fig_name] = time.perf_counter() - r_start
+        logging.info(f"{fig_name} created")
+        logging.info("Run time: %f s for rendering %s", durations[fig_name], fig_name)
+
+    plt.close(fig=fig)
+
+    return durations
+
+
+def _decorate(fig, axs, ylabels, end, ymin, now_string, markers):
+    """
+    grids, labels and the end of data markers, appending (line, text) of
+    each marker to markers
+    """
 
     # plt.yticks(fontsize=14)
     for i, ylabel in zip(range(0, 3), ylabels):
@@ -248,8 +696,8 @@ def plot_rtk_neu(
         # ticks_loc = axs[i].get_xticks().tolist()
         # axs[i].xaxis.set_major_locator(mticker.FixedLocator(ticks_loc))
         axs[i].tick_params(axis="both", labelsize=14)
-        axs[i].axvline(x=end, color="green", zorder=2, linewidth=2)
-        axs[i].text(
+        vline = axs[i].axvline(x=end, color="green", zorder=2, linewidth=2)
+        text = axs[i].text(
             end,
             ymin[i],
             now_string,
@@ -259,35 +707,14 @@ def plot_rtk_neu(
             color="green",
             fontsize=18,
         )
-
-    inpLogo(fig, logo)
-
-    if special:
-        if figend == "now":
-            fig_name = f"{figurepath}/rtk_{baseline_list[0]}_{special}.{figtype}"
-            title = f"{baseline_list[0]} {special}"
-        else:
-            end = end.strftime(dstr)
-            fig_name = f"{figurepath}/rtk_{baseline_list[0]}_{special}-{end}.{figtype}"
-            title = f"{baseline_list[0]} {special}-{end}"
-
-    else:
-        start = start.strftime(dstr)
-        fig_name = f"{figurepath}/rtk_{baseline_list[0]}_{start}-{end}.{figtype}"
-        title = f"{baseline_list[0]} {start}-{end}"
-
-    axs[0].set_title(title, fontdict={"fontsize": 30, "verticalalignment": "bottom"})
-    axs[0].legend(loc="lower left", fontsize=16)
-    fig.savefig(fig_name)
-    plt.close(fig=fig)
-    logging.info(f"{fig_name} created")
+        markers.append((vline, text))
 
 
 def test_plot():
     """
     Test plot_rtk_neu
     """
-    nfs = libnfs.NFS("nfs://rtk.vedur.is/home/gpsops/rtklib-run/data")
+    nfs = open_storage("nfs://rtk.vedur.is/home/gpsops/rtklib-run/data")
     # tmp = nfs.listdir("./")
     # print(tmp)
 
@@ -1,46 +1,51 @@
+import argparse
 import configparser
 import logging
 import os
 import re
+import sys
 import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime as dt
 from datetime import timedelta as td
 from os.path import getsize, isdir, isfile
 
-import libnfs
 import pandas as pd
-from gtimes.timefunc import datepathlist
 
-from rtk_gps import open_datafile
+from rtk_gps.archive import export_neu, write_archive
+from rtk_gps.loader import baseline_frame, load_baselines
+from rtk_gps.pyramid import update_levels
+from rtk_gps.storage import open_storage
 
 # from pathlib import Path
 
 
-def rtk_write_median(baseline, nfs, date_list, resample, use_columns, filepath):
+def rtk_write_median(
+    baseline, nfs, date_list, resample, use_columns, filepath, cache=None
+):
     """
     read in raw rtk baseline data and writing median to a file
+
+    nfs is the directory holding the baseline directories, an nfs:// url or
+    a Storage.
     """
 
-    if type(nfs) is libnfs.NFS:
-        filelist = [
-            os.path.join(baseline, f"{baseline}{date}0000b.pos") for date in date_list
-        ]
-    else:
-        filelist = [
-            os.path.join(nfs, baseline, f"{baseline}{date}0000b.pos")
-            for date in date_list
-        ]
-        nfs = None
-
-    logging.info("filelist: %s", filelist)
-    stat_df = open_datafile(filelist, nfs=nfs, file_type="", filt=[5])
+    logging.info("dates: %s", date_list)
+    stat_df = load_baselines(
+        [baseline],
+        open_storage(nfs),
+        columns=use_columns,
+        filt=[5],
+        cache=cache,
+        date_list=date_list,
+    )
+    stat_df = baseline_frame(stat_df, baseline)
     if not len(stat_df.index) > 0:
-        logging.info("No data in files: %s", filelist)
+        logging.info("No data for %s on %s", baseline, date_list)
         return 1
 
     stat_df = stat_df.resample(resample).median()
     stat_df = stat_df.dropna()
-    stat_df = stat_df[use_columns]
 
     file = f"{filepath}/{baseline}-distance.neu"
     if len(stat_df.index) > 0:
@@ -58,75 +63,193 @@ def rtk_write_median(baseline, nfs, date_list, resample, use_columns, filepath):
 
 
 def rtk_write_archive(
-    baseline, resample, date_list, frequency_list, use_columns, nfs, filepath
+    baseline,
+    resample,
+    date_list,
+    frequency_list,
+    use_columns,
+    nfs,
+    filepath,
+    cache=None,
+    neu=False,
 ):
     """
-    read in raw rtk baseline data and writing median to a file
+    read in raw rtk baseline data and archive the median of each day
+
+    The days in frequency_list are added to the archive under filepath and
+    its coarser levels updated, with neu they are also written as .neu text
+    files there. nfs is anything open_storage takes. Returns 1 when there
+    was no data to archive.
     """
 
-    if type(nfs) is libnfs.NFS:
-        filelist = [
-            os.path.join(baseline, f"{baseline}{date}0000b.pos") for date in date_list
-        ]
-    else:
-        filelist = [
-            os.path.join(nfs, baseline, f"{baseline}{date}0000b.pos")
-            for date in date_list
-        ]
-        nfs = None
-    # filelist = [
-    #     os.path.join(baseline, f"{baseline}{date}0000b.pos") for date in date_list
-    # ]
-    
-    # stat_df = open_datafile(nfs, filelist, file_type="", filt=[5])
-    stat_df = open_datafile(filelist, nfs=nfs, file_type="", filt=[5])
+    stat_df = load_baselines(
+        [baseline],
+        open_storage(nfs),
+        columns=use_columns,
+        filt=[5],
+        cache=cache,
+        date_list=date_list,
+    )
+    stat_df = baseline_frame(stat_df, baseline)
     if not len(stat_df.index) > 0:
         return 1
 
     stat_df = stat_df.resample(resample).median()
     stat_df = stat_df.dropna()
-    stat_df = stat_df[use_columns]
 
-    for period in frequency_list:
-        file = f"{filepath}/{baseline}-distance-{period}.neu"
-        if not isfile(file):
-            # print(stat_df.index.inferred_type == "datetime64")
+    days = pd.to_datetime(frequency_list, format="%Y%m%d")
+    stat_df = stat_df[stat_df.index.normalize().isin(days)]
+    if stat_df.empty:
+        logging.info("No data for %s on %s", baseline, frequency_list)
+        return 1
+
+    written = write_archive(filepath, baseline, stat_df)
+    update_levels(filepath, baseline, written)
+    if neu:
+        for file in export_neu(
+            filepath,
+            baseline,
+            filepath,
+            use_columns,
+            start=min(written),
+            end=max(written) + pd.Timedelta(days=1) - pd.Timedelta(1),
+        ):
+            logging.info("File %s has size %sb", file, getsize(file))
+
+    return None
+
+
+def read_manifest(manifest):
+    """
+    (baseline, day) tasks recorded as done in the manifest file
+    """
+
+    done = set()
+    if not isfile(manifest):
+        return done
+    with open(manifest) as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) == 2:
+                done.add((fields[0], fields[1]))
+    return done
+
+
+def backfill_tasks(baselines, start, end, done=()):
+    """
+    (baseline, day) tasks from start to end, both included, not in done
+    """
+
+    days = [f"{day:%Y%m%d}" for day in pd.date_range(start, end, freq="D")]
+    return [
+        (baseline, day)
+        for day in days
+        for baseline in baselines
+        if (baseline, day) not in done
+    ]
+
+
+_storages = {}
+
+
+def _backfill_day(baseline, day, source, filepath, resample, use_columns, neu):
+    """
+    archive one day of a baseline, returns whether it had data and the
+    seconds it took
+    """
+
+    t_start = time.perf_counter()
+    # one storage, and libnfs context, for each worker process
+    if source not in _storages:
+        _storages[source] = open_storage(source)
+
+    nodata = rtk_write_archive(
+        baseline,
+        resample,
+        [day],
+        [day],
+        use_columns,
+        _storages[source],
+        filepath,
+        neu=neu,
+    )
+    return nodata is None, time.perf_counter() - t_start
+
+
+def backfill(
+    tasks,
+    source,
+    filepath,
+    manifest,
+    resample="1min",
+    use_columns=None,
+    neu=False,
+    workers=1,
+):
+    """
+    Archive (baseline, day) tasks in a pool of workers processes
+
+    source is an nfs:// url or the directory holding the baseline
+    directories. Each task done is appended to the manifest, so a run that
+    stops can be started again with the tasks read_manifest does not list.
+    Days that have not ended or had no data are not recorded. Failed tasks
+    are logged and returned.
+    """
+
+    today = f"{dt.now():%Y%m%d}"
+    failed = []
+    r_start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor, open(
+        manifest, "a"
+    ) as record:
+        jobs = {
+            executor.submit(
+                _backfill_day,
+                baseline,
+                day,
+                source,
+                filepath,
+                resample,
+                use_columns,
+                neu,
+            ): (baseline, day)
+            for baseline, day in tasks
+        }
+        for count, job in enumerate(as_completed(jobs), 1):
+            baseline, day = jobs[job]
             try:
-                stat_df.loc[period].to_csv(
-                    file,
-                    sep="\t",
-                    float_format="%.3f",
-                    header=use_columns,
-                    index_label="#  date_time",
-                )
-                logging.info("File %s has size %sb", file, getsize(file))
-
-            except KeyError:
-                logging.info("No data, %s not created", file)
-
-        elif getsize(file) < 826:
-            print(f"File {file} has size {getsize(file)}")
-            # print(f"adding new data to: {file}")
-            file_df = pd.read_csv(
-                file,
-                index_col=0,
-                sep="\t",
-                comment="#",
-                names=["date_time"] + use_columns,
-            )
+                archived, seconds = job.result()
+            except Exception:
+                logging.exception(f"Archiving {baseline} on {day} failed")
+                failed.append((baseline, day))
+                continue
+            if archived and day < today:
+                record.write(f"{baseline} {day}\n")
+                record.flush()
 
-            join_df = pd.concat([file_df, stat_df.loc[period]])
-            join_df.index = pd.to_datetime(join_df.index)
-            join_df = join_df[~join_df.index.duplicated(keep="first")]
-            join_df.to_csv(
-                file,
-                sep="\t",
-                float_format="%.3f",
-                header=use_columns,
-                index_label="#  date_time",
+            elapsed = time.perf_counter() - r_start
+            rate = count / elapsed
+            logging.info(
+                "%d/%d %s %s in %.1f s, %.2f tasks/s, %.0f s left",
+                count,
+                len(jobs),
+                baseline,
+                day,
+                seconds,
+                rate,
+                (len(jobs) - count) / rate,
             )
 
-    return None
+    logging.info(
+        "Archived %d of %d tasks in %.1f min",
+        len(tasks) - len(failed),
+        len(tasks),
+        (time.perf_counter() - r_start) / 60.0,
+    )
+    if failed:
+        logging.error("%d tasks failed: %s", len(failed), failed)
+
+    return failed
 
 
 def main():
@@ -134,33 +257,83 @@ def main():
     Save resample and save rtk files
     """
 
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
     projectdir = os.path.split(os.path.dirname(__file__))[0]
-    filepath = os.path.join(projectdir, "data")
 
-    python_nfs = False
+    config = configparser.ConfigParser()
+    configpath = os.path.join(os.path.join(projectdir, "config"), "config.ini")
+    config.read(configpath)
+    filepath = os.path.join(
+        projectdir, config.get("Archive", "archivepath", fallback="data")
+    )
+    neu = config.getboolean("Archive", "neu", fallback=False)
 
-    if python_nfs:
-        nfs = libnfs.NFS("nfs://rtk.vedur.is/home/gpsops/rtklib-run/data")
-        baselines = nfs.listdir("./")
-    else:
-        config = configparser.ConfigParser()
-        configpath = os.path.join(os.path.join(projectdir, "config"), "config.ini")
-        config.read(configpath)
-        nfs = config["paths"]["filepath"]
-        baselines = os.listdir(nfs)
-
-    strf = "%Y%m%d"
-    # end = dt.now()
-    end = dt(year=2024, month=3, day=18)
-    start = end - td(days=5)
-    # start = dt(year=2024, month=1, day=1)
-    resample = "1min"
-    file_frequency = "1d"
-
-    r = re.compile(r"\S+-\S+")
-    baseline_list = list(filter(r.match, baselines))  # Read Note below
-    # baseline_list = ["THOB-ELDC", "SENG-ELDC", "SKSH-ELDC", "ORFC-ELDC"]
-    # baseline_list = ["THOB-ELDC"]
+    dstr = "%Y%m%d"
+    yesterday = dt.combine(dt.now().date(), dt.min.time()) - td(days=1)
+
+    parser = argparse.ArgumentParser(
+        description="Archive one minute medians of the rtk baselines, "
+        + "days already in the manifest are skipped.",
+    )
+    parser.add_argument(
+        "-s", "--start", type=str, default=None, help="First day, YYYYMMDD"
+    )
+    parser.add_argument(
+        "-e",
+        "--end",
+        type=str,
+        default=None,
+        help="Last day, YYYYMMDD, yesterday by default",
+    )
+    parser.add_argument(
+        "-b",
+        "--baselines",
+        type=str,
+        default=r"\S+-\S+",
+        help="Regular expression the baselines must match",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of worker processes",
+    )
+    parser.add_argument(
+        "--nfs",
+        type=str,
+        nargs="?",
+        default=None,
+        const="nfs://rtk.vedur.is/home/gpsops/rtklib-run/data",
+        help="Read the data files over libnfs instead of from filepath in the config",
+    )
+    parser.add_argument(
+        "-m",
+        "--manifest",
+        type=str,
+        default=os.path.join(filepath, "backfill.manifest"),
+        help="File recording the days archived",
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Archive every day again, ignoring the manifest",
+    )
+
+    args = parser.parse_args()
+
+    end = dt.strptime(args.end, dstr) if args.end else yesterday
+    start = dt.strptime(args.start, dstr) if args.start else end - td(days=4)
+
+    source = args.nfs or config["Paths"]["filepath"]
+    baselines = open_storage(source).listdir("")
+
+    r = re.compile(args.baselines)
+    baseline_list = sorted(filter(r.fullmatch, baselines))
     logging.debug("%s", baseline_list)
 
     if not isdir(filepath):
@@ -168,24 +341,28 @@ def main():
         os.mkdir(filepath)
 
     use_columns = ["n-baseline", "sdn", "e-baseline", "sde", "u-baseline", "sdu"]
-    date_list = list(set(datepathlist("%Y%m%d", "6h", start, end, closed="both")))
-    frequency_list = datepathlist(
-        strf,
-        file_frequency,
-        starttime=start,
-        endtime=end,
-        closed="right",
-    )
-
-    start_time = time.perf_counter()
-    for baseline in baseline_list:
-        print(baseline)
-        # rtk_write_median(baseline, nfs, date_list, resample, use_columns, filepath)
-        rtk_write_archive(
-        baseline, resample, date_list, frequency_list, use_columns, nfs, filepath
-        )
-    end_time = time.perf_counter()
-    logging.warning("Total Run time: %f min", (end_time - start_time)/60.0)
+    done = set() if args.restart else read_manifest(args.manifest)
+    tasks = backfill_tasks(baseline_list, start, end, done)
+    logging.info(
+        "%d baselines from %s to %s: %d tasks, %d done before",
+        len(baseline_list),
+        f"{start:%Y-%m-%d}",
+        f"{end:%Y-%m-%d}",
+        len(tasks),
+        len(baseline_list) * ((end - start).days + 1) - len(tasks),
+    )
+
+    failed = backfill(
+        tasks,
+        source,
+        filepath,
+        args.manifest,
+        use_columns=use_columns,
+        neu=neu,
+        workers=args.workers,
+    )
+    if failed:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -1,89 +1,288 @@
 import logging
 import os
 import io
+import multiprocessing
 import sys
 import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime as dt
+from datetime import timedelta as td
 
-import libnfs
-from rtk_gps.rtk_gps import plot_rtk_neu
+from rtk_gps.cache import FrameCache
+from rtk_gps.catalog import FileCatalog
+from rtk_gps.fetch import prefetch
+from rtk_gps.loader import datafiles
+from rtk_gps.metrics import Metrics, record_figures
+from rtk_gps.publish import LocalSSHClient, Publisher, ssh_connect
+from rtk_gps.rendercache import RenderCache, fingerprint
+from rtk_gps.rtk_gps import BaselineData, figure_file, plot_rtk_neu_windows
+from rtk_gps.storage import Storage, open_storage
+from rtk_gps.tailreader import PosTailReader
 import schedule
 import paramiko
 
 
+BASELINES_LIST = [
+    # ["ORFC-ELDC", "THOB-ELDC", "SKSH-ELDC", "SENG-ELDC"],
+    ["ORFC-ELDC", "SKSH-ELDC", "SENG-ELDC"],
+    # ["SENG-ELDC", "THOB-ELDC", "SKSH-ELDC", "HS02-ELDC", "ASVE-ELDC", "GEVK-ELDC", "AUSV-ELDC"],
+    ["SENG-ELDC", "SKSH-ELDC", "HS02-ELDC", "ASVE-ELDC", "GEVK-ELDC", "AUSV-ELDC"],
+    # ["SENG-SUDV", "HS02-SUDV", "THOB-SUDV", "ASVE-SUDV", "VMOS-SUDV", "GRVV-SUDV", "GEVK-SUDV"],
+    ["SENG-SUDV", "HS02-SUDV", "ASVE-SUDV", "VMOS-SUDV", "GRVV-SUDV", "GEVK-SUDV"],
+    # ["SENG-NAMC", "HS02-NAMC", "THOB-NAMC", "AUSV-NAMC", "GRVV-NAMC", "SKSH-NAMC"],
+    ["SENG-NAMC", "HS02-NAMC", "AUSV-NAMC", "GRVV-NAMC", "SKSH-NAMC"],
+    # ["VMOS-AUSV", "GEVK-AUSV", "GRVV-AUSV", "GRVM-AUSV", "SKSH-AUSV", "THOB-AUSV", "ELDC-AUSV"],
+    ["VMOS-AUSV", "GEVK-AUSV", "GRVV-AUSV", "GRVM-AUSV", "SKSH-AUSV", "ELDC-AUSV"],
+]
+
+# routine periods plotted for each group
+SPECIALS = ["twodays", "12h", "6h"]
+
+
 def handle_uncaught_exception(exc_type, exc_value, exc_traceback):
     logging.critical(
         "Uncaught exception: {exc_value}. Traceback:",
         exc_info=(exc_type, exc_value, exc_traceback),
     )
 
-def plot(nfs: libnfs.NFS, figure_path: str, logo: str = ""):
+def cycle_files(days=2, catalog=None, buffers=None):
+    """
+    data files of every baseline plotted in one run, those that exist when
+    there is a catalog
+
+    A baseline with epochs held in buffers, a dict of RingBuffer by
+    baseline, only needs the files from its last epoch held, as
+    BaselineData loads it.
+    """
+
+    end = dt.now()
+    start = end - td(days=days)
+    if catalog is not None:
+        files = catalog.datafiles
+    else:
+        files = datafiles
+    starts = {}
+    for baselines in BASELINES_LIST:
+        for baseline in baselines:
+            buffer = None if buffers is None else buffers.get(baseline)
+            if buffer is None or buffer.last is None:
+                starts[baseline] = start
+            else:
+                starts[baseline] = max(start, buffer.last)
+    return sorted(
+        {
+            filename
+            for baseline, b_start in starts.items()
+            for filename in files(baseline, b_start, end)
+        }
+    )
+
+def _render_group(
+    baselines,
+    data,
+    figure_path,
+    logo,
+    resample,
+    figtype,
+    specials=SPECIALS,
+    max_points=None,
+):
+    """
+    the routine periods of one group of baselines, run in a worker process,
+    returns the seconds spent rendering each figure
+    """
+
+    return plot_rtk_neu_windows(
+        None,
+        baselines,
+        specials=specials,
+        resample=resample,
+        figurepath=figure_path,
+        logo=logo,
+        figtype=figtype,
+        data=data,
+        max_points=max_points,
+    )
+
+
+def plot(
+    nfs: Storage,
+    figure_path: str,
+    logo: str = "",
+    reader=None,
+    cache=None,
+    workers: int = 1,
+    resamplers=None,
+    buffers=None,
+    render_cache=None,
+    max_points=None,
+    metrics=None,
+):
     """
     plots for the monitoring room
+
+    reader keeps what has been parsed of the data files between runs and
+    cache holds the parsed files of past days, resamplers keeps the resampled
+    baselines so only new epochs are resampled and buffers holds the epochs
+    of the baselines so only new epochs are loaded. Every baseline is loaded and
+    resampled once and all the plots are sliced from that, the periods of a
+    group are drawn on one figure. With more than one worker the groups are
+    rendered in a pool of that many processes, each sent only the data of
+    its group. The processes are spawned, forking the threads of the
+    scheduler is not safe. A group that fails is logged and the others are still
+    rendered, the failed groups are returned. With a RenderCache only the
+    periods whose baselines got new data since they were last rendered are
+    drawn. max_points thins the plotted lines to that many points. The
+    durations of the stages, baselines and figures are set in metrics, a
+    Metrics.
     """
     logging.info("Running plot schedule...")
 
-    start = None
-    end = None
     resample_str = "60s"
     figtype = "png"
 
-    baselines_list = [
-        # ["ORFC-ELDC", "THOB-ELDC", "SKSH-ELDC", "SENG-ELDC"],
-        ["ORFC-ELDC", "SKSH-ELDC", "SENG-ELDC"],
-        # ["SENG-ELDC", "THOB-ELDC", "SKSH-ELDC", "HS02-ELDC", "ASVE-ELDC", "GEVK-ELDC", "AUSV-ELDC"],
-        ["SENG-ELDC", "SKSH-ELDC", "HS02-ELDC", "ASVE-ELDC", "GEVK-ELDC", "AUSV-ELDC"],
-        # ["SENG-SUDV", "HS02-SUDV", "THOB-SUDV", "ASVE-SUDV", "VMOS-SUDV", "GRVV-SUDV", "GEVK-SUDV"],
-        ["SENG-SUDV", "HS02-SUDV", "ASVE-SUDV", "VMOS-SUDV", "GRVV-SUDV", "GEVK-SUDV"],
-        # ["SENG-NAMC", "HS02-NAMC", "THOB-NAMC", "AUSV-NAMC", "GRVV-NAMC", "SKSH-NAMC"],
-        ["SENG-NAMC", "HS02-NAMC", "AUSV-NAMC", "GRVV-NAMC", "SKSH-NAMC"],
-        # ["VMOS-AUSV", "GEVK-AUSV", "GRVV-AUSV", "GRVM-AUSV", "SKSH-AUSV", "THOB-AUSV", "ELDC-AUSV"],
-        ["VMOS-AUSV", "GEVK-AUSV", "GRVV-AUSV", "GRVM-AUSV", "SKSH-AUSV", "ELDC-AUSV"],
-    ]
-
-    for baselines in baselines_list:
-        logging.info(f"Plotting {baselines}...")
-        plot_rtk_neu(
-            nfs,
-            baselines,
-            start=start,
-            end=end,
-            resample=resample_str,
-            special="twodays",
-            figurepath=figure_path,
-            logo=logo,
-            figtype=figtype,
-        )
-        plot_rtk_neu(
-            nfs,
-            baselines,
-            start=start,
-            end=end,
-            resample=resample_str,
-            special="12h",
-            figurepath=figure_path,
-            logo=logo,
-            figtype=figtype,
+    data_end = dt.now()
+    data = BaselineData(
+        nfs,
+        [baseline for baselines in BASELINES_LIST for baseline in baselines],
+        data_end - td(days=2),
+        data_end,
+        resample=resample_str,
+        reader=reader,
+        cache=cache,
+        resamplers=resamplers,
+        buffers=buffers,
+        metrics=metrics,
+    )
+    if buffers is not None:
+        for baseline, buffer in sorted(buffers.items()):
+            logging.info(
+                "Buffer of %s: %d epochs, %.1f MiB",
+                baseline,
+                len(buffer),
+                buffer.nbytes / 1024**2,
+            )
+
+    # the periods of each group to draw and the fingerprints of their inputs
+    groups = []
+    for baselines in BASELINES_LIST:
+        keys = {}
+        for special in SPECIALS:
+            fig_name = figure_file(figure_path, baselines, special, figtype)
+            key = fingerprint(
+                data, baselines, special, resample_str, figtype, logo, max_points
+            )
+            if render_cache is None or render_cache.stale(fig_name, key):
+                keys[special] = (fig_name, key)
+        if keys:
+            groups.append((baselines, keys))
+
+    r_start = time.perf_counter()
+    failed = []
+    rendered = []
+    durations = {}
+    if workers > 1 and len(groups) > 1:
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            jobs = {
+                executor.submit(
+                    _render_group,
+                    baselines,
+                    data.subset(baselines),
+                    figure_path,
+                    logo,
+                    resample_str,
+                    figtype,
+                    list(keys),
+                    max_points,
+                ): (baselines, keys)
+                for baselines, keys in groups
+            }
+            for job, (baselines, keys) in jobs.items():
+                try:
+                    durations.update(job.result())
+                except Exception:
+                    logging.exception(f"Plotting {baselines} failed")
+                    failed.append(baselines)
+                    continue
+                rendered.extend(keys.values())
+    else:
+        for baselines, keys in groups:
+            logging.info(f"Plotting {baselines}...")
+            try:
+                durations.update(
+                    _render_group(
+                        baselines,
+                        data,
+                        figure_path,
+                        logo,
+                        resample_str,
+                        figtype,
+                        list(keys),
+                        max_points,
+                    )
+                )
+            except Exception:
+                logging.exception(f"Plotting {baselines} failed")
+                failed.append(baselines)
+                continue
+            rendered.extend(keys.values())
+    data.timings["render"] = time.perf_counter() - r_start
+
+    logging.info(
+        "Stage timings: %s",
+        ", ".join(
+            f"{stage} {seconds:.2f} s" for stage, seconds in data.timings.items()
+        ),
+    )
+    if render_cache is not None:
+        for fig_name, key in rendered:
+            render_cache.store(fig_name, key)
+    figures = len(BASELINES_LIST) * len(SPECIALS)
+    unchanged = figures - sum(len(keys) for _, keys in groups)
+    logging.info(
+        "Rendered %d of %d figures, %d unchanged",
+        len(rendered),
+        figures,
+        unchanged,
+    )
+    if metrics is not None:
+        # the files were fetched ahead, loading them is parsing them
+        metrics.set("rtk_stage_seconds", data.timings["load"], stage="parse")
+        metrics.set("rtk_stage_seconds", data.timings["resample"], stage="resample")
+        metrics.set("rtk_stage_seconds", data.timings["render"], stage="render")
+        record_figures(metrics, durations)
+        metrics.set("rtk_figures", len(rendered), state="rendered")
+        metrics.set("rtk_figures", unchanged, state="unchanged")
+        metrics.set(
+            "rtk_figures", figures - unchanged - len(rendered), state="failed"
         )
-        plot_rtk_neu(
-            nfs,
-            baselines,
-            start=start,
-            end=end,
-            resample=resample_str,
-            special="6h",
-            figurepath=figure_path,
-            logo=logo,
-            figtype=figtype,
+    if failed:
+        logging.error(
+            "%d of %d groups failed to plot", len(failed), len(BASELINES_LIST)
         )
 
-def program_schedule():
-    logging.info("------------------------------------------")
+    return failed
 
-    figure_path = "fig_output"
-    logo_file = "extra/logo/VI_Two_Line_Blue.png"
+def sftp_publisher():
+    """
+    Publisher to the CDN given by the RTK_SFTP_* variables
 
-    if os.path.exists(figure_path) == False:
-        os.mkdir(figure_path)
+    With RTK_SFTP_LOCAL the figures are published to that local directory
+    instead.
+    """
+
+    UPLOAD_WORKERS = int(os.environ.get("RTK_UPLOAD_WORKERS", "4"))
+    remote_folder_path = os.environ.get("RTK_SFTP_PATH", "")
+
+    local_root = os.environ.get("RTK_SFTP_LOCAL")
+    if local_root:
+        return Publisher(
+            lambda: LocalSSHClient(local_root),
+            remote_folder_path,
+            workers=UPLOAD_WORKERS,
+        )
 
     private_key_str = os.environ.get("RTK_SSH_PRIVATE_KEY")
 
@@ -91,42 +290,150 @@ def program_schedule():
         raise RuntimeError("Missing SSH private key!")
 
     private_key = paramiko.RSAKey.from_private_key(io.StringIO(private_key_str))
+    SFTP_HOST = os.environ.get("RTK_SFTP_HOST")
+    SFTP_USER = os.environ.get("RTK_SFTP_USER")
+
+    return Publisher(
+        lambda: ssh_connect(SFTP_HOST, SFTP_USER, private_key),
+        remote_folder_path,
+        workers=UPLOAD_WORKERS,
+    )
+
+
+def cycle_metrics(metrics, seconds, ok, cache=None, render_cache=None, catalog=None):
+    """
+    set the duration and outcome of a run and the counters of the caches in
+    metrics, which are written to RTK_METRICS_FILE when it is set
+    """
+
+    metrics.add("rtk_cycles_total")
+    if not ok:
+        metrics.add("rtk_cycle_failures_total")
+    metrics.set("rtk_cycle_seconds", seconds)
+    metrics.set("rtk_cycle_end_timestamp_seconds", time.time())
+
+    counts = {}
+    if cache is not None:
+        stats = cache.stats()
+        counts["frame"] = stats["hits"], stats["misses"]
+    if render_cache is not None:
+        stats = render_cache.stats()
+        counts["render"] = stats["skipped"], stats["rendered"]
+    if catalog is not None:
+        stats = catalog.stats()
+        counts["catalog"] = stats["hits"], stats["listings"] + stats["stats"]
+    for name, (hits, misses) in counts.items():
+        metrics.set("rtk_cache_hits_total", hits, cache=name)
+        metrics.set("rtk_cache_misses_total", misses, cache=name)
+
+    metrics_file = os.environ.get("RTK_METRICS_FILE")
+    if metrics_file:
+        try:
+            metrics.write(metrics_file)
+        except OSError as e:
+            logging.error(f"Failed to write the metrics to {metrics_file}: {e}")
+
+
+def program_schedule(
+    reader=None,
+    cache=None,
+    resamplers=None,
+    buffers=None,
+    catalog=None,
+    publisher=None,
+    render_cache=None,
+    metrics=None,
+):
+    logging.info("------------------------------------------")
+    c_start = time.perf_counter()
+    caches = {"cache": cache, "render_cache": render_cache, "catalog": catalog}
+
+    figure_path = "fig_output"
+    logo_file = "extra/logo/VI_Two_Line_Blue.png"
+
+    if os.path.exists(figure_path) == False:
+        os.mkdir(figure_path)
+
+    if publisher is None:
+        publisher = sftp_publisher()
 
     logging.info("Mounting NFS...")
     NFS_HOST = os.environ.get("RTK_NFS_HOST")
     NFS_PATH = os.environ.get("RTK_NFS_PATH")
+    FETCH_WORKERS = int(os.environ.get("RTK_FETCH_WORKERS", "8"))
+    FETCH_TIMEOUT = float(os.environ.get("RTK_FETCH_TIMEOUT", "60"))
+    FETCH_SIZE = int(os.environ.get("RTK_FETCH_SIZE", "256")) * 1024**2
+    RENDER_WORKERS = int(os.environ.get("RTK_RENDER_WORKERS", "1"))
+    PLOT_POINTS = int(os.environ.get("RTK_PLOT_POINTS", "0")) or None
     try:
-        nfs = libnfs.NFS(os.path.join(NFS_HOST, NFS_PATH))
-        plot(nfs, figure_path, logo=logo_file)
+        storage = open_storage(os.path.join(NFS_HOST, NFS_PATH))
+        nfs = storage
+        if catalog is not None:
+            catalog.connect(storage)
+            nfs = catalog
+        if FETCH_WORKERS > 0:
+            f_start = time.perf_counter()
+            nfs = prefetch(
+                cycle_files(catalog=catalog, buffers=buffers),
+                storage,
+                max_workers=FETCH_WORKERS,
+                timeout=FETCH_TIMEOUT,
+                reader=reader,
+                cache=cache,
+                fallback=nfs,
+                catalog=catalog,
+                metrics=metrics,
+                max_bytes=FETCH_SIZE,
+            )
+            if metrics is not None:
+                metrics.set(
+                    "rtk_stage_seconds", time.perf_counter() - f_start, stage="fetch"
+                )
+        plot(
+            nfs,
+            figure_path,
+            logo=logo_file,
+            reader=reader,
+            cache=cache,
+            workers=RENDER_WORKERS,
+            resamplers=resamplers,
+            buffers=buffers,
+            render_cache=render_cache,
+            max_points=PLOT_POINTS,
+            metrics=metrics,
+        )
+        if cache is not None:
+            logging.info("Cache hits: %(hits)d, misses: %(misses)d", cache.stats())
+        if render_cache is not None:
+            logging.info(
+                "Figures rendered: %(rendered)d, skipped: %(skipped)d",
+                render_cache.stats(),
+            )
+        if catalog is not None:
+            logging.info(
+                "Catalog listings: %(listings)d, stats: %(stats)d, hits: %(hits)d",
+                catalog.stats(),
+            )
     except:
         logging.error(f"Failed to mount NFS at {NFS_HOST}")
+        if metrics is not None:
+            cycle_metrics(metrics, time.perf_counter() - c_start, False, **caches)
         return
 
-    logging.info("Establishing SSH connection to CDN...")
-    SFTP_HOST = os.environ.get("RTK_SFTP_HOST")
+    u_start = time.perf_counter()
     try:
-        client = paramiko.SSHClient()
-        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        client.connect(
-            SFTP_HOST,
-            username=os.environ.get("RTK_SFTP_USER"),
-            pkey=private_key
-        )
+        publisher.publish(figure_path, metrics=metrics)
+    except Exception:
+        logging.exception("Failed to publish to the CDN")
+        publisher.close()
+        if metrics is not None:
+            cycle_metrics(metrics, time.perf_counter() - c_start, False, **caches)
+        return
 
-        sftp = client.open_sftp()
-        remote_folder_path = os.environ.get("RTK_SFTP_PATH")
-        
-        for fn in os.listdir(figure_path):
-            local_path = os.path.join(figure_path, fn)
-            remote_path = os.path.join(remote_folder_path, fn)
-            sftp.put(local_path, remote_path)
-            logging.info(f"{fn} transferred.")
+    if metrics is not None:
+        metrics.set("rtk_stage_seconds", time.perf_counter() - u_start, stage="upload")
+        cycle_metrics(metrics, time.perf_counter() - c_start, True, **caches)
 
-        client.close()
-    except:
-        logging.error(f"Failed to establish an SSH connection to {SFTP_HOST}")
-        return
-    
 def main():
     sys.excepthook = handle_uncaught_exception
     logging.basicConfig(
@@ -135,9 +442,62 @@ def main():
         handlers=[logging.StreamHandler(sys.stdout)],
     )
 
-    program_schedule()#one run before we start the schedule
+    # only the data appended since the last run is read from the growing files
+    reader = PosTailReader(
+        max_bytes=int(os.environ.get("RTK_READER_SIZE", "512")) * 1024**2
+    )
+    cache = FrameCache(
+        os.environ.get("RTK_CACHE_DIR", "rtk_cache"),
+        max_bytes=int(os.environ.get("RTK_CACHE_SIZE", "2048")) * 1024**2,
+    )
+
+    # minute bins are kept between runs, only new epochs are resampled
+    resamplers = {}
+    # the last two days of every baseline are held in compact arrays
+    buffers = {}
+
+    # directories are listed once per run, settled files are stat'ed once
+    catalog = FileCatalog(ttl=float(os.environ.get("RTK_CATALOG_TTL", "60")))
+
+    # one connection to the CDN kept open, only changed figures are sent
+    publisher = sftp_publisher()
+
+    # figures whose baselines got no new epochs are kept as they are
+    render_cache = RenderCache(
+        max_age=float(os.environ.get("RTK_RENDER_MAX_AGE", "3600"))
+    )
+
+    # durations and counts of each run for Prometheus
+    metrics = Metrics()
+    metrics_port = os.environ.get("RTK_METRICS_PORT")
+    if metrics_port:
+        metrics.serve(
+            int(metrics_port), os.environ.get("RTK_METRICS_HOST", "127.0.0.1")
+        )
+
+    # one run before we start the schedule
+    program_schedule(
+        reader,
+        cache,
+        resamplers,
+        buffers,
+        catalog,
+        publisher,
+        render_cache,
+        metrics,
+    )
     scheduler = schedule.Scheduler()
-    scheduler.every(5).minutes.at(":10").do(program_schedule)
+    scheduler.every(5).minutes.at(":10").do(
+        program_schedule,
+        reader,
+        cache,
+        resamplers,
+        buffers,
+        catalog,
+        publisher,
+        render_cache,
+        metrics,
+    )
 
     while True:
         scheduler.run_pending()
@@ -0,0 +1,421 @@
+"""
+Where the data files are read from, a local directory, libnfs or memory
+"""
+
+import asyncio
+import errno
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+CHUNK_SIZE = 4 * 1024 * 1024
+
+
+class NFSRawIO(io.RawIOBase):
+    """
+    Raw binary stream over a libnfs file handle
+
+    Reads go straight from the NFS handle into the caller's buffer, wrap it
+    in io.BufferedReader to get a regular file object.
+    """
+
+    def __init__(self, fh):
+        self._fh = fh
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        data = self._fh.read(len(b))
+        n = len(data)
+        b[:n] = data
+        return n
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        self._fh.seek(offset, whence)
+        return self._fh.tell()
+
+    def tell(self):
+        return self._fh.tell()
+
+    def close(self):
+        if not self.closed:
+            self._fh.close()
+        super().close()
+
+
+class Storage:
+    """
+    Data files served with the listdir, stat and open calls of libnfs.NFS
+
+    Subclasses implement those three, the other calls are built on them. A
+    Storage can be passed as nfs wherever the loaders take one.
+    """
+
+    def listdir(self, path):
+        raise NotImplementedError
+
+    def stat(self, path):
+        raise NotImplementedError
+
+    def open(self, path, mode="rb"):
+        raise NotImplementedError
+
+    def attributes(self, path):
+        """
+        size in bytes and modification time in ns of a file
+        """
+
+        st = self.stat(path)
+        mtime = st["mtime"]
+        if isinstance(mtime, dict):
+            mtime = mtime["sec"] * 10**9 + mtime.get("nsec", 0)
+        else:
+            mtime = int(mtime * 10**9)
+        return st["size"], mtime
+
+    def open_stream(self, path, chunk_size=CHUNK_SIZE):
+        """
+        open a file for buffered binary reading
+        """
+
+        raw = NFSRawIO(self.open(path, mode="rb"))
+        return io.BufferedReader(raw, buffer_size=chunk_size)
+
+    def read(self, path, offset=0, size=None):
+        """
+        size bytes of a file from offset, or all of them up to its end
+        """
+
+        chunks = []
+        fh = self.open(path, mode="rb")
+        try:
+            fh.seek(offset, os.SEEK_SET)
+            remaining = size
+            while remaining is None or remaining > 0:
+                chunk = fh.read(CHUNK_SIZE if remaining is None else remaining)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                if remaining is not None:
+                    remaining -= len(chunk)
+        finally:
+            fh.close()
+
+        return b"".join(chunks)
+
+
+class LocalStorage(Storage):
+    """
+    Files under the directory root on the local disk, paths as they are
+    given when root is empty
+    """
+
+    def __init__(self, root=""):
+        self.root = root
+
+    def listdir(self, path):
+        return os.listdir(self._path(path) or ".")
+
+    def stat(self, path):
+        st = os.stat(self._path(path))
+        mtime = {"sec": st.st_mtime_ns // 10**9, "nsec": st.st_mtime_ns % 10**9}
+        return {"size": st.st_size, "mtime": mtime}
+
+    def open(self, path, mode="rb"):
+        return open(self._path(path), mode)
+
+    def open_stream(self, path, chunk_size=CHUNK_SIZE):
+        return open(self._path(path), "rb", buffering=chunk_size)
+
+    def _path(self, path):
+        return os.path.join(self.root, path) if self.root else path
+
+
+class NFSStorage(Storage):
+    """
+    Files of the NFS export at url, read over libnfs
+
+    Each thread mounts its own context on first use, so one NFSStorage can
+    be shared by threads, and only the url is pickled for worker processes.
+    With nfs, a libnfs.NFS or something with its calls, every thread uses
+    that one context instead.
+    """
+
+    def __init__(self, url, nfs=None):
+        self.url = url
+        self._nfs = nfs
+        self._local = threading.local()
+
+    def context(self):
+        """
+        the libnfs.NFS of the calling thread
+        """
+
+        if self._nfs is not None:
+            return self._nfs
+        if not hasattr(self._local, "nfs"):
+            import libnfs
+
+            self._local.nfs = libnfs.NFS(self.url)
+        return self._local.nfs
+
+    def listdir(self, path):
+        return self.context().listdir(path or ".")
+
+    def stat(self, path):
+        return self.context().stat(path)
+
+    def open(self, path, mode="rb"):
+        return self.context().open(path, mode=mode)
+
+    def __getstate__(self):
+        return {"url": self.url}
+
+    def __setstate__(self, state):
+        self.__init__(state["url"])
+
+
+class _MemoryFile:
+    """
+    file handle over bytes with the read, seek, tell and close of libnfs
+    """
+
+    def __init__(self, data):
+        self._data = data
+        self._pos = 0
+
+    def read(self, size=None):
+        if size is None:
+            chunk = self._data[self._pos :]
+        else:
+            chunk = self._data[self._pos : self._pos + size]
+        self._pos += len(chunk)
+        return chunk
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._pos
+        elif whence == os.SEEK_END:
+            offset += len(self._data)
+        self._pos = offset
+
+    def tell(self):
+        return self._pos
+
+    def close(self):
+        pass
+
+
+class MemoryStorage(Storage):
+    """
+    Files held in memory, for benchmarks and trying things out
+
+    Every MemoryStorage of the same name holds the same files, within one
+    process. latency seconds are slept on each request, as a stand-in for
+    the round trip to a server.
+    """
+
+    _exports = {}
+
+    def __init__(self, name="", latency=0.0):
+        self.name = name
+        self.latency = latency
+        self.files = MemoryStorage._exports.setdefault(name, {})
+
+    def add(self, path, data, mtime=None):
+        """
+        store data as the file at path, modified at mtime in seconds
+        """
+
+        mtime = time.time() if mtime is None else mtime
+        self.files[_key(path)] = (bytes(data), int(mtime * 10**9))
+
+    def listdir(self, path):
+        time.sleep(self.latency)
+        prefix = _key(path)
+        prefix = f"{prefix}/" if prefix else ""
+        names = {
+            name[len(prefix) :].split("/")[0]
+            for name in self.files
+            if name.startswith(prefix)
+        }
+        if not names and prefix:
+            raise IOError(errno.ENOENT, "No such file or directory", path)
+        return sorted(names)
+
+    def stat(self, path):
+        time.sleep(self.latency)
+        data, mtime = self._file(path)
+        mtime = {"sec": mtime // 10**9, "nsec": mtime % 10**9}
+        return {"size": len(data), "mtime": mtime}
+
+    def open(self, path, mode="rb"):
+        time.sleep(self.latency)
+        data, _ = self._file(path)
+        return _MemoryFile(data)
+
+    def _file(self, path):
+        try:
+            return self.files[_key(path)]
+        except KeyError:
+            raise IOError(errno.ENOENT, "No such file or directory", path)
+
+
+def _key(path):
+    path = os.path.normpath(path).lstrip("/")
+    return "" if path == "." else path
+
+
+def open_storage(source=None):
+    """
+    the Storage of source
+
+    source is an nfs:// url, a memory:// url naming a MemoryStorage or a
+    local directory, None is the local disk with paths as they are given. A
+    Storage is returned as it is and a libnfs.NFS, or anything with its
+    calls, is wrapped in an NFSStorage.
+    """
+
+    if source is None:
+        return LocalStorage()
+    if isinstance(source, Storage):
+        return source
+    if not isinstance(source, (str, os.PathLike)):
+        return NFSStorage(getattr(source, "url", None), nfs=source)
+
+    source = os.fspath(source)
+    if source.startswith("nfs://"):
+        return NFSStorage(source)
+    if source.startswith("memory://"):
+        return MemoryStorage(source[len("memory://") :])
+    return LocalStorage(source)
+
+
+class AsyncStorage:
+    """
+    asyncio listing, stat and ranged reads of a Storage
+
+    The blocking calls of storage run in a pool of max_workers threads, so
+    up to that many requests are out at once. After a read of size bytes
+    the next read_ahead bytes of the file are read in the background, a read
+    starting where the last one ended is served from them. Use it with async
+    with, on leaving it the reads ahead are dropped and the threads of
+    requests still running are left to finish on their own.
+    """
+
+    def __init__(self, storage, max_workers=8, read_ahead=CHUNK_SIZE):
+        self.storage = open_storage(storage)
+        self.read_ahead = read_ahead
+        self.max_ahead = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._ahead = OrderedDict()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for _, _, task in self._ahead.values():
+            task.cancel()
+        self._ahead.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def call(self, fn, *args):
+        """
+        run fn(*args) in the thread pool
+        """
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    async def listdir(self, path):
+        return await self.call(self.storage.listdir, path)
+
+    async def stat(self, path):
+        """
+        size in bytes and modification time in ns of a file
+        """
+
+        return await self.call(self.storage.attributes, path)
+
+    async def read(self, path, offset=0, size=None, ahead=None):
+        """
+        size bytes of a file from offset, or all of them up to its end
+
+        The ahead bytes after them, read_ahead when it is None, are then
+        read in the background.
+        """
+
+        data = b""
+        kept = self._ahead.pop(path, None)
+        if kept is not None and kept[0] != offset:
+            kept[2].cancel()
+        elif kept is not None:
+            _, length, task = kept
+            try:
+                data = await task
+            except Exception:
+                # read again below, where the error is raised if it persists
+                data = b""
+            else:
+                if size is not None and len(data) > size:
+                    rest = data[size:]
+                    self._keep(path, offset + size, len(rest), _done(rest))
+                    return data[:size]
+                if len(data) < length:
+                    # the end of the file was reached
+                    return data
+
+        if size is None or len(data) < size:
+            rest = None if size is None else size - len(data)
+            data += await self.call(
+                self.storage.read, path, offset + len(data), rest
+            )
+
+        ahead = self.read_ahead if ahead is None else ahead
+        if ahead > 0 and size is not None and len(data) == size:
+            task = asyncio.ensure_future(
+                self.call(self.storage.read, path, offset + size, ahead)
+            )
+            self._keep(path, offset + size, ahead, task)
+        return data
+
+    async def chunks(self, path, offset=0, size=None, chunk_size=CHUNK_SIZE):
+        """
+        the bytes of a file from offset in chunks of chunk_size, the next
+        one read while the last is handled, up to size bytes of them
+        """
+
+        while size is None or size > 0:
+            n = chunk_size if size is None else min(chunk_size, size)
+            ahead = chunk_size if size is None else min(chunk_size, size - n)
+            chunk = await self.read(path, offset, n, ahead)
+            if not chunk:
+                return
+            yield chunk
+            offset += len(chunk)
+            if size is not None:
+                size -= len(chunk)
+            if len(chunk) < n:
+                return
+
+    def _keep(self, path, offset, length, task):
+        self._ahead[path] = (offset, length, task)
+        while len(self._ahead) > self.max_ahead:
+            _, (_, _, task) = self._ahead.popitem(last=False)
+            task.cancel()
+
+
+def _done(result):
+    future = asyncio.get_running_loop().create_future()
+    future.set_result(result)
+    return future
@@ -0,0 +1,93 @@
+"""
+Synthetic RTKLIB .pos files for the tests and the benchmarks
+"""
+
+from datetime import datetime as dt
+from datetime import timedelta as td
+
+import numpy as np
+import pandas as pd
+
+HEADER = (
+    "% program   : RTKLIB ver.demo5\n"
+    "%  GPST                  e-baseline(m)  n-baseline(m)  u-baseline(m)   Q  ns"
+    "   sde(m)   sdn(m)   sdu(m)  sden(m)  sdnu(m)  sdue(m) age(s)  ratio\n"
+)
+
+FULL_HEADER = (
+    "% program   : RTKLIB ver.demo5 b34h\n"
+    "% inp file  : rover.ubx\n"
+    "% inp file  : base.rtcm3\n"
+    "% obs start : {start:%Y/%m/%d %H:%M:%S}.0 GPST\n"
+    "% pos mode  : kinematic\n"
+    "% freqs     : L1+L2\n"
+    "% solution  : forward\n"
+    "% elev mask : 15.0 deg\n"
+    "% ant pos   : 64.012345678  -22.123456789  45.1234\n"
+    "%\n"
+    "% (e/n/u-baseline=WGS84,Q=1:fix,2:float,3:sbas,4:dgps,5:single,6:ppp,"
+    "ns=# of satellites)\n"
+)
+
+# share of fixed, float and single solutions
+Q_SHARES = {1: 0.85, 2: 0.12, 5: 0.03}
+
+
+def synthetic_pos(
+    epochs=86400,
+    start=dt(2024, 2, 21),
+    seed=0,
+    full_header=False,
+    step="1s",
+    header=True,
+):
+    """
+    epochs of baseline solutions every step in RTKLIB .pos layout
+
+    The quality Q is mostly fixed with some float and single solutions,
+    which are noisier, as in the files rtklib writes. Without header only
+    the data lines are returned.
+    """
+
+    rng = np.random.default_rng(seed)
+    stamps = pd.date_range(start, periods=epochs, freq=step)
+    q = rng.choice(list(Q_SHARES), size=epochs, p=list(Q_SHARES.values()))
+    scale = np.where(q == 1, 0.01, np.where(q == 2, 0.05, 1.0))[:, None]
+    enu = rng.normal(size=(epochs, 3)) * scale + [-1234.5, 2345.6, 12.3]
+    sd = np.where(q == 1, 0.0042, np.where(q == 2, 0.0310, 1.2500))
+    ns = rng.integers(5, 20, size=epochs)
+
+    lines = []
+    if header:
+        lines = [FULL_HEADER.format(start=start) if full_header else "", HEADER]
+    for t, (e, n, u), qi, nsi, sdi in zip(stamps, enu, q, ns, sd):
+        lines.append(
+            f"{t:%Y/%m/%d %H:%M:%S}.000 {e:14.4f} {n:14.4f} {u:14.4f} {qi:3d} {nsi:3d}"
+            f" {sdi:8.4f} {sdi * 1.2:8.4f} {sdi * 2.9:8.4f}"
+            "   0.0011  -0.0022   0.0033   1.00   15.2\n"
+        )
+
+    return "".join(lines).encode()
+
+
+def synthetic_files(baselines, days=2, end=None, seed=0):
+    """
+    daily .pos files of baselines ending at end, mapped by their path
+
+    The files of the days before end are whole, the one of the day of end
+    runs up to end. Each day is generated once and used for every baseline.
+    """
+
+    end = dt.now().replace(microsecond=0) if end is None else end
+    first = dt.combine(end.date(), dt.min.time()) - td(days=days)
+
+    files = {}
+    day = first
+    while day <= end:
+        epochs = min(86400, int((end - day).total_seconds()) + 1)
+        data = synthetic_pos(epochs, day, seed=seed + day.toordinal(), full_header=True)
+        for baseline in baselines:
+            files[f"{baseline}/{baseline}{day:%Y%m%d}0000b.pos"] = data
+        day += td(days=1)
+
+    return files
@@ -0,0 +1,155 @@
+"""
+Incremental reading of .pos files that grow between scheduler cycles
+"""
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from rtk_gps.nfsio import CHUNK_SIZE, file_size, open_stream
+from rtk_gps.posfile import empty_frame, parse_pos_stream
+
+MARK_SIZE = 256
+
+
+class _TailState:
+    """
+    what has been parsed of one file so far
+    """
+
+    __slots__ = ("offset", "mark", "frame", "nbytes")
+
+    def __init__(self, offset=0, mark=b"", frame=None):
+        self.offset = offset
+        self.mark = mark
+        self.frame = frame
+        self.nbytes = 0
+
+
+class PosTailReader:
+    """
+    Read .pos files remembering how far each one has been parsed
+
+    On the next read of the same file only the bytes appended since are
+    fetched and parsed, a partially written last line is left for the next
+    read. A file that shrank or where the last bytes parsed changed has been
+    truncated or rotated and is read again from the start. State is kept for the
+    max_files most recently read files, and only as long as their frames hold
+    no more than max_bytes together. With keep, a pandas time delta, only
+    the epochs from keep before the last one are held between reads and
+    later reads return those and the new epochs instead of the whole file.
+    Different files can be read from several threads at once.
+    """
+
+    def __init__(
+        self, max_files=256, chunk_size=CHUNK_SIZE, keep=None, max_bytes=512 * 1024**2
+    ):
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.keep = None if keep is None else pd.to_timedelta(keep)
+        self._files = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    def read(self, filename, nfs, col_names):
+        """
+        the whole file as a data frame, parsing only what is new
+        """
+
+        with self._lock:
+            state = self._files.pop(filename, None)
+            if state is not None:
+                self._nbytes -= state.nbytes
+        size = file_size(filename, nfs)
+
+        if size == 0:
+            return empty_frame(col_names)
+
+        with open_stream(filename, nfs, chunk_size=self.chunk_size) as stream:
+            if state is not None and not self._unchanged(stream, state, size):
+                logging.info("%s was truncated or rotated, reading it again", filename)
+                state = None
+
+            if state is None:
+                state = _TailState(frame=empty_frame(col_names))
+
+            if size > state.offset:
+                stream.seek(state.offset, os.SEEK_SET)
+                new_df, nbytes = parse_pos_stream(stream, col_names, self.chunk_size)
+                logging.info("Read %d new bytes from %s", nbytes, filename)
+                state.offset += nbytes
+                stream.seek(max(state.offset - MARK_SIZE, 0), os.SEEK_SET)
+                state.mark = stream.read(min(state.offset, MARK_SIZE))
+                if state.frame.empty:
+                    state.frame = new_df
+                elif not new_df.empty:
+                    state.frame = pd.concat([state.frame, new_df])
+
+        frame = state.frame
+        if self.keep is not None and not frame.empty:
+            state.frame = frame.loc[frame.index[-1] - self.keep :]
+        state.nbytes = int(state.frame.memory_usage().sum())
+
+        with self._lock:
+            self._files[filename] = state
+            self._nbytes += state.nbytes
+            while len(self._files) > self.max_files or (
+                self._nbytes > self.max_bytes and len(self._files) > 1
+            ):
+                _, dropped = self._files.popitem(last=False)
+                self._nbytes -= dropped.nbytes
+
+        return frame
+
+    def forget(self, filename=None):
+        """
+        drop the state of filename, or of every file, they are read again
+        from the start
+        """
+
+        with self._lock:
+            if filename is None:
+                self._files.clear()
+                self._nbytes = 0
+            else:
+                state = self._files.pop(filename, None)
+                if state is not None:
+                    self._nbytes -= state.nbytes
+
+    @property
+    def nbytes(self):
+        """
+        bytes held by the frames of the files
+        """
+
+        return self._nbytes
+
+    def offset(self, filename):
+        """
+        number of bytes of filename parsed so far
+        """
+
+        state = self._files.get(filename)
+        return 0 if state is None else state.offset
+
+    def resume_offset(self, filename):
+        """
+        first byte of filename the next read needs, for fetching ahead
+        """
+
+        state = self._files.get(filename)
+        return 0 if state is None else state.offset - len(state.mark)
+
+    def _unchanged(self, stream, state, size):
+        """
+        True if the file is the one state describes, possibly grown
+        """
+
+        if size < state.offset:
+            return False
+        stream.seek(state.offset - len(state.mark), os.SEEK_SET)
+        return stream.read(len(state.mark)) == state.mark
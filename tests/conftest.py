@@ -0,0 +1,21 @@
+"""
+Synthetic .pos data shared by the tests
+"""
+
+import pytest
+
+from rtk_gps.synthetic import synthetic_pos
+
+
+def pos_bytes(start, epochs, step="10s", seed=0, header=True):
+    """
+    epochs of baseline solutions every step from start in the .pos layout,
+    a few of them single solutions with Q 5
+    """
+
+    return synthetic_pos(epochs, start, seed=seed, step=step, header=header)
+
+
+@pytest.fixture
+def make_pos():
+    return pos_bytes
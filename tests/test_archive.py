@@ -0,0 +1,101 @@
+"""
+Tests of the archive of one minute medians
+"""
+
+import os
+
+import pandas as pd
+
+from rtk_gps.archive import LOCK_FILE, read_archive, write_archive
+from rtk_gps.save_rtk_data import (
+    backfill,
+    backfill_tasks,
+    read_manifest,
+    rtk_write_archive,
+)
+from rtk_gps.storage import MemoryStorage
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+
+COLUMNS = ["e-baseline", "n-baseline", "u-baseline"]
+
+
+def test_write_archive_with_neu(tmp_path):
+    with open(os.path.join(DATA, "restart.pos"), "rb") as f:
+        data = f.read()
+    nfs = MemoryStorage("archive-neu")
+    nfs.add("ABCD-EFGH/ABCD-EFGH202402210000b.pos", data)
+
+    rtk_write_archive(
+        "ABCD-EFGH",
+        "1min",
+        ["20240221"],
+        ["20240221"],
+        COLUMNS,
+        nfs,
+        str(tmp_path),
+        neu=True,
+    )
+
+    df = read_archive(str(tmp_path), "ABCD-EFGH")
+    assert list(df.index) == [
+        pd.Timestamp("2024-02-21 00:00"),
+        pd.Timestamp("2024-02-21 00:05"),
+    ]
+    neu = pd.read_csv(tmp_path / "ABCD-EFGH-distance-20240221.neu", sep="\t")
+    assert len(neu) == 2
+    assert sorted(os.listdir(tmp_path / "ABCD-EFGH")) == [LOCK_FILE, "20240221.parquet"]
+
+
+def test_one_lock_per_baseline(tmp_path):
+    index = pd.date_range("2024-02-20", periods=3 * 1440, freq="1min", name="date_time")
+    df = pd.DataFrame({"e-baseline": range(len(index))}, index=index, dtype=float)
+
+    assert write_archive(str(tmp_path), "ABCD-EFGH", df) == list(
+        pd.date_range("2024-02-20", periods=3)
+    )
+    write_archive(str(tmp_path), "ABCD-EFGH", df.iloc[::2] + 1, replace=True)
+
+    names = sorted(os.listdir(tmp_path / "ABCD-EFGH"))
+    assert names == [LOCK_FILE] + [f"202402{day}.parquet" for day in [20, 21, 22]]
+    expected = df.copy()
+    expected.iloc[::2] += 1
+    pd.testing.assert_frame_equal(
+        read_archive(str(tmp_path), "ABCD-EFGH"), expected, check_freq=False
+    )
+
+
+def test_backfill_resumes_from_manifest(tmp_path, make_pos):
+    source = tmp_path / "source"
+    archive = tmp_path / "archive"
+    manifest = str(tmp_path / "backfill.manifest")
+    # ABCD-EFGH has both days, IJKL-EFGH only the first
+    for baseline, day in [
+        ("ABCD-EFGH", "20240220"),
+        ("ABCD-EFGH", "20240221"),
+        ("IJKL-EFGH", "20240220"),
+    ]:
+        path = source / baseline / f"{baseline}{day}0000b.pos"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(make_pos(day, 60))
+    with open(manifest, "w") as f:
+        f.write("ABCD-EFGH 20240220\n")
+
+    baselines = ["ABCD-EFGH", "IJKL-EFGH"]
+    done = read_manifest(manifest)
+    tasks = backfill_tasks(baselines, "2024-02-20", "2024-02-21", done)
+    assert ("ABCD-EFGH", "20240220") not in tasks
+    failed = backfill(tasks, str(source), str(archive), manifest, use_columns=COLUMNS)
+    assert failed == []
+
+    # the day in the manifest was not archived again, the day without data
+    # is not recorded and is tried again on the next run
+    assert read_manifest(manifest) == {
+        ("ABCD-EFGH", "20240220"),
+        ("ABCD-EFGH", "20240221"),
+        ("IJKL-EFGH", "20240220"),
+    }
+    assert sorted(os.listdir(archive / "ABCD-EFGH")) == [LOCK_FILE, "20240221.parquet"]
+    assert backfill_tasks(
+        baselines, "2024-02-20", "2024-02-21", read_manifest(manifest)
+    ) == [("IJKL-EFGH", "20240221")]
@@ -0,0 +1,95 @@
+"""
+Tests of the on-disk cache of parsed .pos files
+"""
+
+import io
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from rtk_gps.cache import FrameCache
+from rtk_gps.posfile import BASELINE_COLUMNS, read_pos
+
+# modified two days ago, in ns as the storages report it
+MTIME = int((time.time() - 2 * 86400) * 10**9)
+
+
+def frame(make_pos, seed=0):
+    return read_pos(
+        io.BytesIO(make_pos("2024-02-21", 500, seed=seed)),
+        BASELINE_COLUMNS,
+        engine="fast",
+    )
+
+
+def entries(cache):
+    return sorted(fn for fn in os.listdir(cache.directory) if fn.endswith(".feather"))
+
+
+def test_round_trip_and_counters(tmp_path, make_pos):
+    cache = FrameCache(str(tmp_path))
+    df = frame(make_pos)
+
+    assert cache.get("a.pos", 100, MTIME) is None
+    cache.put("a.pos", 100, MTIME, df)
+    assert cache.valid("a.pos", 100, MTIME)
+    pd.testing.assert_frame_equal(cache.get("a.pos", 100, MTIME), df)
+    pd.testing.assert_frame_equal(cache.get("a.pos", 100, MTIME), df)
+
+    assert cache.stats() == {"hits": 2, "misses": 1}
+
+
+@pytest.mark.parametrize("size, mtime", [(101, MTIME), (100, MTIME + 1)])
+def test_changed_file_is_a_miss(tmp_path, make_pos, size, mtime):
+    cache = FrameCache(str(tmp_path))
+    cache.put("a.pos", 100, MTIME, frame(make_pos))
+
+    assert not cache.valid("a.pos", size, mtime)
+    assert cache.get("a.pos", size, mtime) is None
+    assert cache.stats() == {"hits": 0, "misses": 1}
+
+    # the entry of the path is replaced
+    df = frame(make_pos, seed=1)
+    cache.put("a.pos", size, mtime, df)
+    assert len(entries(cache)) == 1
+    assert not cache.valid("a.pos", 100, MTIME)
+    pd.testing.assert_frame_equal(cache.get("a.pos", size, mtime), df)
+
+
+def test_min_age(tmp_path, make_pos):
+    cache = FrameCache(str(tmp_path), min_age=3600)
+    now = time.time()
+
+    # still being written
+    cache.put("a.pos", 100, int((now - 3000) * 10**9), frame(make_pos))
+    assert entries(cache) == []
+    cache.put("a.pos", 100, int((now - 4000) * 10**9), frame(make_pos))
+    assert len(entries(cache)) == 1
+
+    # nothing to keep in an empty frame
+    cache.put("b.pos", 100, MTIME, frame(make_pos).iloc[:0])
+    assert len(entries(cache)) == 1
+
+
+def test_least_recently_used_are_evicted(tmp_path, make_pos):
+    one = FrameCache(str(tmp_path / "one"))
+    one.put("a.pos", 100, MTIME, frame(make_pos))
+    size = os.path.getsize(os.path.join(one.directory, entries(one)[0]))
+
+    # room for two entries
+    cache = FrameCache(str(tmp_path / "cache"), max_bytes=2 * size + size // 2)
+    for i, name in enumerate(["a.pos", "b.pos"]):
+        cache.put(name, 100, MTIME, frame(make_pos))
+        # used an hour apart
+        used = time.time() - 7200 + 3600 * i
+        os.utime(cache._entry(name), (used, used))
+    # a is used again, b is now the least recently used
+    assert cache.get("a.pos", 100, MTIME) is not None
+    cache.put("c.pos", 100, MTIME, frame(make_pos))
+
+    assert cache.valid("a.pos", 100, MTIME)
+    assert not cache.valid("b.pos", 100, MTIME)
+    assert cache.valid("c.pos", 100, MTIME)
+    assert len(entries(cache)) == 2
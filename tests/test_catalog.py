@@ -0,0 +1,62 @@
+"""
+Tests of the cached directory listings
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from rtk_gps.catalog import FileCatalog
+from rtk_gps.storage import MemoryStorage
+
+
+class SlowStorage(MemoryStorage):
+    """
+    MemoryStorage counting the requests it serves at once
+    """
+
+    def __init__(self, name):
+        super().__init__(name, latency=0.05)
+        self.running = 0
+        self.most = 0
+        self.listings = 0
+        self._count = threading.Lock()
+
+    def listdir(self, path):
+        with self._count:
+            self.listings += 1
+        return self._timed(super().listdir, path)
+
+    def stat(self, path):
+        return self._timed(super().stat, path)
+
+    def _timed(self, fn, path):
+        with self._count:
+            self.running += 1
+            self.most = max(self.most, self.running)
+        try:
+            return fn(path)
+        finally:
+            with self._count:
+                self.running -= 1
+
+
+def test_concurrent_attributes():
+    storage = SlowStorage("catalog-slow")
+    storage.files.clear()
+    names = [f"ABCD-EFGH/ABCD-EFGH2024022{day}0000b.pos" for day in range(8)]
+    for name in names:
+        storage.add(name, b"x" * 10, mtime=time.time())
+    catalog = FileCatalog(storage)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        attributes = list(executor.map(catalog.attributes, names))
+
+    assert attributes == [storage.attributes(name) for name in names]
+    # one listing of the directory, the stats sent at once
+    assert storage.listings == 1
+    assert storage.most > 1
+    assert catalog.stats() == {"listings": 1, "stats": 8, "hits": 0}
+
+    assert catalog.attributes(names[0]) == attributes[0]
+    assert catalog.stats()["hits"] == 1
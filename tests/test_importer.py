@@ -0,0 +1,129 @@
+"""
+Tests of importing the one minute medians after the watermarks
+"""
+
+import threading
+
+import pandas as pd
+import pytest
+
+from rtk_gps import importer
+from rtk_gps.importer import import_baselines
+
+BASELINES = ["SENG-ELDC", "SKSH-ELDC"]
+
+TODAY = pd.Timestamp.now().normalize()
+
+# a day file for each of the last five days, each with its first hour
+DAYS = pd.date_range(TODAY - pd.Timedelta(days=4), TODAY)
+
+
+@pytest.fixture
+def storage(tmp_path, make_pos):
+    for seed, baseline in enumerate(BASELINES):
+        (tmp_path / baseline).mkdir()
+        for day in DAYS:
+            path = tmp_path / baseline / f"{baseline}{day:%Y%m%d}0000b.pos"
+            path.write_bytes(make_pos(day, 360, seed=seed * 10 + day.day))
+    return str(tmp_path)
+
+
+@pytest.fixture
+def written(monkeypatch):
+    """
+    the frames upsert is called with, by rover
+    """
+
+    written = {}
+
+    def upsert(engine, frames, table=importer.TABLE):
+        for df in frames:
+            written.setdefault(df["rover"].iloc[0], []).append(df)
+        return sum(len(df) for df in frames)
+
+    monkeypatch.setattr(importer, "upsert", upsert)
+    return written
+
+
+def test_first_run_reads_newest_files(storage, written):
+    marks = {}
+
+    rows = import_baselines(storage, None, marks, workers=2, writers=2)
+
+    # the newest 4 files, an hour of minutes each
+    assert rows == 2 * 4 * 60
+    for rover in ["SENG", "SKSH"]:
+        (df,) = written[rover]
+        assert sorted(set(df.index.normalize())) == list(DAYS[1:])
+        assert marks[("ELDC", rover)] == TODAY + pd.Timedelta("59min")
+
+
+def test_second_run_reads_from_mark(storage, written):
+    mark = DAYS[-2] + pd.Timedelta("34min 56s")
+    marks = {("ELDC", "SENG"): mark, ("ELDC", "SKSH"): TODAY + pd.Timedelta("59min")}
+
+    import_baselines(storage, None, marks, overlap="10min")
+
+    # from the overlap before the mark, floored to the minute
+    (df,) = written["SENG"]
+    assert df.index[0] == DAYS[-2] + pd.Timedelta("24min")
+    assert len(df) == 36 + 60
+    (df,) = written["SKSH"]
+    assert df.index[0] == TODAY + pd.Timedelta("49min")
+    assert marks == {
+        ("ELDC", "SENG"): TODAY + pd.Timedelta("59min"),
+        ("ELDC", "SKSH"): TODAY + pd.Timedelta("59min"),
+    }
+
+
+def test_failed_write_keeps_mark(storage, monkeypatch):
+    def upsert(engine, frames, table=importer.TABLE):
+        raise OSError("connection lost")
+
+    monkeypatch.setattr(importer, "upsert", upsert)
+    mark = DAYS[-2] + pd.Timedelta("30min")
+    marks = {("ELDC", "SENG"): mark}
+
+    with pytest.raises(RuntimeError, match="SENG-ELDC"):
+        import_baselines(storage, None, marks)
+
+    # the next run reads the same epochs again
+    assert marks == {("ELDC", "SENG"): mark}
+
+
+class FailingMarks(dict):
+    """
+    watermarks that cannot be moved for AAAA
+    """
+
+    def __setitem__(self, key, value):
+        if key == ("ELDC", "AAAA"):
+            raise KeyError(key)
+        super().__setitem__(key, value)
+
+
+def test_writer_survives_failed_batch(tmp_path, make_pos, written):
+    # more baselines than the queue holds, all for a single writer
+    baselines = ["AAAA-ELDC"] + [f"S{i:03d}-ELDC" for i in range(6)]
+    for baseline in baselines:
+        (tmp_path / baseline).mkdir()
+        path = tmp_path / baseline / f"{baseline}{TODAY:%Y%m%d}0000b.pos"
+        path.write_bytes(make_pos(TODAY, 60))
+    marks = FailingMarks()
+    errors = []
+
+    def run():
+        try:
+            import_baselines(
+                str(tmp_path), None, marks, workers=1, writers=1, queue_size=1
+            )
+        except RuntimeError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout=60)
+
+    assert not thread.is_alive()
+    assert "AAAA-ELDC" in str(errors[0])
+    assert len(marks) == 6
@@ -0,0 +1,112 @@
+"""
+Tests of the binary COPY encoding of one minute rows
+"""
+
+import struct
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from rtk_gps import ingest
+from rtk_gps.ingest import COLUMNS, _copy_chunks, _CopyStream, table_rows
+
+PG_EPOCH = pd.Timestamp("2000-01-01")
+
+
+def minutes(count=250):
+    rng = np.random.default_rng(0)
+    index = pd.date_range("2024-02-21", periods=count, freq="1min", name="time")
+    df = pd.DataFrame(
+        rng.normal(size=(count, 9)),
+        index=index,
+        columns=["n", "e", "u", "sdn", "sde", "sdu", "sden", "sdnu", "sdue"],
+    )
+    df["q"] = rng.choice([1.0, 1.5, 2.0, 2.5], size=count)
+    df["base"] = "ELDC"
+    df["rover"] = rng.choice(["SENG", "SKSH", "HÖFN"], size=count)
+    df.iloc[::17, 2] = np.nan
+    df.iloc[::23, df.columns.get_loc("q")] = np.nan
+    df.iloc[::31, df.columns.get_loc("rover")] = None
+    return df
+
+
+def decode(data):
+    """
+    the rows of binary COPY data, None for NULL
+    """
+
+    assert data[:19] == ingest.COPY_HEADER
+    assert data[-2:] == ingest.COPY_TRAILER
+    pos = 19
+    rows = []
+    while pos < len(data) - 2:
+        (nfields,) = struct.unpack_from(">h", data, pos)
+        pos += 2
+        row = []
+        for column in COLUMNS[:nfields]:
+            (length,) = struct.unpack_from(">i", data, pos)
+            pos += 4
+            if length == -1:
+                row.append(None)
+                continue
+            value = data[pos : pos + length]
+            pos += length
+            if column == "time":
+                (us,) = struct.unpack(">q", value)
+                row.append(PG_EPOCH + pd.Timedelta(microseconds=us))
+            elif column in ["base", "rover"]:
+                row.append(value.decode("utf-8"))
+            elif column == "q":
+                row.append(struct.unpack(">h", value)[0])
+            else:
+                row.append(struct.unpack(">f", value)[0])
+        assert len(row) == len(COLUMNS)
+        rows.append(row)
+    assert pos == len(data) - 2
+    return rows
+
+
+def expected_rows(df):
+    rows = []
+    for record in df.itertuples(index=False):
+        row = []
+        for column, value in zip(COLUMNS, record):
+            if pd.isna(value):
+                row.append(None)
+            elif column in ["time", "base", "rover"]:
+                row.append(value)
+            elif column == "q":
+                row.append(int(value))
+            else:
+                row.append(float(np.float32(value)))
+        rows.append(row)
+    return rows
+
+
+@pytest.mark.parametrize("copy_rows", [1, 7, 10000])
+def test_copy_decodes(monkeypatch, copy_rows):
+    monkeypatch.setattr(ingest, "COPY_ROWS", copy_rows)
+    df = table_rows(minutes())
+
+    rows = decode(b"".join(_copy_chunks(df)))
+
+    assert rows == expected_rows(df)
+    # q rounds half up as PostgreSQL does
+    assert {row[6] for row in rows} == {1, 2, 3, None}
+
+
+def test_copy_stream():
+    df = table_rows(minutes())
+    data = b"".join(_copy_chunks(df))
+
+    for size in [1, 5, 4096, -1]:
+        stream = _CopyStream(df)
+        parts = []
+        while True:
+            part = stream.read(size)
+            if not part:
+                break
+            assert size < 0 or len(part) <= size
+            parts.append(part)
+        assert b"".join(parts) == data
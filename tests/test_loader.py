@@ -0,0 +1,49 @@
+"""
+Tests of loading the files of many baselines
+"""
+
+import os
+
+import pandas as pd
+
+from rtk_gps.loader import baseline_frame, load_baselines
+from rtk_gps.storage import MemoryStorage
+from rtk_gps.tailreader import PosTailReader
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+
+START = pd.Timestamp("2024-02-21")
+END = pd.Timestamp("2024-02-21 23:59:59")
+
+
+def storage(name, files):
+    """
+    a MemoryStorage holding files, the bytes of each path
+    """
+
+    storage = MemoryStorage(name)
+    storage.files.clear()
+    for path, data in files.items():
+        storage.add(path, data)
+    return storage
+
+
+def test_bad_file_is_skipped(caplog):
+    with open(os.path.join(DATA, "restart.pos"), "rb") as f:
+        data = f.read()
+    bad = data.replace(b"-1234.4996", b"-1234.49x6")
+    nfs = storage(
+        "loader-bad",
+        {
+            "GOOD-BASE/GOOD-BASE202402210000b.pos": data,
+            "BADD-BASE/BADD-BASE202402210000b.pos": bad,
+        },
+    )
+
+    for reader in [None, PosTailReader()]:
+        df = load_baselines(
+            ["GOOD-BASE", "BADD-BASE"], nfs, START, END, filt=None, reader=reader
+        )
+        assert len(baseline_frame(df, "GOOD-BASE")) == 14
+        assert baseline_frame(df, "BADD-BASE").empty
+        assert "Failed to parse BADD-BASE/BADD-BASE202402210000b.pos" in caplog.text
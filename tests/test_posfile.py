@@ -0,0 +1,110 @@
+"""
+Tests of the .pos parsers
+"""
+
+import io
+import os
+
+import pandas as pd
+import pytest
+
+from rtk_gps.posfile import BASELINE_COLUMNS, parse_pos_stream, read_pos
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+
+# a run stopped in the middle of its tenth line and was started again on
+# the same file, the header of the new run follows the partial line
+RESTART = os.path.join(DATA, "restart.pos")
+
+
+def restart_data(cut):
+    """
+    the bytes of RESTART with the tenth line cut after cut bytes
+    """
+
+    with open(RESTART, "rb") as f:
+        data = f.read()
+    start = data.index(b"2024/02/21 00:00:09.000")
+    restart = data.index(b"%", start)
+    line_start = data.index(b"2024/02/21 00:00:08.000")
+    line = data[line_start : data.index(b"\n", line_start)]
+    line = line.replace(b"00:00:08", b"00:00:09")
+
+    return data[:start] + line[:cut] + data[restart:]
+
+
+def test_engines_agree():
+    df = read_pos(RESTART, BASELINE_COLUMNS, engine="fast")
+    expected = read_pos(RESTART, BASELINE_COLUMNS).dropna()
+
+    assert len(df) == 14
+    assert list(df["Q"].unique()) == [1, 2]
+    pd.testing.assert_frame_equal(df, expected, check_dtype=False)
+
+
+@pytest.mark.parametrize("cut", range(0, 130, 3))
+def test_restart_mid_line(cut):
+    expected = read_pos(RESTART, BASELINE_COLUMNS, engine="fast")
+    data = restart_data(cut)
+
+    df = read_pos(io.BytesIO(data), BASELINE_COLUMNS, engine="fast")
+    pd.testing.assert_frame_equal(df, expected)
+
+    # as the tail reader parses it, a few lines at a time
+    df, nbytes = parse_pos_stream(io.BytesIO(data), BASELINE_COLUMNS, chunk_size=500)
+    assert nbytes == len(data)
+    pd.testing.assert_frame_equal(df, expected)
+
+
+def test_restart_after_whole_line():
+    data = restart_data(None)
+    df = read_pos(io.BytesIO(data), BASELINE_COLUMNS, engine="fast")
+
+    assert len(df) == 15
+    assert df.index[9] == pd.Timestamp("2024-02-21 00:00:09")
+
+
+def test_window_and_columns():
+    columns = ["e-baseline", "Q"]
+    start = pd.Timestamp("2024-02-21 00:00:03")
+    end = pd.Timestamp("2024-02-21 00:05:01")
+    df = read_pos(
+        RESTART, BASELINE_COLUMNS, engine="fast", usecols=columns, start=start, end=end
+    )
+    expected = read_pos(RESTART, BASELINE_COLUMNS).dropna().loc[start:end, columns]
+
+    pd.testing.assert_frame_equal(df, expected, check_dtype=False)
+
+
+@pytest.mark.parametrize(
+    "corrupt",
+    [
+        lambda line: line[:30],
+        lambda line: line + b" 7.7",
+        lambda line: b"x" + line[1:],
+        lambda line: line.replace(b" 00:", b"T00:", 1),
+        lambda line: b"\x00" * len(line),
+        lambda line: b"",
+    ],
+)
+def test_corrupt_line_is_dropped(make_pos, corrupt):
+    data = make_pos("2024-02-21", 100)
+    lines = data.splitlines(keepends=True)
+    # the header is two lines, the 51st epoch is garbled
+    lines[52] = corrupt(lines[52].rstrip(b"\n")) + b"\n"
+    expected = read_pos(io.BytesIO(data), BASELINE_COLUMNS, engine="fast")
+    expected = expected.drop(expected.index[50])
+
+    df = read_pos(io.BytesIO(b"".join(lines)), BASELINE_COLUMNS, engine="fast")
+    pd.testing.assert_frame_equal(df, expected)
+
+
+def test_trailing_blanks(make_pos):
+    data = make_pos("2024-02-21", 100)
+    expected = read_pos(io.BytesIO(data), BASELINE_COLUMNS, engine="fast")
+    lines = data.splitlines(keepends=True)
+    lines[20] = lines[20].replace(b"\n", b"  \n")
+    lines[-1] = lines[-1].replace(b"\n", b"\r\n")
+
+    df = read_pos(io.BytesIO(b"".join(lines)), BASELINE_COLUMNS, engine="fast")
+    pd.testing.assert_frame_equal(df, expected)
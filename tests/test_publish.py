@@ -0,0 +1,148 @@
+"""
+Tests of publishing the figures over SFTP
+"""
+
+import os
+
+from rtk_gps.publish import LocalSFTP, LocalSSHClient, Publisher
+
+
+class RecordingSFTP(LocalSFTP):
+    """
+    LocalSFTP logging its calls, without posix_rename when posix is False
+    and failing the first failures["put"] puts
+    """
+
+    def __init__(self, root, calls, failures, posix=True):
+        super().__init__(root)
+        self.calls = calls
+        self.failures = failures
+        self.posix = posix
+
+    def put(self, localpath, remotepath):
+        self.calls.append(("put", remotepath))
+        if self.failures["put"]:
+            self.failures["put"] -= 1
+            raise IOError("Socket is closed")
+        super().put(localpath, remotepath)
+
+    def posix_rename(self, oldpath, newpath):
+        self.calls.append(("posix_rename", oldpath, newpath))
+        if not self.posix:
+            raise IOError("Operation unsupported")
+        super().posix_rename(oldpath, newpath)
+
+    def rename(self, oldpath, newpath):
+        self.calls.append(("rename", oldpath, newpath))
+        super().rename(oldpath, newpath)
+
+
+class RecordingClient(LocalSSHClient):
+    def __init__(self, root, calls, **options):
+        super().__init__(root)
+        self.calls = calls
+        self.options = options
+
+    def open_sftp(self):
+        return RecordingSFTP(self.root, self.calls, **self.options)
+
+
+def publisher(tmp_path, calls, fail=0, **options):
+    """
+    a Publisher sending to tmp_path/remote and the clients it connected
+    """
+
+    clients = []
+    options["failures"] = {"put": fail}
+
+    def connect():
+        clients.append(RecordingClient(str(tmp_path / "remote"), calls, **options))
+        return clients[-1]
+
+    return Publisher(connect, "/cdn", workers=2), clients
+
+
+def figures(directory, **contents):
+    directory.mkdir(exist_ok=True)
+    for name, content in contents.items():
+        (directory / name).write_bytes(content)
+    return str(directory)
+
+
+def test_unchanged_files_are_skipped(tmp_path):
+    calls = []
+    pub, _ = publisher(tmp_path, calls)
+    local = figures(tmp_path / "fig", **{"a.png": b"a", "b.png": b"b"})
+
+    assert pub.publish(local) == (2, 0, 0)
+    figures(tmp_path / "fig", **{"b.png": b"b2"})
+    calls.clear()
+    assert pub.publish(local) == (1, 1, 0)
+
+    assert [call for call in calls if call[0] == "put"] == [("put", "/cdn/.b.png.tmp")]
+    assert (tmp_path / "remote/cdn/b.png").read_bytes() == b"b2"
+
+
+def test_written_under_temporary_name(tmp_path):
+    calls = []
+    pub, _ = publisher(tmp_path, calls)
+    local = figures(tmp_path / "fig", **{"a.png": b"old"})
+    pub.publish(local)
+    figures(tmp_path / "fig", **{"a.png": b"new"})
+    calls.clear()
+
+    pub.publish(local)
+
+    assert calls == [
+        ("put", "/cdn/.a.png.tmp"),
+        ("posix_rename", "/cdn/.a.png.tmp", "/cdn/a.png"),
+    ]
+    assert os.listdir(tmp_path / "remote/cdn") == ["a.png"]
+    assert (tmp_path / "remote/cdn/a.png").read_bytes() == b"new"
+
+
+def test_rename_without_posix_rename(tmp_path):
+    calls = []
+    pub, _ = publisher(tmp_path, calls, posix=False)
+    local = figures(tmp_path / "fig", **{"a.png": b"old"})
+    pub.publish(local)
+    figures(tmp_path / "fig", **{"a.png": b"new"})
+
+    assert pub.publish(local) == (1, 0, 0)
+    assert calls[-1] == ("rename", "/cdn/.a.png.tmp", "/cdn/a.png")
+    assert os.listdir(tmp_path / "remote/cdn") == ["a.png"]
+    assert (tmp_path / "remote/cdn/a.png").read_bytes() == b"new"
+
+
+def test_reconnects_after_drop(tmp_path):
+    pub, clients = publisher(tmp_path, [])
+    local = figures(tmp_path / "fig", **{"a.png": b"a"})
+    pub.publish(local)
+    assert len(clients) == 1
+
+    # the connection is kept while it is up
+    figures(tmp_path / "fig", **{"a.png": b"a2"})
+    pub.publish(local)
+    assert len(clients) == 1
+
+    clients[0].active = False
+    figures(tmp_path / "fig", **{"a.png": b"a3"})
+    assert pub.publish(local) == (1, 0, 0)
+    assert len(clients) == 2
+    assert (tmp_path / "remote/cdn/a.png").read_bytes() == b"a3"
+
+
+def test_failed_upload_is_retried_on_new_connection(tmp_path):
+    pub, clients = publisher(tmp_path, [], fail=1)
+    local = figures(tmp_path / "fig", **{"a.png": b"a"})
+
+    assert pub.publish(local) == (1, 0, 0)
+    assert len(clients) == 2
+    assert not clients[0].active
+    assert (tmp_path / "remote/cdn/a.png").read_bytes() == b"a"
+
+    # given up after retries, sent again on the next publish
+    pub, clients = publisher(tmp_path / "other", [], fail=2)
+    assert pub.publish(local, retries=0) == (0, 0, 1)
+    assert pub.publish(local, retries=0) == (0, 0, 1)
+    assert pub.publish(local, retries=0) == (1, 0, 0)
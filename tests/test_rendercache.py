@@ -0,0 +1,109 @@
+"""
+Tests of skipping figures whose input data has not changed
+"""
+
+import os
+
+import pandas as pd
+import pytest
+
+from rtk_gps import rendercache
+from rtk_gps.rendercache import RenderCache, fingerprint
+from rtk_gps.rtk_gps import BaselineData
+from rtk_gps.storage import MemoryStorage
+
+BASELINES = ["AAAA-BBBB", "CCCC-BBBB"]
+
+START = pd.Timestamp("2024-02-21")
+END = pd.Timestamp("2024-02-21 23:59:59")
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rendercache.time, "monotonic", clock)
+    return clock
+
+
+def key(make_pos, epochs, params=("60s", "png")):
+    """
+    fingerprint of BASELINES loaded with the first epochs of each baseline
+    """
+
+    nfs = MemoryStorage("rendercache")
+    nfs.files.clear()
+    for seed, baseline in enumerate(BASELINES):
+        data = make_pos(START, 200, seed=seed)
+        # the two header lines and the epochs
+        lines = data.splitlines(keepends=True)[: 2 + epochs[baseline]]
+        nfs.add(f"{baseline}/{baseline}{START:%Y%m%d}0000b.pos", b"".join(lines))
+    data = BaselineData(nfs, BASELINES, START, END)
+    return fingerprint(data, BASELINES, *params)
+
+
+@pytest.fixture
+def figure(tmp_path):
+    path = tmp_path / "AAAA-BBBB_CCCC-BBBB-2d.png"
+    path.write_bytes(b"png")
+    return str(path)
+
+
+def test_unchanged_is_skipped(make_pos, clock, figure):
+    cache = RenderCache(max_age=3600)
+    old = key(make_pos, {"AAAA-BBBB": 100, "CCCC-BBBB": 100})
+    assert cache.stale(figure, old)
+    cache.store(figure, old)
+
+    clock.now += 600
+    assert not cache.stale(figure, key(make_pos, {"AAAA-BBBB": 100, "CCCC-BBBB": 100}))
+    assert cache.stats() == {"rendered": 1, "skipped": 1}
+
+
+def test_rendered_after_max_age(make_pos, clock, figure):
+    cache = RenderCache(max_age=3600)
+    old = key(make_pos, {"AAAA-BBBB": 100, "CCCC-BBBB": 100})
+    cache.store(figure, old)
+
+    clock.now += 3600
+    assert not cache.stale(figure, old)
+    clock.now += 1
+    assert cache.stale(figure, old)
+    cache.store(figure, old)
+    assert not cache.stale(figure, old)
+
+
+def test_rendered_when_file_is_missing(make_pos, clock, figure):
+    cache = RenderCache()
+    old = key(make_pos, {"AAAA-BBBB": 100, "CCCC-BBBB": 100})
+    cache.store(figure, old)
+    assert not cache.stale(figure, old)
+
+    os.remove(figure)
+    assert cache.stale(figure, old)
+
+
+@pytest.mark.parametrize("moved", BASELINES)
+def test_rendered_when_any_last_epoch_moves(make_pos, clock, figure, moved):
+    cache = RenderCache()
+    epochs = {"AAAA-BBBB": 100, "CCCC-BBBB": 100}
+    cache.store(figure, key(make_pos, epochs))
+
+    # 60 more seconds of epochs, a new minute for one of the baselines
+    epochs[moved] += 6
+    assert cache.stale(figure, key(make_pos, epochs))
+
+
+def test_other_parameters(make_pos, clock, figure):
+    cache = RenderCache()
+    epochs = {"AAAA-BBBB": 100, "CCCC-BBBB": 100}
+    cache.store(figure, key(make_pos, epochs))
+
+    assert cache.stale(figure, key(make_pos, epochs, params=("60s", "pdf")))
@@ -0,0 +1,75 @@
+"""
+Tests of the streaming median resampler
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from rtk_gps.resample import StreamingResampler
+
+COLUMNS = ["e-baseline", "n-baseline", "u-baseline"]
+
+
+def epochs(seed=0, count=5000):
+    """
+    irregular epochs over a few hours with gaps, missing values and single
+    solutions
+    """
+
+    rng = np.random.default_rng(seed)
+    steps = rng.choice([1, 1, 1, 2, 7, 300], size=count)
+    index = pd.DatetimeIndex(
+        pd.Timestamp("2024-02-21 22:13:07") + pd.to_timedelta(np.cumsum(steps), "s"),
+        name="date_time",
+    )
+    df = pd.DataFrame(rng.normal(size=(count, 3)), index=index, columns=COLUMNS)
+    df["Q"] = rng.choice([1, 2, 5], size=count, p=[0.8, 0.15, 0.05])
+    df.iloc[rng.integers(0, count, size=20), 1] = np.nan
+    return df
+
+
+def expected(df, freq):
+    df = df.dropna()
+    return df[df.Q != 5][COLUMNS].resample(freq).median()
+
+
+@pytest.mark.parametrize("freq", ["60s", "10min"])
+@pytest.mark.parametrize("seed", range(3))
+def test_matches_pandas(freq, seed):
+    df = epochs(seed)
+    rng = np.random.default_rng(seed)
+    resampler = StreamingResampler(freq, columns=COLUMNS)
+
+    # fed in pieces of any size, starting again before the last epoch fed
+    i = 0
+    while i < len(df):
+        j = i + int(rng.integers(1, 400))
+        resampler.update(df.iloc[max(0, i - int(rng.integers(0, 50))) : j])
+        i = j
+
+        result = resampler.result()
+        pd.testing.assert_frame_equal(
+            result, expected(df.iloc[:j], freq), check_freq=False
+        )
+
+
+def test_trim():
+    df = epochs()
+    resampler = StreamingResampler("60s", columns=COLUMNS)
+    resampler.update(df.iloc[:3000])
+    start = df.index[2000]
+    resampler.trim(start)
+    resampler.update(df.iloc[3000:])
+
+    pd.testing.assert_frame_equal(
+        resampler.result(start=start),
+        expected(df, "60s").loc[start:],
+        check_freq=False,
+    )
+
+
+def test_empty():
+    resampler = StreamingResampler("60s", columns=COLUMNS)
+    assert resampler.update(epochs().iloc[:0]) == 0
+    assert resampler.result().empty
@@ -0,0 +1,145 @@
+"""
+Tests of the ring buffers of recent epochs and the data loaded into them
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import rtk_gps.rtk_gps
+from rtk_gps.ringbuffer import RingBuffer
+from rtk_gps.rtk_gps import BaselineData
+from rtk_gps.storage import MemoryStorage
+from rtk_gps.tailreader import PosTailReader
+
+COLUMNS = ["e-baseline", "Q"]
+
+
+def frame(start, count, step="1s"):
+    index = pd.date_range(start, periods=count, freq=step, name="date_time")
+    return pd.DataFrame(
+        {"e-baseline": np.arange(count, dtype=float), "Q": np.ones(count)},
+        index=index,
+    )
+
+
+def held(df, span, capacity):
+    """
+    the epochs of df a buffer holds after they were all appended
+    """
+
+    df = df[df.index > df.index[-1] - span]
+    return df.iloc[-capacity:]
+
+
+@pytest.mark.parametrize("piece", [1, 7, 100, 250, 1000])
+def test_wraparound(piece):
+    # room for 240 epochs at 1 Hz, a span of 4 minutes
+    buffer = RingBuffer(COLUMNS, days=240 / 86400)
+    df = frame("2024-02-21", 1000)
+
+    for i in range(0, len(df), piece):
+        # each piece overlaps the last one, those epochs are not added twice
+        buffer.append(df.iloc[max(0, i - 3) : i + piece])
+        expected = held(df.iloc[: i + piece], pd.Timedelta(buffer.span), 240)
+
+        result = buffer.frame()
+        assert len(buffer) == len(expected)
+        assert buffer.first == expected.index[0]
+        assert buffer.last == expected.index[-1]
+        pd.testing.assert_frame_equal(
+            result, expected.astype({"Q": np.int8}), check_freq=False
+        )
+
+        if len(expected) < 10:
+            continue
+        start, end = expected.index[len(expected) // 3], expected.index[-5]
+        pd.testing.assert_frame_equal(
+            buffer.frame(start, end, ["e-baseline"]),
+            expected.loc[start:end, ["e-baseline"]],
+            check_freq=False,
+        )
+
+
+def test_span_drops_old_epochs():
+    buffer = RingBuffer(COLUMNS, days=240 / 86400)
+    buffer.append(frame("2024-02-21", 100))
+    # a gap longer than the span leaves only the new epochs
+    buffer.append(frame("2024-02-21 01:00", 10))
+
+    assert len(buffer) == 10
+    assert buffer.first == pd.Timestamp("2024-02-21 01:00")
+
+
+BASELINES = ["AAAA-BBBB", "CCCC-BBBB", "DEAD-BBBB"]
+
+END = pd.Timestamp("2024-02-23 12:00")
+
+
+def storage(days, end):
+    """
+    files of the live baselines with the epochs of days up to end, DEAD-BBBB
+    has none
+    """
+
+    nfs = MemoryStorage("ringbuffer-cycles")
+    nfs.files.clear()
+    for (baseline, day), data in days.items():
+        lines = data.splitlines(keepends=True)
+        # the header lines and the epochs every 10 s up to end
+        count = 2 + (end - day) // pd.Timedelta("10s") + 1
+        nfs.add(f"{baseline}/{baseline}{day:%Y%m%d}0000b.pos", b"".join(lines[:count]))
+    return nfs
+
+
+def test_warm_matches_cold(make_pos, monkeypatch):
+    starts = []
+    load_baselines = rtk_gps.rtk_gps.load_baselines
+
+    def spy(*args, **kwargs):
+        if kwargs["starts"] is not None:
+            starts.append(kwargs["starts"])
+        return load_baselines(*args, **kwargs)
+
+    monkeypatch.setattr(rtk_gps.rtk_gps, "load_baselines", spy)
+
+    first = END.normalize() - pd.Timedelta(days=2)
+    days = {
+        (baseline, day): make_pos(day, 8640, seed=seed * 10 + day.day)
+        for seed, baseline in enumerate(BASELINES[:2])
+        for day in pd.date_range(first, END.normalize())
+    }
+
+    reader = PosTailReader()
+    resamplers = {}
+    buffers = {}
+    # runs of the scheduler, the files growing in between
+    for end in pd.date_range(END - pd.Timedelta("1h"), END, freq="20min"):
+        nfs = storage(days, end)
+        start = end - pd.Timedelta(days=2)
+        warm = BaselineData(
+            nfs,
+            BASELINES,
+            start,
+            end,
+            reader=reader,
+            resamplers=resamplers,
+            buffers=buffers,
+        )
+        cold = BaselineData(nfs, BASELINES, start, end)
+
+        for baseline in BASELINES[:2]:
+            pd.testing.assert_frame_equal(
+                warm.window(baseline, start, end),
+                cold.window(baseline, start, end),
+                check_freq=False,
+            )
+            assert not cold.window(baseline, start, end).empty
+        assert warm.window("DEAD-BBBB", start, end).empty
+        assert cold.window("DEAD-BBBB", start, end).empty
+
+    # after the first run each live baseline is loaded from its last epoch
+    assert starts[0] == {}
+    ends = pd.date_range(END - pd.Timedelta("1h"), END, freq="20min")
+    for previous, now in zip(ends, starts[1:]):
+        assert now == {baseline: previous for baseline in BASELINES[:2]}
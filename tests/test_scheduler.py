@@ -0,0 +1,35 @@
+"""
+Tests of the files fetched ahead of each run of the scheduler
+"""
+
+import numpy as np
+import pandas as pd
+
+from rtk_gps import scheduler
+from rtk_gps.ringbuffer import RingBuffer
+from rtk_gps.scheduler import cycle_files
+
+
+def days_of(files, baseline):
+    return sorted(fn[-17:-9] for fn in files if fn.startswith(f"{baseline}/"))
+
+
+def test_cycle_files_start_at_buffers(monkeypatch):
+    monkeypatch.setattr(
+        scheduler, "BASELINES_LIST", [["AAAA-BBBB", "CCCC-BBBB"], ["DDDD-BBBB"]]
+    )
+    now = pd.Timestamp.now()
+    last = now - pd.Timedelta("10min")
+    index = pd.date_range(end=last, periods=60, freq="10s", name="date_time")
+    buffer = RingBuffer(["e-baseline"], days=2)
+    buffer.append(pd.DataFrame({"e-baseline": np.zeros(60)}, index=index))
+    # DDDD-BBBB has a buffer without epochs yet
+    buffers = {"AAAA-BBBB": buffer, "DDDD-BBBB": RingBuffer(["e-baseline"])}
+
+    files = cycle_files(buffers=buffers)
+
+    window = pd.date_range((now - pd.Timedelta(days=2)).normalize(), now.normalize())
+    assert days_of(files, "AAAA-BBBB") == sorted({f"{last:%Y%m%d}", f"{now:%Y%m%d}"})
+    for baseline in ["CCCC-BBBB", "DDDD-BBBB"]:
+        assert days_of(files, baseline) == [f"{day:%Y%m%d}" for day in window]
+    assert files == sorted(files)
@@ -0,0 +1,113 @@
+"""
+Tests of reading growing .pos files incrementally
+"""
+
+import pandas as pd
+import pytest
+
+from rtk_gps.posfile import BASELINE_COLUMNS
+from rtk_gps.storage import MemoryStorage
+from rtk_gps.tailreader import PosTailReader
+
+FILE = "ABCD-EFGH/ABCD-EFGH202402210000b.pos"
+
+
+def whole(data):
+    """
+    data parsed in one go, as a reader seeing the file for the first time
+    """
+
+    nfs = MemoryStorage("tailreader-whole")
+    nfs.add(FILE, data)
+    return PosTailReader().read(FILE, nfs, BASELINE_COLUMNS)
+
+
+@pytest.mark.parametrize("chunk_size", [64, 1000, 2**20])
+def test_growing_file(make_pos, chunk_size):
+    data = make_pos("2024-02-21", 500)
+    nfs = MemoryStorage("tailreader-growing")
+    reader = PosTailReader(chunk_size=chunk_size)
+
+    # the file grows by any number of bytes, ending in a partial line
+    for size in [0, 10, 150, 151, 3000, 3001, 3002, 40000, len(data)]:
+        nfs.add(FILE, data[:size])
+        df = reader.read(FILE, nfs, BASELINE_COLUMNS)
+        pd.testing.assert_frame_equal(df, whole(data[:size]))
+        assert reader.offset(FILE) == data.rfind(b"\n", 0, size) + 1
+    assert len(df) == 500
+
+
+def test_truncated_file(make_pos):
+    data = make_pos("2024-02-21", 500)
+    nfs = MemoryStorage("tailreader-truncated")
+    reader = PosTailReader()
+
+    nfs.add(FILE, data)
+    reader.read(FILE, nfs, BASELINE_COLUMNS)
+    # started again from the top with a new run
+    shorter = make_pos("2024-02-21 05:00", 100, seed=1)
+    nfs.add(FILE, shorter)
+
+    pd.testing.assert_frame_equal(
+        reader.read(FILE, nfs, BASELINE_COLUMNS), whole(shorter)
+    )
+
+
+def test_rotated_file(make_pos):
+    data = make_pos("2024-02-21", 500)
+    nfs = MemoryStorage("tailreader-rotated")
+    reader = PosTailReader()
+
+    nfs.add(FILE, data)
+    reader.read(FILE, nfs, BASELINE_COLUMNS)
+    # replaced by a longer file with other content at the bytes parsed
+    other = make_pos("2024-02-21 05:00", 600, seed=1)
+    nfs.add(FILE, other)
+
+    pd.testing.assert_frame_equal(
+        reader.read(FILE, nfs, BASELINE_COLUMNS), whole(other)
+    )
+
+
+def test_keep(make_pos):
+    data = make_pos("2024-02-21", 500)
+    nfs = MemoryStorage("tailreader-keep")
+    reader = PosTailReader(keep="5min")
+
+    nfs.add(FILE, data[:20000])
+    reader.read(FILE, nfs, BASELINE_COLUMNS)
+    nfs.add(FILE, data)
+    df = reader.read(FILE, nfs, BASELINE_COLUMNS)
+
+    expected = whole(data)
+    first = expected.index[expected.index <= whole(data[:20000]).index[-1]][-31]
+    pd.testing.assert_frame_equal(df, expected.loc[first:])
+
+
+def test_max_bytes(make_pos):
+    nfs = MemoryStorage("tailreader-max-bytes")
+    files = [f"ABCD-EFGH/ABCD-EFGH2024022{day}0000b.pos" for day in range(5)]
+    for day, filename in enumerate(files):
+        nfs.add(filename, make_pos(f"2024-02-2{day}", 500, seed=day))
+
+    one = PosTailReader()
+    one.read(files[0], nfs, BASELINE_COLUMNS)
+    reader = PosTailReader(max_bytes=3 * one.nbytes)
+    for filename in files:
+        reader.read(filename, nfs, BASELINE_COLUMNS)
+
+    # the least recently read files are dropped
+    assert reader.nbytes == 3 * one.nbytes
+    assert [reader.offset(filename) > 0 for filename in files] == [
+        False,
+        False,
+        True,
+        True,
+        True,
+    ]
+
+    reader.forget(files[3])
+    assert reader.nbytes == 2 * one.nbytes
+    assert reader.offset(files[3]) == 0
+    reader.forget()
+    assert reader.nbytes == 0